@@ -1,9 +1,5 @@
-from nodes.orchestrator import create_planner, State
-from nodes.researcher import search
-from nodes.runner import runner
-from nodes.schema import PlanModel, DocSum
-from tools import db, models
-from langgraph.graph import StateGraph, START, END
+from pipeline import build_graph, new_state
+from tools import db, models, timeline
 import config.logger_config as logger_config, logging
 from rich.console import Console
 from rich.traceback import install
@@ -27,42 +23,20 @@ if __name__ == "__main__":
     """
     Initilizing the state graph.
     Question is taken as input from the user
-    Nodes and edges are added to the graph
     """
     
     console.clear()
     
-    graph_builder = StateGraph(State)
-    
     question = input("Welcome! What do you want to do?\n")
     
     
     #Initializing the state
-    state: State = {
-        "session": "",
-        "question_explained": "",
-        "question": question,
-        "intent": "",
-        "plan": PlanModel(),
-        "response": "",
-        "search_result": DocSum(docList=[])
-    }
-    
-    #Nodes
-    graph_builder.add_node("Orchestrator", create_planner)
-    graph_builder.add_node("Researcher", search)
-    graph_builder.add_node("Runner", runner)
-    
-    #Edges
-    graph_builder.add_edge(START, "Orchestrator")
-    graph_builder.add_edge("Orchestrator", "Researcher")
-    graph_builder.add_edge("Researcher", "Runner")
-    graph_builder.add_edge("Runner", END)
+    state = new_state(question)
     
     
     #Graph compilation and invocation
-    graph = graph_builder.compile()
-    final_state = graph.invoke(state)
+    graph = build_graph()
+    final_state = asyncio.run(graph.ainvoke(state))
     
     print(final_state)
     
@@ -77,5 +51,6 @@ if __name__ == "__main__":
     except Exception as e:
         pass
     
-    #Deleting the context collection after the session ends
-    db.delete_collection(state["session"], "context")
\ No newline at end of file
+    #Deleting the context collection and the timelines after the session ends
+    db.delete_collection(final_state["session"], "context")
+    timeline.discard(final_state["session"])
\ No newline at end of file
@@ -0,0 +1,43 @@
+from nodes.schema import State
+from nodes.orchestrator import new_session_id
+import tools.response_cache as response_cache
+from rich.console import Console
+import asyncio
+
+
+# Stylization for rich console output
+console = Console(force_terminal=True)
+
+
+
+def lookup_cache(state: State) -> State:
+    """
+    Synchronous entry point of the Cache node (graph.invoke)
+    """
+
+    return asyncio.run(alookup_cache(state))
+
+
+
+async def alookup_cache(state: State) -> State:
+    """
+    Session creation
+    Semantic lookup of the question in the response cache
+    A hit skips every LLM call: the cached topology goes straight to the Runner deployment
+    """
+
+    #Creating a unique session ID (the server mode provides its own)
+    if not state.get("session"):
+        state["session"] = new_session_id()
+
+    state["cached_topology"] = await asyncio.to_thread(response_cache.lookup, state["question"]) or ""
+
+    if state["cached_topology"]:
+        console.print("[bold green]✓ Similar topology already deployed, reusing it.[/bold green]")
+
+    return state
+
+
+
+def route_after_cache(state: State) -> str:
+    return "Runner" if state.get("cached_topology") else "Orchestrator"
@@ -3,33 +3,70 @@ from langchain_core.runnables import RunnableLambda
 from langchain.schema import BaseMessage
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
-from nodes.schema import State, PlanModel, SimpleThinkingCallback
-import base64
+from nodes.schema import State, PlanModel, SimpleThinkingCallback, thinking_callbacks
+import base64, asyncio
 import re, time, torch
 import secrets
 import tools.db as db
+import tools.timeline as timeline
 from rich.console import Console
 from rich.tree import Tree
 from rich.rule import Rule
 from rich.live import Live
-from tools.models import intent_explain, detect_intent
-from tools.models import llm_management
+from tools.models import aintent_explain, adetect_intent
+from tools.models import allm_management
 
 
 # Stylization for rich console output
 console = Console(force_terminal=True)
-timeline_tree_orchestrator = Tree("⏳​ Orchestrator Timeline", guide_style="bold white")
 
 
 # Essential for the output structuration
 parser_orch = JsonOutputParser(pydantic_object=PlanModel)
 
-def print_timeline_orchestrator():
-    console.print(Rule("[bold blue]🧠​ Orchestrator Module[/]"))
-    console.print(timeline_tree_orchestrator)
-    time.sleep(3)
-    console.clear()
+
+# Timeouts (seconds) of the independent pre-planning steps
+EXPLAIN_TIMEOUT = 120
+CONTEXT_TIMEOUT = 15
+INTENT_TIMEOUT = 15
+
+# Intent used when Dialogflow is unreachable (the agent's main use case)
+DEFAULT_INTENT = "runner"
+
+def print_timeline_orchestrator(state: State, step: str):
+    """
+    Record a step of the session's Orchestrator timeline.
+    Rendering happens on a background thread and is disabled in server mode.
+    """
+    
+    timeline.add_step(state["session"], "orchestrator", step, render=state.get("interactive", True))
+    
+
+
+def new_session_id() -> str:
+    """
+    Unique, URL-safe session identifier (also used to name the context collection)
+    """
     
+    return base64.urlsafe_b64encode(secrets.token_bytes(16)).rstrip(b"=").decode("ascii")
+
+
+
+async def run_step(name: str, step, timeout: float, default):
+    """
+    Await one pre-planning step with a timeout.
+    
+    A step that fails or times out doesn't abort the Orchestrator: its default
+    value is returned instead and the failure is reported.
+    """
+    
+    try:
+        return await asyncio.wait_for(step, timeout=timeout)
+    except asyncio.TimeoutError:
+        console.print(f"[bold red]✗ {name} timed out after {timeout}s, using fallback.[/bold red]")
+    except Exception as e:
+        console.print(f"[bold red]✗ {name} failed, using fallback. Error: {e}[/bold red]")
+    return default
 
             
 def response_filter(msg) -> str:
@@ -43,6 +80,25 @@ def response_filter(msg) -> str:
     return response.strip()
     
 def create_planner(state: State) -> State:
+    """
+    Synchronous entry point of the Orchestrator (graph.invoke)
+    """
+    
+    return asyncio.run(acreate_planner(state))
+
+
+
+async def acreate_planner(state: State) -> State:
+    """
+    Borrow the warm JSON LLM from the registry for the whole Orchestrator step
+    """
+    
+    async with allm_management("json") as llm:
+        return await _acreate_planner(state, llm)
+
+
+
+async def _acreate_planner(state: State, llm) -> State:
     
     """
     Plan creation
@@ -52,35 +108,28 @@ def create_planner(state: State) -> State:
     Response from the LLM is parsed and added to the state
     """
 
-    llm = llm_management("json")
-    
-    timeline_tree_orchestrator.add(f"[green]✓[/green] LLM Initialized.")
-    print_timeline_orchestrator()
-    
-    
-    #Creating a unique session ID
-    state["session"] = base64.urlsafe_b64encode(secrets.token_bytes(16)).rstrip(b"=").decode("ascii")
+    #Creating a unique session ID (the server mode provides its own)
+    if not state.get("session"):
+        state["session"] = new_session_id()
+
+    print_timeline_orchestrator(state, f"[green]✓[/green] LLM Initialized.")
 
-    state["question_explained"] = intent_explain(state["question"])
+    #Explanation, context retrieval and intent detection don't depend on each other: run them concurrently
+    with console.status("[bold yellow] Explaining the question, capturing context and detecting user's intent...", spinner="dots"):
+        
+        question_explained, context, intent = await asyncio.gather(
+            run_step("Question explanation", aintent_explain(state["question"]), EXPLAIN_TIMEOUT, state["question"]),
+            run_step("Context retrieval", asyncio.to_thread(db.query_context, [state["question"]], state["session"]), CONTEXT_TIMEOUT, None),
+            run_step("Intent detection", adetect_intent(user_input=state["question"]), INTENT_TIMEOUT, DEFAULT_INTENT)
+        )
+        
+    state["question_explained"] = question_explained
+    state["intent"] = intent or DEFAULT_INTENT
     
     console.print(state["question_explained"])
-    
-    #Context retrieval
-    with console.status("[bold yellow] Capturing context...", spinner="dots"):
-        
-        context = db.query_context([state["question"]], state["session"])
       
-    timeline_tree_orchestrator.add(f"[green]✓[/green] Context retrieved.")
-    print_timeline_orchestrator()
-   
-   
-    #Intent detection
-    with console.status("[bold yellow] Detecting user's intent...", spinner="dots"):
-    
-        state["intent"] = detect_intent(user_input=state["question"])
-    
-    timeline_tree_orchestrator.add(f"[green]✓[/green] User intent detected: {state['intent']}.") 
-    print_timeline_orchestrator()
+    print_timeline_orchestrator(state, f"[green]✓[/green] Context retrieved.")
+    print_timeline_orchestrator(state, f"[green]✓[/green] User intent detected: {state['intent']}.")
     
     filter_node = RunnableLambda(response_filter)
 
@@ -102,26 +151,22 @@ def create_planner(state: State) -> State:
                 "CONTEXT:\n{context}"
             )
             
-        timeline_tree_orchestrator.add(f"[green]✓[/green] Context retrieved.")          
-        print_timeline_orchestrator()
+        print_timeline_orchestrator(state, f"[green]✓[/green] Context retrieved.")
         
         console.print("[bold green] 🧠​ Generating the plan...")
         # Prompt -> LLM -> Formatation
         chain = prompt | llm | filter_node | parser_orch if llm else None
 
-        result: PlanModel = chain.invoke({
+        result: PlanModel = await chain.ainvoke({
             "intent": state["intent"],
             "user_input": state["question_explained"],
             "instruction": instruction,
         "context": context,
-        }, config={"callbacks": [SimpleThinkingCallback()]}) if chain else PlanModel()
+        }, config={"callbacks": thinking_callbacks(state)}) if chain else PlanModel()
         
         state["plan"] = result
         
-        console.clear()
-        
-        timeline_tree_orchestrator.add(f"[green]✅[/green] Plan ready.") 
-        print_timeline_orchestrator()
+        print_timeline_orchestrator(state, f"[green]✅[/green] Plan ready.")
         
 
     return state
\ No newline at end of file
@@ -1,17 +1,19 @@
 from langchain_ollama import ChatOllama
 from nodes.orchestrator import response_filter
-from nodes.schema import State, SearchResult, DocSum, SimpleThinkingCallback, TaskModel, PlanModel
+from nodes.schema import State, SearchResult, Doc, DocSum, SimpleThinkingCallback, TaskModel, PlanModel, thinking_callbacks
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
-from sentence_transformers.cross_encoder import CrossEncoder
 from typing import Dict, List
 import tools.db as db
-import json, re, torch, hashlib, time
+import tools.timeline as timeline
+import tools.summary_cache as summary_cache
+import json, re, torch, hashlib, time, asyncio
 from rich.console import Console
 from rich.rule import Rule
 from rich.tree import Tree
 import ollama
-from tools.models import llm_management
+from tools.models import allm_management
+from tools.rerank import reranker, prefilter
 
 
 results: List[Dict] = []
@@ -19,7 +21,6 @@ results: List[Dict] = []
 
 # Stylization for rich console output
 console = Console(force_terminal=True)
-timeline_tree_researcher = Tree("⏳​ Researcher Timeline", guide_style="bold white")
 
 
 # Essential for the output structuration
@@ -27,134 +28,194 @@ parser = JsonOutputParser(pydantic_object=SearchResult)
 parser_docsum = JsonOutputParser(pydantic_object=DocSum)
 
 
-def print_timeline_researcher():
-    console.print(Rule("[bold blue]🔍 Research Module[/]"))
-    console.print(timeline_tree_researcher)
-    time.sleep(3)
-    console.clear()
+def print_timeline_researcher(state: State, step: str):
+    """
+    Record a step of the session's Researcher timeline.
+    Rendering happens on a background thread and is disabled in server mode.
+    """
+    
+    timeline.add_step(state["session"], "researcher", step, render=state.get("interactive", True))
     
 
 
 def search(state: State) -> State:
+    """
+    Synchronous entry point of the Researcher (graph.invoke)
+    """
     
-    llm = llm_management("json")
+    return asyncio.run(asearch(state))
+
+
+
+def load_summarizer_instruction() -> str:
+    """
+    Summarizer instruction adapted for the prompt template
+    """
     
-    timeline_tree_researcher.add(f"[green]✓[/green] Search Module Initialized.")
-    print_timeline_researcher()
+    with open(file="nodes/instructions/summarizer_instruction.txt") as file:
+        return file.read().strip().replace('{', '{{').replace('}', '}}')
+
+
+
+def clean_doc(page: str) -> str:
+    """
+    Cleaning a stored documentation chunk for the prompts
+    """
+    
+    page = re.sub(r'\\+', r'\\', str(page))
+    return page.replace("\\n", "\n").replace('{', '{{').replace('}', '}}')
+
+
+
+async def asummarize_docs(llm, docs: List[str], sum_instruction: str, callbacks=None) -> List[dict]:
+    """
+    Summarize cleaned documentation chunks into Doc dicts.
+    The model answers one Doc per input, in order, when it follows the instruction.
+    """
+    
+    prompt_docs = PromptTemplate(
+        input_variables=["sum_instruction"] + [f"doc{i}" for i in range(1, len(docs) + 1)],
+        partial_variables={"format_instructions": parser_docsum.get_format_instructions()},
+        template=(
+            "INSTRUCTION: {sum_instruction}\n\n"
+            f"INPUTS ({len(docs)} docs):\n" +
+            "".join(
+                f"<DOC id='{i}'>\n{doc}\n</DOC>\n\n"
+                for i, doc in enumerate(docs, start=1)
+            )
+        )
+    )
+    
+    chain = prompt_docs | llm | response_filter | parser_docsum
+
+    doc_sum = await chain.ainvoke({
+        "sum_instruction": sum_instruction,
+        **{f"doc{i}": doc for i, doc in enumerate(docs, start=1)},
+        "format_instruction": parser_docsum.get_format_instructions()
+    }, config={"callbacks": callbacks or []})
+    
+    return doc_sum.get("docList", []) if isinstance(doc_sum, dict) else [d.model_dump() for d in doc_sum.docList]
 
-    try:
-         with open(file="/home/ruba/Documents/laas/clab_agent/src/nodes/instructions/summarizer_instruction.txt") as file: 
-            
 
 
-            with console.status("[bold yellow] Downloading CrossEncoder model...", spinner="dots"):
-                # Loading the cross encoder model
-                model_cross: CrossEncoder = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2", device="cpu")
+def safe_docsum(docs: List[dict]) -> DocSum:
+    """
+    DocSum from Doc dicts, skipping the malformed ones
+    """
+    
+    doc_list = []
+    for doc in docs:
+        try:
+            doc_list.append(doc if isinstance(doc, Doc) else Doc(**{**doc, "codeblocks": doc.get("codeblocks", [])[:3]}))
+        except Exception as e:
+            console.print(f"[bold yellow] ⚠️  Skipping malformed summary: {e}")
+    return DocSum(docList=doc_list)
+
+
 
-            timeline_tree_researcher.add(f"[green]✓[/green] CrossEncoder downloaded.")
-            print_timeline_researcher()
+async def asearch(state: State) -> State:
+    
+    try:
+        async with allm_management("json") as llm:
+            
+            print_timeline_researcher(state, f"[green]✓[/green] Search Module Initialized.")
             
             
             
+            plan = state["plan"] if isinstance(state["plan"], PlanModel) else PlanModel(**state["plan"])
+            tasks_list = plan.tasks_list
+            runner_tasks = [task.description for task in tasks_list if task.group == "runner"]
+            
             with console.status("[bold yellow] Consulting ContainerLab Documentation...", spinner="dots"):
-                #Querying the scrapy collection
-                sum_instruction: str = file.read().strip().replace('{', '{{').replace('}', '}}')            
-                query_result = db.query_scrapy([state["question_explained"]]) 
+                #Querying the scrapy collection with the question and every runner task, in one batched query
+                sum_instruction: str = load_summarizer_instruction()
+                queries = [state["question_explained"]] + runner_tasks
+                query_result = await asyncio.to_thread(db.query_scrapy_multi, queries) 
                 docs_query = query_result.get("documents") if query_result else None
+                ids_query = query_result.get("ids") if query_result else None
+                metadatas_query = query_result.get("metadatas") if query_result else None
+                embeddings_query = query_result.get("embeddings") if query_result else None
 
-            timeline_tree_researcher.add(f"[green]✓[/green] ContainerLab Documentation Consulted.")
-            print_timeline_researcher()
+            print_timeline_researcher(state, f"[green]✓[/green] ContainerLab Documentation Consulted.")
 
 
             
             # Cleaning the documents
-            docs: List[str] = [re.sub(r'\\+', r'\\', str(page)) for page in docs_query[0]] if docs_query and docs_query[0] is not None else []
-            docs = [page.replace("\\n", "\n").replace('{', '{{').replace('}', '}}') for page in docs]
+            raw_docs: List[str] = [str(page) for page in docs_query[0]] if docs_query and docs_query[0] is not None else []
+            docs: List[str] = [clean_doc(page) for page in raw_docs]
+                
+            # Chunk ID and stored content of each cleaned document (for the summary cache)
+            chunk_ids: List[str] = list(ids_query[0]) if ids_query and ids_query[0] is not None else []
+            chunk_by_doc: Dict[str, tuple] = {doc: (chunk_id, raw) for doc, chunk_id, raw in zip(docs, chunk_ids, raw_docs)}
+                
+            # Summaries pre-built at scrape time, stored next to the embeddings
+            metadatas: List[dict] = list(metadatas_query[0]) if metadatas_query and metadatas_query[0] is not None else []
+            presummary_by_doc: Dict[str, dict] = {
+                doc: json.loads(metadata["summary"])
+                for doc, raw, metadata in zip(docs, raw_docs, metadatas)
+                if metadata and metadata.get("summary") and metadata.get("summary_hash") == summary_cache.content_hash(raw)
+            }
             
             
             # Scoring the documents according to the tasks of the plan        
             with console.status("[bold yellow] Ranking the best informations...", spinner="dots"):
-    
-                pairs = []
-                plan = state["plan"] if isinstance(state["plan"], PlanModel) else PlanModel(**state["plan"])
-                tasks_list = plan.tasks_list
                 
-                for task in tasks_list:
-                    task_description = task.description
-                    if task.group == "runner":
-                        pairs.extend([[task_description, doc] for doc in docs])
-
-                # If no runner tasks, we score all docs against the question
-                scores = model_cross.predict(pairs)
+                # Bi-encoder prefilter on the stored embeddings: only the plausible candidates reach the CrossEncoder
+                candidates = docs
+                embeddings = embeddings_query[0] if embeddings_query is not None and len(embeddings_query) else None
+                if runner_tasks and embeddings is not None and len(embeddings) == len(docs) and all(e is not None for e in embeddings):
+                    query_embeddings = dict(zip(query_result["query_texts"], query_result["query_embeddings"]))
+                    task_embeddings = [query_embeddings[t] for t in runner_tasks if t in query_embeddings]
+                    if task_embeddings:
+                        candidates = [docs[i] for i in await asyncio.to_thread(prefilter, task_embeddings, embeddings)]
                 
+                # Duplicated pairs and pairs already scored by a previous request don't reach the CrossEncoder,
+                # the reranking stops once the top 3 unique documents are settled
+                top3_docs, reranked = await asyncio.to_thread(reranker.top_k, runner_tasks, candidates, 3)
+                reranker.record(retrieved=len(docs), prefiltered=len(candidates), reranked=reranked)
+
+            print_timeline_researcher(state, f"[green]✓[/green] Best responses selected ({reranked}/{len(docs)} reranked).")
+
+
+            # Summaries already built for these chunks (same content): offline index first, then the cache
+            summary_by_doc: Dict[str, dict] = {d: presummary_by_doc[d] for d in top3_docs if d in presummary_by_doc}
+            top3_chunks: Dict[str, str] = dict(chunk_by_doc[d] for d in top3_docs if d in chunk_by_doc and d not in summary_by_doc)
+            cached = await asyncio.to_thread(summary_cache.get, top3_chunks) if top3_chunks else {}
+            summary_by_doc.update({d: cached[chunk_by_doc[d][0]] for d in top3_docs if d in chunk_by_doc and chunk_by_doc[d][0] in cached})
+            missing_docs = [d for d in top3_docs if d not in summary_by_doc]
+            extra_docs: List[dict] = []
                 
-                doc_by_pair = [doc for _, doc in pairs]  # cada elemento em 'pairs' é [task_description, doc]
-                scored_docs = list(zip(map(float, scores), doc_by_pair))
+            if missing_docs:
                 
+                console.print("[bold green] 🧠​ Summarizing the research...")
                 
-                # Selecting the top 3 unique documents
-                def norm_key(txt: str) -> str:
-                    norm = re.sub(r"\s+", " ", txt).strip()
-                    return hashlib.sha1(norm.encode("utf-8")).hexdigest()
                 
-                # After normalization, keep only the best score for each unique document
-                best_per_doc = {}
-                for s, d in scored_docs:
-                    k = norm_key(d)
-                    if k not in best_per_doc or s > best_per_doc[k][0]:
-                        best_per_doc[k] = (s, d)
                 
-                top3 = sorted(best_per_doc.values(), key=lambda x: x[0], reverse=True)[:3]
-                top3_docs = [d for s, d in top3]
-
-            timeline_tree_researcher.add(f"[green]✓[/green] Best responses selected.")
-            print_timeline_researcher()
-            
-            
-            
-            # Freeing memory
-            del model_cross
-            torch.cuda.empty_cache() if torch.cuda.is_available() else None
-
-
-
-            console.print("[bold green] 🧠​ Summarizing the research...")
-            
-            
-            
-            # Summarizing
-            prompt_docs = PromptTemplate(
-                input_variables=["sum_instruction"] + [f"doc{i}" for i in range(1, len(top3_docs) + 1)],
-                partial_variables={"format_instructions": parser_docsum.get_format_instructions()},
-                template=(
-                    "INSTRUCTION: {sum_instruction}\n\n"
-                    "INPUTS (3 docs):\n" +
-                    "".join(
-                        f"<DOC id='{i}'>\n{doc}\n</DOC>\n\n"
-                        for i, doc in enumerate(top3_docs, start=1)
-                    )
-                )
-            )
+                # Summarizing (only the chunks without a cached summary)
+                new_docs = await asummarize_docs(llm, missing_docs, sum_instruction, thinking_callbacks(state))
+                    
+                # The model answers one Doc per input, in order: only then can they be cached per chunk
+                if len(new_docs) == len(missing_docs):
+                    summary_by_doc.update(zip(missing_docs, new_docs))
+                    await asyncio.to_thread(summary_cache.put,
+                                            {chunk_by_doc[d][0]: doc for d, doc in zip(missing_docs, new_docs) if d in chunk_by_doc},
+                                            top3_chunks)
+                else:
+                    extra_docs = new_docs
                 
-
-
-            chain = prompt_docs | llm | response_filter | parser_docsum
-
-            doc_sum: DocSum = chain.invoke({
-                "sum_instruction": sum_instruction,
-                **{f"doc{i}": doc for i, doc in enumerate(docs, start=1)},
-                "format_instruction": parser_docsum.get_format_instructions()
-            }, config={"callbacks": [SimpleThinkingCallback()]})
-        
-            state["search_result"] = doc_sum
+            # DocSum in ranking order, built from the cache and the fresh summaries
+            state["search_result"] = safe_docsum([summary_by_doc[d] for d in top3_docs if d in summary_by_doc] + extra_docs)
         
     
 
-            timeline_tree_researcher.add(f"[green]✅[/green] Research Summarized.")
-            print_timeline_researcher()
+            print_timeline_researcher(state, f"[green]✅[/green] Research Summarized.")
 
     except Exception as e:
         print(f"Researcher Summarizer File Error.\nError {e}")    
+        
+        # The server mode must survive a failed request
+        if not state.get("interactive", True):
+            raise
         exit()
         
     return state
@@ -1,19 +1,22 @@
 from nodes.orchestrator import response_filter
-from nodes.schema import State, SearchResult, DocSum, SimpleThinkingCallback, TaskModel, PlanModel
+from nodes.schema import State, SearchResult, DocSum, SimpleThinkingCallback, TaskModel, PlanModel, thinking_callbacks
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
-from sentence_transformers.cross_encoder import CrossEncoder
-from langchain_ollama import ChatOllama
 from typing import Dict, List
 import tools.db as db
+import tools.response_cache as response_cache
+import tools.images as images
+import tools.topology_validator as topology_validator
+import tools.correction_memory as correction_memory
+import tools.topology_diff as topology_diff
 import json, re, torch, hashlib, time, docker, yaml
 from rich.console import Console
 from rich.rule import Rule
 from rich.tree import Tree
 from pathlib import Path
-from tools.models import llm_management
-from typing import Any, Dict
-import subprocess
+from tools.models import allm_management, aollama_model, CORRECTION_MODEL
+from typing import Any, Dict, Optional, Tuple
+import subprocess, asyncio
 import webbrowser
 
 
@@ -21,11 +24,66 @@ import webbrowser
 # Stylization for rich console output
 console = Console(force_terminal=True)
 
+# Deploy errors caused by a lab or container of the same name, not by the topology itself
+LAB_CONFLICT_RE = re.compile(r'already (been )?deployed|already in use|already exists', re.IGNORECASE)
 
 
-def deploy_and_graph_topology(topology_file: str):
+
+def deploy_and_graph_topology(topology_file: str, interactive: bool = True,
+                              node_filter: Optional[List[str]] = None, reconnect: Optional[List[Tuple[str, str]]] = None):
+    """
+    Synchronous variant of `adeploy_and_graph_topology`.
+    """
+    
+    return asyncio.run(adeploy_and_graph_topology(topology_file, interactive, node_filter, reconnect))
+
+
+
+async def arun_clab_command(command: List[str]) -> Optional[str]:
+    """
+    Run a containerlab command, returning its output when it fails (None on success).
+    """
+    
+    console.print(f"▶️  Executing: {' '.join(command)}")
+    
+    # Execute the command and capture both stdout and stderr
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT # Redirect stderr to stdout for unified output
+    )
+    
+    try:
+        stdout_bytes, _ = await process.communicate()
+    except asyncio.CancelledError:
+        # Timed out (correction budget): the command must not outlive the request
+        process.kill()
+        await process.wait()
+        raise
+    stdout_data = stdout_bytes.decode('utf-8', errors='replace')
+    
+    if stdout_data:
+        console.print(stdout_data.strip())
+    
+    if process.returncode != 0:
+        console.print(f"[bold red]✗ Command failed with exit code {process.returncode}[/bold red]")
+        return stdout_data
+    
+    return None
+
+
+
+async def adeploy_and_graph_topology(topology_file: str, interactive: bool = True,
+                                     node_filter: Optional[List[str]] = None, reconnect: Optional[List[Tuple[str, str]]] = None):
     """
     Deploy a Containerlab topology and start the graph visualization server.
+    
+    With a `node_filter`, only these nodes are (re)deployed, the other containers of
+    the lab are kept. Their links to the kept nodes aren't created by the filtered
+    deploy, `reconnect` lists them ("container:interface" pairs) to add them afterwards.
+    
+    In non-interactive mode (server), the lab is left running and neither the
+    graph server nor the cleanup prompt are started.
     """
 
     console.print(Rule("[bold cyan] Starting topology deployment [/bold cyan]"))
@@ -33,26 +91,21 @@ def deploy_and_graph_topology(topology_file: str):
     # Construct the deployment command using sudo privileges
     deploy_command = ["sudo", "containerlab", "deploy", "-t", topology_file]
     
-    console.print(f"▶️  Executing: {' '.join(deploy_command)}")
+    if node_filter:
+        deploy_command += ["--reconfigure", "--node-filter", ",".join(node_filter)]
     
     try:
-        # Execute the deployment command and capture both stdout and stderr
-        process = subprocess.Popen(
-            deploy_command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT, # Redirect stderr to stdout for unified output
-            text=True,
-            encoding='utf-8'
-        )
-        
-        stdout_data, _ = process.communicate()
+        error = await arun_clab_command(deploy_command)
         
-        if stdout_data:
-            console.print(stdout_data.strip())
+        if error is not None:
+            console.print("[bold red]✗ Deployment failed[/bold red]")
+            return error
         
-        if process.returncode != 0:
-            console.print(f"[bold red]✗ Deployment failed with exit code {process.returncode}[/bold red]")
-            return stdout_data
+        # Links between the redeployed nodes and the kept ones
+        for endpoint_a, endpoint_b in reconnect or []:
+            error = await arun_clab_command(["sudo", "containerlab", "tools", "veth", "create", "-a", endpoint_a, "-b", endpoint_b])
+            if error is not None:
+                return error
 
         console.print(f"[bold green]✓ Deployment of topology '{topology_file}' completed successfully![/bold green]")
 
@@ -68,6 +121,9 @@ def deploy_and_graph_topology(topology_file: str):
         console.print(f"[bold red]✗ An unexpected error occurred during deployment: {e}[/bold red]")
         return str(e)
 
+    if not interactive:
+        return None
+
     console.print(Rule("[bold cyan] Starting graph server [/bold cyan]"))
     
     
@@ -82,11 +138,11 @@ def deploy_and_graph_topology(topology_file: str):
         
         
         # Start graph server in background (suppress output)
-        graph_process = subprocess.Popen(graph_command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        graph_process = await asyncio.create_subprocess_exec(*graph_command, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
         
         
         # Wait a moment for server to start up
-        time.sleep(2)
+        await asyncio.sleep(2)
         
         
         # Open the topology visualization in default web browser
@@ -100,13 +156,14 @@ def deploy_and_graph_topology(topology_file: str):
 
     
     # Wait for user input to cleanup the lab
-    cleanup_lab_on_enter(topology_file)
+    await acleanup_lab_on_enter(topology_file)
 
 
     # Terminate the graph server process if it's running
     if graph_process:
 
         graph_process.terminate() 
+        await graph_process.wait()
         console.print("[bold yellow]Servidor de grafos finalizado.[/bold yellow]")
 
     return None
@@ -275,66 +332,191 @@ def cleanup_lab_on_enter(topology_file: str, input_bool: bool = True):
 
 
 
-def extract_and_pull_docker_images(yaml_string: str) -> List[str]:
+async def acleanup_lab_on_enter(topology_file: str, input_bool: bool = True):
+    """
+    Async variant of `cleanup_lab_on_enter`. The prompt and the Docker SDK calls
+    (blocking) run in a worker thread.
     """
-    Extract Docker image names from YAML and pull missing images.
     
-    This function parses the YAML content to find Docker image references,
-    checks if they exist locally, and pulls them if they don't.
+    await asyncio.to_thread(cleanup_lab_on_enter, topology_file, input_bool)
+
+
+
+async def adestroy_lab(topology_file: str) -> Optional[str]:
+    """
+    Destroy the lab of a topology file (containers and lab directory), without any prompt.
+    Returns the containerlab output when it fails.
     """
     
     try:
-        
-        # Connect to Docker daemon
-        client = docker.from_env()
-        
-        # Regular expression to match image lines in YAML
-        image_pattern = r'^\s*image:\s*(.+)$'
-        
-        images_found = []
-        pulled_images = []
-        
-        # Scan each line of YAML for image references
-        for line in yaml_string.split('\n'):
-            match = re.search(image_pattern, line.strip())
-            if match:
-                image_name = match.group(1).strip().strip('"').strip("'")
-                if image_name:
-                    images_found.append(image_name)
-        
-        console.print(f"Images found: {images_found}")
-        
-        
-        # Process each found image
-        for image_name in images_found:
-            try:
-                console.print(f"[bold yellow] Verifying image: {image_name}")
-
-                # Check if image exists locally
-                try:
-                    local_image = client.images.get(image_name)
-                    console.print(f"[bold green] ✓ Image {image_name} already exists locally.")
-                except Exception:
-                    console.print(f"[bold red] ✗ Image {image_name} not found locally.")
-                
-                # Pull the image from registry
-                console.print(f"[bold yellow] Pulling: {image_name}")
-                image = client.images.pull(image_name)
-                console.print(f"[bold green] ✓ Successfully pulled: {image_name}")
-                pulled_images.append(image_name)
-                
-            except Exception as e:
-                console.print(f"[bold red] ✗ Image not found in registry: {image_name} - {e}")
-        
-        return pulled_images
-        
+        return await arun_clab_command(["sudo", "containerlab", "destroy", "-t", topology_file, "--cleanup"])
+    except FileNotFoundError:
+        console.print("[bold red]✗ Error: The 'sudo' or 'containerlab' command was not found.[/bold red]")
+        return "Command not found: 'sudo' or 'containerlab'."
+
+
+
+def lab_node_states(lab_name: str) -> Dict[str, str]:
+    """
+    Status of the containers of a lab, by node name ("running", "exited", ...)
+    """
+    
+    client = docker.from_env()
+    containers = client.containers.list(all=True, filters={"label": [f"clab-lab-name={lab_name}"]})
+    return {container.labels.get("clab-node-name", container.name): container.status for container in containers}
+
+
+
+def remove_lab_nodes(lab_name: str, nodes: List[str]) -> None:
+    """
+    Stop and remove the containers of some nodes of a lab (the others keep running).
+    """
+    
+    client = docker.from_env()
+    
+    for container in client.containers.list(all=True, filters={"label": [f"clab-lab-name={lab_name}"]}):
+        if container.labels.get("clab-node-name") not in nodes:
+            continue
+        try:
+            console.print(f"Removing container: {container.name}...")
+            container.remove(force=True)
+            console.print(f"[bold green]✓ Removed:[/bold green] {container.name}")
+        except Exception as e:
+            console.print(f"[bold red]✗ Error removing {container.name}: {e}[/bold red]")
+
+
+
+async def aplan_redeploy(live_yaml: str, yaml_content: str) -> Optional[Dict[str, Any]]:
+    """
+    Incremental redeploy of a corrected topology over the lab of `live_yaml`:
+    {"recreate": [...], "remove": [...], "reconnect": [...]}, or None when the
+    whole lab must be redeployed.
+    
+    The nodes changed by the correction are recreated, along with the nodes of the
+    live lab that aren't running (the failed deploy may have stopped before them).
+    """
+    
+    try:
+        old, new = yaml.safe_load(live_yaml), yaml.safe_load(yaml_content)
+        diff = topology_diff.diff_topologies(old, new)
     except Exception as e:
-        console.print(f"[bold red] ✗ Error connecting to Docker: {e}")
-        raise
+        console.print(f"[bold yellow] Full redeploy: the topologies can't be compared ({e})")
+        return None
+    
+    if diff["full"]:
+        console.print(f"[bold yellow] Full redeploy: {diff['full']}")
+        return None
+    
+    try:
+        states = await asyncio.to_thread(lab_node_states, old["name"])
+    except Exception as e:
+        console.print(f"[bold yellow] Full redeploy: the lab containers can't be listed ({e})")
+        return None
+    
+    nodes = topology_diff.effective_nodes(new)
+    recreate = set(diff["recreate"]) | {node for node in nodes if states.get(node) != "running"}
+    
+    # Nothing to keep (or nothing visibly wrong): a full redeploy is as cheap and safer
+    if not recreate or len(recreate) == len(nodes):
+        return None
+    
+    reconnect = [
+        tuple(f"{topology_diff.container_name(new, node)}:{interface}" for node, interface in pair)
+        for pair in topology_diff.reconnect_links(new, recreate)
+    ]
+    
+    console.print(f"[bold green] ♻️  Incremental redeploy of {len(recreate)}/{len(nodes)} node(s): {sorted(recreate)}")
+    
+    return {"recreate": sorted(recreate), "remove": sorted(recreate | set(diff["removed"])), "reconnect": reconnect}
+
+
+
+def extract_and_pull_docker_images(yaml_string: str) -> List[str]:
+    """
+    Make the Docker images of a YAML topology available and return the pulled ones.
+    
+    The images come from the parsed topology (nodes, groups, kinds and defaults).
+    Images already present locally or in the digest index aren't pulled again,
+    the missing ones are pulled concurrently (see tools/images.py).
+    """
+    
+    found = images.images_from_yaml(yaml_string)
+    console.print(f"Images found: {found}")
+    
+    result = images.provisioner.ensure(found)
+    
+    for image in result["indexed"] + result["present"]:
+        console.print(f"[bold green] ✓ Image {image} already exists locally.")
+    
+    return result["pulled"]
+
+
+
+async def avalidate_and_deploy(yaml_content: str, output_filename: str, interactive: bool = True,
+                               live_yaml: Optional[str] = None, namespace: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Validate the topology locally, then write it, pull its images and deploy it.
+    
+    A topology rejected by the validator is neither written nor deployed, its
+    errors are returned right away for the correction prompt. `live_yaml` is the
+    topology whose (failed) lab is still up: only the nodes that changed since
+    are redeployed, or the whole lab is cleaned up first. With a `namespace`, the
+    lab is deployed under its name suffixed by it (see `topology_diff.namespace_lab`).
+    Returns {"error": str or None, "deployed": bool, "pulled": [...]}.
+    """
+    
+    yaml_content = topology_diff.namespace_lab(yaml_content, namespace)
+    if live_yaml:
+        live_yaml = topology_diff.namespace_lab(live_yaml, namespace)
+    
+    errors = topology_validator.validate_topology(yaml_content)
+    
+    if errors:
+        console.print(f"[bold red] ✗ {len(errors)} error(s) found by the validator, nothing deployed[/bold red]")
+        return {"error": "Errors found by the topology validator:\n" + topology_validator.format_errors(errors),
+                "deployed": False, "pulled": []}
+    
+    plan = await aplan_redeploy(live_yaml, yaml_content) if live_yaml else None
+    
+    if live_yaml and plan is None:
+        # The topology file on disk still describes the live lab
+        await acleanup_lab_on_enter(output_filename, input_bool=False)
+    elif plan:
+        await asyncio.to_thread(remove_lab_nodes, yaml.safe_load(live_yaml)["name"], plan["remove"])
+    
+    string_to_yaml_file(yaml_content, output_filename)
+    
+    # Pull the missing Docker images referenced in the YAML (or wait for the prefetches)
+    pulled = await asyncio.to_thread(extract_and_pull_docker_images, yaml_content)
+    
+    if plan:
+        error = await adeploy_and_graph_topology(output_filename, interactive, plan["recreate"], plan["reconnect"])
+    else:
+        error = await adeploy_and_graph_topology(output_filename, interactive)
+    
+    # An indexed image that vanished locally is checked (and pulled) again on the next attempt
+    forgotten = images.provisioner.forget_missing(error, images.images_from_yaml(yaml_content))
+    if forgotten:
+        console.print(f"[bold yellow] Images to check again after the failed deploy: {forgotten}")
+    
+    # The correction model and the known fixes see the lab under the name it was written with
+    if error and namespace:
+        error = error.replace(f"-{namespace}", "")
+    
+    return {"error": error, "deployed": True, "pulled": pulled}
 
 
 
 def runner(state: State) -> State:
+    """
+    Synchronous entry point of the Runner (graph.invoke)
+    """
+    
+    return asyncio.run(arunner(state))
+
+
+
+async def arunner(state: State) -> State:
     """
     Load LLM models and instructions
     Generate YAML topology using AI
@@ -342,14 +524,13 @@ def runner(state: State) -> State:
     Handle visualization and cleanup
     """
     
-    
-    # Initialize Large Language Models
-    llm = llm_management("")
-    llm_correction = ChatOllama(model="qwen2.5-coder:3b", temperature=0.05)
-    
     with open(file="nodes/instructions/runner_instruction.txt", mode="r") as file:
-    
         instruction = file.read().replace('{', '{{').replace('}', '}}')
+    
+    # Borrow the warm Large Language Models from the registry
+    async with allm_management("") as llm, \
+               aollama_model(CORRECTION_MODEL, temperature=0.05) as llm_correction:
+    
         console.print("[bold green] 🧠​ Generating the .yaml ...")
         
         # Extract document list from search results with fallback to empty string
@@ -381,55 +562,128 @@ def runner(state: State) -> State:
         
         chain = prompt | llm | response_filter
         
-        yaml_content: str = chain.invoke({
-            "instruction": instruction,
-            "question": state["question_explained"]
-        }, config={"callbacks": [SimpleThinkingCallback()]}) if chain else ""
-
-        # Save generated YAML to file
-        output_filename = "output.clab.yaml"
-        string_to_yaml_file(yaml_content, output_filename)
+        # Bounds of the whole run: the generation, the deploys and the corrections
+        controller = correction_memory.RetryController()
         
-        # Pull all Docker images referenced in the YAML
-        pulled_images = extract_and_pull_docker_images(yaml_content)
+        # The images are pulled in the background as soon as the LLM writes them
+        prefetch = images.ImagePrefetchCallback()
+        output_filename = state.get("topology_file") or "output.clab.yaml"
         
-        # Attempt deployment and get any deployment errors
-        deployment_error = deploy_and_graph_topology(output_filename)
+        # Server mode: the labs of the sessions run side by side, each under its own name.
+        # A cached topology has the lab name of the run that stored it, whose lab may still be up.
+        namespace = state.get("session") if state.get("cached_topology") or not state.get("interactive", True) else None
         
+        # Response cache hit: this topology already deployed successfully, no generation needed
+        yaml_content: str = state.get("cached_topology") or ""
+        deploying = False
         
-        # Error correction loop: keep trying to fix and redeploy if there are errors
-        if deployment_error:
-            while(deployment_error):
-                
-                cleanup_lab_on_enter(output_filename, input_bool=False)
-                
-                console.print("[bold green] 🧠​ Verifying the .yaml...")
-                if deployment_error:
-                    console.print(f"[bold red] ✗ Deployment error found:\n{deployment_error}[/bold red]")
+        try:
+            if not state.get("cached_topology"):
+                yaml_content = await asyncio.wait_for(chain.ainvoke({
+                    "instruction": instruction,
+                    "question": state["question_explained"]
+                }, config={"callbacks": thinking_callbacks(state) + [prefetch]}), controller.remaining()) if chain else ""
+            
+            # Validate, save and deploy the generated YAML
+            deploying = True
+            attempt = await asyncio.wait_for(
+                avalidate_and_deploy(yaml_content, output_filename, state.get("interactive", True), namespace=namespace),
+                controller.remaining())
+        except asyncio.TimeoutError:
+            # The lab may be half deployed: it is cleaned up when the loop gives up
+            attempt = {"error": controller.timeout_error(), "deployed": deploying, "pulled": []}
+        finally:
+            # Prefetches the deploy didn't wait for (aborted stream, rejected topology)
+            prefetch.cancel()
+        deployment_error = attempt["error"]
+        pulled_images = attempt["pulled"]
+        
+        
+        # A cached topology that doesn't deploy anymore must not be served again (a name clash isn't its fault)
+        if deployment_error and state.get("cached_topology") and not LAB_CONFLICT_RE.search(deployment_error):
+            await asyncio.to_thread(response_cache.invalidate, state["cached_topology"])
+        
+        # Error correction loop, bounded in iterations and time, stopped on cycles
+        failures = []
+        live_yaml = yaml_content if attempt["deployed"] else None
+        applied_fix = None
+        stop_reason = None
+        
+        while deployment_error:
+            
+            console.print("[bold green] 🧠​ Verifying the .yaml...")
+            console.print(f"[bold red] ✗ Deployment error found:\n{deployment_error}[/bold red]")
+            
+            # A known fix that fails now must not be applied again
+            if applied_fix:
+                await asyncio.to_thread(correction_memory.forget_fix, *applied_fix)
+                applied_fix = None
+            
+            stop_reason = controller.stop_reason(yaml_content, deployment_error)
+            if stop_reason:
+                console.print(f"[bold red] ✗ Giving up the corrections: {stop_reason}[/bold red]")
+                if live_yaml:
+                    await acleanup_lab_on_enter(output_filename, input_bool=False)
+                break
+            
+            failures.append((yaml_content, deployment_error))
+            
+            fix = await asyncio.to_thread(correction_memory.known_fix, yaml_content, deployment_error)
+            prefetch = images.ImagePrefetchCallback()
+            deploying = False
+            
+            try:
+                if fix:
+                    console.print("[bold green] ✓ Known error, applying the fix that deployed last time")
+                    applied_fix = (yaml_content, deployment_error)
+                    yaml_content = fix
                 else:
-                    console.print("[bold green] ✓ Deployment successful![/bold green]")
-
+                    prompt_correction = PromptTemplate(
+                            input_variables=["instruction", "question"],
+                            template=
+                            "Correct the Containerlab YAML if it has any syntax error. Return ONLY the corrected YAML without any explanation.\n\n"
+                            "CLIENT QUESTION (THE OBJECTIVE): {question}\n\n" +
+                            "YAML TO CORRECT:\n{yaml_content}\n\n"
+                            "Errors found during validation or deployment:\n{errors}\n\n"
+                    )
+                    
+                    chain = prompt_correction | llm_correction | response_filter
+                    
+                    yaml_content: str = await asyncio.wait_for(chain.ainvoke({
+                        "yaml_content": yaml_content,
+                        "question": state["question_explained"] or state["question"],
+                        "errors": deployment_error
+                    }, config={"callbacks": thinking_callbacks(state) + [prefetch]}), controller.remaining()) if chain else ""
                 
-                prompt_correction = PromptTemplate(
-                        input_variables=["instruction", "question"],
-                        template=
-                        "Correct the Containerlab YAML if it has any syntax error. Return ONLY the corrected YAML without any explanation.\n\n"
-                        "CLIENT QUESTION (THE OBJECTIVE): {question}\n\n" +
-                        "YAML TO CORRECT:\n{yaml_content}\n\n"
-                        "Errors found during deployment:\n{errors}\n\n"
-                )
-                
-                chain = prompt_correction | llm_correction | response_filter
-                
-                yaml_content: str = chain.invoke({
-                    "yaml_content": yaml_content,
-                    "question": state["question_explained"],
-                    "errors": deployment_error
-                }, config={"callbacks": [SimpleThinkingCallback()]}) if chain else ""
-                
-                string_to_yaml_file(yaml_content, output_filename)
-                pulled_images = extract_and_pull_docker_images(yaml_content)
-                deployment_error = deploy_and_graph_topology(output_filename)
+                # The failed lab stays up: only what the correction changed is redeployed
+                deploying = True
+                attempt = await asyncio.wait_for(
+                    avalidate_and_deploy(yaml_content, output_filename, state.get("interactive", True), live_yaml, namespace),
+                    controller.remaining())
+            except asyncio.TimeoutError:
+                # Not the fix's fault: it stays known
+                applied_fix = None
+                attempt = {"error": controller.timeout_error(), "deployed": deploying, "pulled": []}
+            finally:
+                prefetch.cancel()
+            
+            deployment_error = attempt["error"]
+            pulled_images += attempt["pulled"]
+            if attempt["deployed"]:
+                live_yaml = yaml_content
+        
+        if deployment_error:
+            state["response"] = (f"The YAML topology could not be deployed after {controller.iterations} correction(s): {stop_reason}.\n"
+                                 f"Last error:\n{deployment_error}")
+            return state
+        
+        # The corrections that led here are remembered for the next time
+        if failures:
+            await asyncio.to_thread(correction_memory.remember_fix, failures, yaml_content)
+        
+        # Successful topologies are reused for similar questions
+        if yaml_content != state.get("cached_topology"):
+            await asyncio.to_thread(response_cache.store, state["question"], yaml_content)
         
         console.print(Rule("[bold blue]Conteúdo do YAML Gerado[/bold blue]"))
         console.print(yaml_content)
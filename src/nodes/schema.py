@@ -7,6 +7,7 @@ from rich.panel import Panel
 from rich.text import Text
 from rich.live import Live
 import textwrap
+from tools.timeline import HEADLESS
 
 console = Console(force_terminal=True)
 
@@ -115,6 +116,9 @@ class State(TypedDict):
         plan (PlanModel): Execution plan with tasks
         response (str): System response/output
         search_result (Optional[DocSum]): Search results from documentation
+        interactive (bool): Whether the nodes may prompt the user (False in server mode)
+        topology_file (str): Path of the generated ContainerLab topology
+        cached_topology (str): Topology reused from the response cache (empty on a miss)
     """
     
     session: str
@@ -124,6 +128,9 @@ class State(TypedDict):
     plan: PlanModel
     response: str
     search_result: Optional[DocSum]
+    interactive: bool
+    topology_file: str
+    cached_topology: str
     
 class SimpleThinkingCallback(BaseCallbackHandler):
     """
@@ -243,4 +250,13 @@ class SimpleThinkingCallback(BaseCallbackHandler):
             self._live.stop()
             self._live = None
             self._started = False
-            console.print()  
\ No newline at end of file
+            console.print()  
+
+
+
+def thinking_callbacks(state: State) -> List[BaseCallbackHandler]:
+    """
+    Live "thinking" panel only when a user is watching the terminal.
+    """
+    
+    return [SimpleThinkingCallback()] if state.get("interactive", True) and not HEADLESS else []
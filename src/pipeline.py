@@ -0,0 +1,61 @@
+from nodes.cache import lookup_cache, alookup_cache, route_after_cache
+from nodes.orchestrator import create_planner, acreate_planner, State
+from nodes.researcher import search, asearch
+from nodes.runner import runner, arunner
+from nodes.schema import PlanModel, DocSum
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import StateGraph, START, END
+
+"""
+Graph construction shared by the command line entry point and the server mode.
+"""
+
+
+
+def build_graph():
+    """
+    Initilizing the state graph.
+    Nodes and edges are added to the graph
+    The compiled graph is stateless and can be reused for many requests
+    Each node has a native coroutine used by graph.ainvoke and a sync entry point for graph.invoke
+    """
+
+    graph_builder = StateGraph(State)
+
+    #Nodes
+    graph_builder.add_node("Cache", RunnableLambda(lookup_cache, afunc=alookup_cache, name="Cache"))
+    graph_builder.add_node("Orchestrator", RunnableLambda(create_planner, afunc=acreate_planner, name="Orchestrator"))
+    graph_builder.add_node("Researcher", RunnableLambda(search, afunc=asearch, name="Researcher"))
+    graph_builder.add_node("Runner", RunnableLambda(runner, afunc=arunner, name="Runner"))
+
+    #Edges
+    graph_builder.add_edge(START, "Cache")
+    graph_builder.add_conditional_edges("Cache", route_after_cache, ["Orchestrator", "Runner"])
+    graph_builder.add_edge("Orchestrator", "Researcher")
+    graph_builder.add_edge("Researcher", "Runner")
+    graph_builder.add_edge("Runner", END)
+
+    return graph_builder.compile()
+
+
+
+def new_state(question: str,
+              session: str = "",
+              interactive: bool = True,
+              topology_file: str = "output.clab.yaml") -> State:
+    """
+    Fresh state for one request. An empty session lets the Orchestrator create one.
+    """
+
+    return {
+        "session": session,
+        "question_explained": "",
+        "question": question,
+        "intent": "",
+        "plan": PlanModel(),
+        "response": "",
+        "search_result": DocSum(docList=[]),
+        "interactive": interactive,
+        "topology_file": topology_file,
+        "cached_topology": ""
+    }
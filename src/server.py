@@ -0,0 +1,252 @@
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional
+import argparse, asyncio, logging, os, re, time
+from fastapi import FastAPI, HTTPException
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+import uvicorn
+from pipeline import build_graph, new_state
+from nodes.orchestrator import new_session_id
+from nodes.runner import adestroy_lab
+from tools import db, models, timeline
+from tools.completion_cache import completion_cache
+from tools.rerank import reranker
+import config.logger_config as logger_config
+
+"""
+Long-running agent server.
+
+The LangGraph is compiled once and the ChromaDB client, the embedding model and
+the Ollama clients stay warm between requests. Every request gets its own State,
+session ID and topology file.
+
+The lab of a session is deployed under its name suffixed by the session ID, so
+that two sessions never share a lab. It stays deployed after its request:
+`DELETE /sessions/{session}` destroys it (by the name written in its topology
+file), and the labs older than CLAB_LAB_TTL seconds are destroyed by a
+background reaper. A new intent on a session replaces its lab.
+
+Usage (from `src`):
+    python server.py --port 8000
+    python server.py --uds /tmp/clab_agent.sock
+"""
+
+
+logger_config.loggerConfiguration()
+logger = logging.getLogger(__name__)
+
+
+# Directory holding the topology generated for each session
+LABS_DIR = Path("labs")
+
+# Maximum number of requests running the graph at the same time
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("CLAB_MAX_CONCURRENT_REQUESTS", 4))
+
+# Lifetime of a deployed session lab (0 keeps the labs until DELETE /sessions/{session})
+LAB_TTL_SECONDS = int(os.environ.get("CLAB_LAB_TTL", 3600))
+
+# Interval between two passes of the lab reaper
+REAPER_INTERVAL_SECONDS = int(os.environ.get("CLAB_LAB_REAPER_INTERVAL", 60))
+
+
+
+class IntentRequest(BaseModel):
+    """
+    Intent submitted by a client.
+    """
+
+    question: str
+    session: Optional[str] = None
+
+
+
+class IntentResponse(BaseModel):
+    """
+    Result of the pipeline for one intent.
+    """
+
+    session: str
+    intent: str
+    question_explained: str
+    plan: dict
+    response: str
+    topology_file: str
+    topology: str
+
+
+
+def warm_up() -> None:
+    """
+    Load the models shared by every request before accepting traffic
+    """
+
+    models.ensure_ollama_server()
+
+    # Released handles stay loaded in the registry until evicted
+    with models.cross_encoder(reranker.backend):
+        pass
+
+    # Loads the sentence-transformers embedder (db.embedder) and opens the documentation collection
+    db.query_scrapy(["containerlab topology"])
+
+    logger.info(f"☑️ Models warm: {models.registry.stats()}")
+
+
+
+def topology_file(session: str) -> Path:
+    # Session IDs are URL-safe base64, nothing that could leave LABS_DIR
+    if not re.fullmatch(r"[A-Za-z0-9_-]+", session):
+        raise HTTPException(status_code=400, detail=f"Invalid session ID: {session}")
+    return LABS_DIR / f"{session}.clab.yaml"
+
+
+
+async def destroy_session_lab(session: str) -> bool:
+    """
+    Destroy the lab of a session and delete its topology file.
+    Returns False when containerlab failed (the file is kept to retry).
+    """
+
+    path = topology_file(session)
+    error = await adestroy_lab(str(path))
+
+    if error is not None:
+        logger.warning(f"Lab of session {session} not destroyed: {error}")
+        return False
+
+    path.unlink(missing_ok=True)
+    logger.info(f"🧹 Lab of session {session} destroyed")
+    return True
+
+
+
+async def reap_labs(app: FastAPI) -> None:
+    """
+    Destroy the session labs deployed more than LAB_TTL_SECONDS ago (the topology
+    file is written by the deploy), except those of the requests still running.
+    """
+
+    while True:
+        await asyncio.sleep(REAPER_INTERVAL_SECONDS)
+
+        deadline = time.time() - LAB_TTL_SECONDS
+        for path in LABS_DIR.glob("*.clab.yaml"):
+            session = path.name[:-len(".clab.yaml")]
+            if session in app.state.active_sessions or path.stat().st_mtime > deadline:
+                continue
+            try:
+                await destroy_session_lab(session)
+            except Exception:
+                logger.exception(f"Lab reaper failed on session {session}")
+
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+
+    LABS_DIR.mkdir(parents=True, exist_ok=True)
+
+    app.state.graph = build_graph()
+    app.state.slots = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    app.state.active_sessions = set()
+    await asyncio.to_thread(warm_up)
+
+    reaper = asyncio.create_task(reap_labs(app)) if LAB_TTL_SECONDS > 0 else None
+
+    logger.info("☑️ Agent server ready.")
+    yield
+
+    if reaper:
+        reaper.cancel()
+
+
+
+app = FastAPI(title="Clab Agent", lifespan=lifespan)
+
+
+
+@app.get("/health")
+def health():
+    return {
+        "status": "ok",
+        "models": models.registry.stats(),
+        "llm_cache": completion_cache.stats() if completion_cache else None,
+        "rerank": reranker.stats()
+    }
+
+
+
+@app.post("/intents", response_model=IntentResponse)
+async def submit_intent(request: IntentRequest) -> IntentResponse:
+    """
+    Run the whole graph for one intent.
+
+    The nodes are native coroutines: the sessions are multiplexed on the event
+    loop while they wait on LLM tokens, Chroma or container startup.
+    """
+
+    session = request.session or new_session_id()
+    state = new_state(request.question,
+                      session=session,
+                      interactive=False,
+                      topology_file=str(topology_file(session)))
+
+    async with app.state.slots:
+        app.state.active_sessions.add(session)
+        try:
+            if topology_file(session).exists():
+                await destroy_session_lab(session)
+            final_state = await app.state.graph.ainvoke(state)
+        except Exception as e:
+            logger.exception(f"Session {session} failed")
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            #Deleting the context collection and the timelines after the session ends
+            await asyncio.to_thread(db.delete_collection, session, "context")
+            timeline.discard(session)
+            app.state.active_sessions.discard(session)
+
+    topology_path = Path(final_state["topology_file"])
+
+    return IntentResponse(
+        session=session,
+        intent=final_state["intent"],
+        question_explained=final_state["question_explained"],
+        plan=jsonable_encoder(final_state["plan"]),
+        response=final_state["response"],
+        topology_file=str(topology_path),
+        topology=topology_path.read_text(encoding="utf-8") if topology_path.exists() else ""
+    )
+
+
+
+@app.delete("/sessions/{session}")
+async def end_session(session: str):
+    """
+    Destroy the lab deployed for a session (its containers stay up until then, or until the TTL)
+    """
+
+    if session in app.state.active_sessions:
+        raise HTTPException(status_code=409, detail=f"Session {session} is still running")
+    if not topology_file(session).exists():
+        raise HTTPException(status_code=404, detail=f"No lab for session {session}")
+    if not await destroy_session_lab(session):
+        raise HTTPException(status_code=500, detail=f"The lab of session {session} could not be destroyed")
+
+    return {"session": session, "destroyed": True}
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Clab Agent server mode")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--uds", default=None, help="Listen on a Unix socket instead of TCP")
+    args = parser.parse_args()
+
+    if args.uds:
+        uvicorn.run(app, uds=args.uds)
+    else:
+        uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,125 @@
+import argparse, glob, os, re, time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+from parsel import Selector
+from rich.console import Console
+import page_extract
+from snapshot_store import SnapshotStore, SNAPSHOT_PATH
+
+"""
+Micro-benchmark of the documentation page extraction (`ClabDoc.parse_doc`) over
+saved HTML pages: the crawl snapshots (`-a snapshot=record`) or HTML files.
+
+The former string-concatenation extraction is kept here as the baseline, and the
+benchmark checks that both give the same page content.
+
+Usage (from `src`):
+    python tools/bench_parse_doc.py [--snapshots ./crawl_snapshots] [--html 'pages/*.html'] [--repeat 5] [--workers 4]
+"""
+
+
+console = Console(force_terminal=True)
+
+
+
+def legacy_extract(selector: Selector, url: str) -> str:
+    """
+    Extraction as parse_doc did it before page_extract (quadratic on large pages)
+    """
+
+    article = selector.xpath('//article/*')
+    page_content = "url: " + url + "\n"
+
+    for element in article:
+        tag = element.xpath('name()').get()
+        codes = element.xpath('.//code[@class="md-code__content"]')
+
+        text_code = ["\nCode (YAML ou SQL ou CLI)\n"]
+
+        if codes:
+            spans = codes.xpath('./span')
+
+            for span in spans:
+                text_code = text_code + ["\n"] + span.xpath("./span/text()").getall() if len(text_code) != 0 else span.xpath("./span/text()").getall()
+
+            if not "".join(text_code).strip() == "Code (YAML ou SQL ou CLI)":
+                page_content = page_content + "".join(text_code) + "\n\n"
+
+        if tag == "h1":
+            page_content = page_content + "# " + str(element.xpath('text()').get()) + "\n\n"
+        if tag == "h2":
+            page_content = page_content + "## " + str(element.xpath('text()').get()) + "\n\n"
+        if tag == "h3":
+            page_content = page_content + "### " + str(element.xpath('text()').get()) + "\n\n"
+        if tag == "h4":
+            page_content = page_content + "#### " + str(element.xpath('text()').get()) + "\n\n"
+
+        if tag == "p":
+            p_content = element.get()
+
+            if p_content:
+                p_content = re.sub(r'^<p[^>]*>|</p>$', '', p_content.strip())
+                p_content = re.sub(r'<code[^>]*>|</code>', '', p_content)
+                p_content = re.sub(r'<a[^>]*>|</a>', '', p_content)
+
+                p_content = ' '.join(p_content.split())
+
+                page_content = page_content + str(p_content) + "\n\n"
+
+    return page_content
+
+
+
+def load_pages(snapshots: str, html: str) -> List[Tuple[str, str]]:
+    if html:
+        return [(f"file://{os.path.abspath(path)}", open(path, encoding="utf-8").read()) for path in sorted(glob.glob(html))]
+
+    store = SnapshotStore(snapshots)
+    return [(url, store.get(url)["body"].decode("utf-8", errors="replace")) for url in store.urls()]
+
+
+
+def timed(label: str, repeat: int, func) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    console.print(f"  {label:<28} {best * 1000:9.1f} ms")
+    return best
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the documentation page extraction")
+    parser.add_argument("--snapshots", default=SNAPSHOT_PATH, help="Snapshot store of a recorded crawl")
+    parser.add_argument("--html", default="", help="Glob of HTML files (instead of the snapshots)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per variant, the best one is reported")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes of the pool variant")
+    args = parser.parse_args()
+
+    pages = load_pages(args.snapshots, args.html)
+    if not pages:
+        console.print("[bold red]No saved pages, record a crawl with `-a snapshot=record` or pass --html.")
+        raise SystemExit(1)
+
+    size = sum(len(html) for _, html in pages)
+    console.print(f"[bold yellow]{len(pages)} pages, {size / 1e6:.1f} MB of HTML, best of {args.repeat} runs:")
+
+    # Parsing the HTML is the same for both, it is kept out of the extraction timings
+    selectors = [(url, Selector(text=html)) for url, html in pages]
+
+    mismatches = [url for url, sel in selectors if legacy_extract(sel, url) != page_extract.extract_content(sel, url)]
+    if mismatches:
+        console.print(f"[bold red]Different content for {len(mismatches)} pages, e.g. {mismatches[0]}")
+
+    legacy = timed("legacy concatenation", args.repeat, lambda: [legacy_extract(sel, url) for url, sel in selectors])
+    builder = timed("StringIO builder", args.repeat, lambda: [page_extract.extract_content(sel, url) for url, sel in selectors])
+    serial = timed("parse + extract", args.repeat, lambda: page_extract.extract_pages(pages))
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        page_extract.extract_pages(pages[:args.workers], pool)  # workers started outside the timing
+        pooled = timed(f"parse + extract ({args.workers} procs)", args.repeat, lambda: page_extract.extract_pages(pages, pool))
+
+    console.print(f"[bold green]✓ builder x{legacy / builder:.2f} vs legacy, pool x{serial / pooled:.2f} vs serial")
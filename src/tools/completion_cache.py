@@ -0,0 +1,126 @@
+import sqlite3, hashlib, threading, time, logging, os
+from typing import Any, Dict, Optional
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+
+# =============================================================================
+# PERSISTENT PROMPT -> COMPLETION CACHE
+# =============================================================================
+
+
+logger = logging.getLogger(__name__)
+
+
+# Next to the sources (src/llm_cache.sqlite3), whatever the working directory
+CACHE_PATH = os.environ.get("CLAB_LLM_CACHE_PATH",
+                            os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "llm_cache.sqlite3"))
+
+# Maximum number of completions kept, the least recently used are evicted first
+MAX_ENTRIES = int(os.environ.get("CLAB_LLM_CACHE_MAX_ENTRIES", 5000))
+
+# Set CLAB_LLM_CACHE=0 to always call the models
+ENABLED = os.environ.get("CLAB_LLM_CACHE", "1") not in ("0", "false")
+
+
+
+class CompletionCache(BaseCache):
+    """
+    Content-addressed completion cache shared by every ChatOllama of the process.
+
+    LangChain hands the cache the fully rendered prompt and the `llm_string`
+    (model name and options). Their SHA-256 is the key of a SQLite table, so
+    identical calls across runs and retries skip the generation entirely.
+    The table is bounded by `max_entries` (LRU on the last access time) and
+    hit/miss counters are kept for the process. The database is only opened
+    on first use, importing the module creates no file.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = MAX_ENTRIES) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Caller holds the lock
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, "
+                "generations TEXT NOT NULL, "
+                "last_access REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self._key(prompt, llm_string)
+
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT generations FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            conn.execute("UPDATE completions SET last_access = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+
+        try:
+            return loads(row[0])
+        except Exception as e:
+            logger.warning(f"Unreadable cached completion {key}: {e}")
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = self._key(prompt, llm_string)
+        generations = dumps(list(return_val))
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO completions (key, generations, last_access) VALUES (?, ?, ?)",
+                (key, generations, time.time())
+            )
+
+            # Size-bounded eviction
+            count = conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM completions WHERE key IN "
+                    "(SELECT key FROM completions ORDER BY last_access ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            conn.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM completions")
+            conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._connection().execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+
+# Process-wide instance (None when disabled)
+completion_cache: Optional[CompletionCache] = CompletionCache() if ENABLED else None
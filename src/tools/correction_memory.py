@@ -0,0 +1,174 @@
+import sqlite3, hashlib, threading, time, os, re, json, logging
+from typing import List, Optional, Set, Tuple
+import yaml
+
+# =============================================================================
+# DEPLOYMENT CORRECTION LOOP: BUDGET AND MEMORY OF THE FIXES
+# =============================================================================
+
+"""
+Bounds of the runner's correction loop, and the fixes it found.
+
+`RetryController` stops the loop after CLAB_CORRECTION_MAX_ITERATIONS corrections,
+after CLAB_CORRECTION_BUDGET seconds, or as soon as a (YAML, error) pair comes
+back. That happens when the correction model answers with a topology that
+already failed the same way. The budget is wall-clock time from the generation
+on: each LLM call and deploy is given the `remaining()` time only.
+
+The persistent store maps a (broken YAML, error signature) pair to the topology
+that finally deployed. The signature is the error stripped of what changes
+between runs: timestamps, IDs, colors. When the same mistake shows up again,
+the known fix is applied without calling the LLM.
+
+A fix is a whole topology, so it is only reused for the same topology: keyed on
+the error alone, the fix of another request would replace the requested lab.
+The YAML is hashed once parsed, so formatting, comments and key order don't
+prevent a hit.
+"""
+
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_PATH = os.environ.get("CLAB_CORRECTION_MEMORY_PATH", "./correction_memory.sqlite3")
+MAX_ITERATIONS = int(os.environ.get("CLAB_CORRECTION_MAX_ITERATIONS", 5))
+BUDGET_SECONDS = float(os.environ.get("CLAB_CORRECTION_BUDGET", 600))
+
+_ANSI_RE = re.compile(r'\x1b\[[0-9;]*[A-Za-z]')
+_TIME_RE = re.compile(r'\d{4}-\d{2}-\d{2}[T ]|\d{2}:\d{2}:\d{2}(\.\d+)?|\[\d{4}\]')
+_ID_RE = re.compile(r'\b[0-9a-f]{12,64}\b')
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+
+
+
+def _connection() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(CACHE_PATH, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS fixes ("
+            "yaml_hash TEXT NOT NULL, "
+            "signature TEXT NOT NULL, "
+            "fixed_yaml TEXT NOT NULL, "
+            "hits INTEGER NOT NULL DEFAULT 0, "
+            "updated REAL NOT NULL, "
+            "PRIMARY KEY (yaml_hash, signature))"
+        )
+        _conn.commit()
+    return _conn
+
+
+
+def yaml_hash(yaml_content: str) -> str:
+    # Formatting, comments and key order don't change a topology
+    try:
+        canonical = json.dumps(yaml.safe_load(yaml_content), sort_keys=True, default=str)
+    except (yaml.YAMLError, TypeError):
+        lines = [line.rstrip() for line in yaml_content.strip().splitlines() if line.strip()]
+        canonical = "\n".join(lines)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+
+def error_signature(error: str) -> str:
+    """
+    Hash of the error lines of a deployment output, without the run-specific parts
+    """
+
+    text = _ID_RE.sub("<id>", _TIME_RE.sub("", _ANSI_RE.sub("", error or "")))
+    lines = [" ".join(line.split()) for line in text.splitlines() if line.strip()]
+    errors = [line for line in lines if re.search(r'error|erro\b|fail|invalid|not found|✗', line, re.IGNORECASE)]
+    return hashlib.sha1("\n".join(errors or lines).encode("utf-8")).hexdigest()
+
+
+
+def known_fix(yaml_content: str, error: str) -> Optional[str]:
+    """
+    Topology that deployed after this YAML failed with this error, if any
+    """
+
+    with _lock:
+        conn = _connection()
+        key = (yaml_hash(yaml_content), error_signature(error))
+        row = conn.execute("SELECT fixed_yaml FROM fixes WHERE yaml_hash = ? AND signature = ?", key).fetchone()
+        if row:
+            conn.execute("UPDATE fixes SET hits = hits + 1 WHERE yaml_hash = ? AND signature = ?", key)
+            conn.commit()
+
+    return row[0] if row else None
+
+
+
+def remember_fix(failures: List[Tuple[str, str]], fixed_yaml: str) -> None:
+    """
+    Store the deployed topology as the fix of every (YAML, error) failure that led to it
+    """
+
+    now = time.time()
+
+    with _lock:
+        conn = _connection()
+        conn.executemany(
+            "INSERT OR REPLACE INTO fixes (yaml_hash, signature, fixed_yaml, hits, updated) VALUES (?, ?, ?, 0, ?)",
+            [(yaml_hash(yaml_content), error_signature(error), fixed_yaml, now) for yaml_content, error in failures]
+        )
+        conn.commit()
+
+
+
+def forget_fix(yaml_content: str, error: str) -> None:
+    """
+    Drop a known fix that doesn't deploy anymore
+    """
+
+    with _lock:
+        conn = _connection()
+        conn.execute("DELETE FROM fixes WHERE yaml_hash = ? AND signature = ?", (yaml_hash(yaml_content), error_signature(error)))
+        conn.commit()
+
+
+
+class RetryController:
+    """
+    Decides whether the correction loop may run one more correction.
+    """
+
+    def __init__(self, max_iterations: int = MAX_ITERATIONS, budget_seconds: float = BUDGET_SECONDS) -> None:
+        self.max_iterations = max_iterations
+        self.budget_seconds = budget_seconds
+        self.iterations = 0
+        self.started = time.monotonic()
+        self._seen: Set[Tuple[str, str]] = set()
+
+    def remaining(self) -> float:
+        """
+        Seconds left in the budget, the timeout of the next LLM call or deploy
+        """
+
+        return max(0.0, self.budget_seconds - (time.monotonic() - self.started))
+
+    def timeout_error(self) -> str:
+        return f"Timed out: the time budget of {self.budget_seconds:.0f}s ran out during the call"
+
+    def stop_reason(self, yaml_content: str, error: str) -> Optional[str]:
+        """
+        Why the loop must stop before correcting this failure (None: go on)
+        """
+
+        key = (yaml_hash(yaml_content), error_signature(error))
+        if key in self._seen:
+            return "the same topology failed with the same error again (cycle)"
+        self._seen.add(key)
+
+        if self.iterations >= self.max_iterations:
+            return f"{self.max_iterations} corrections without a successful deployment"
+
+        elapsed = time.monotonic() - self.started
+        if elapsed >= self.budget_seconds:
+            return f"time budget of {self.budget_seconds:.0f}s exhausted ({elapsed:.0f}s)"
+
+        self.iterations += 1
+        return None
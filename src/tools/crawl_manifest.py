@@ -0,0 +1,97 @@
+import json, os, hashlib, logging
+from typing import Dict, Iterable, List, Set
+
+# =============================================================================
+# PAGE MANIFEST OF THE DOCUMENTATION CRAWL
+# =============================================================================
+
+"""
+What the last crawl saw of every documentation page, keyed by URL:
+
+    {"etag": ..., "last_modified": ...,   # HTTP validators, sent back as conditional headers
+     "hash": ...,                         # SHA1 of the extracted page content
+     "links": [...],                      # allowed URLs found in its navigation
+     "chunk_ids": [...]}                  # chunks of the page stored in clab_web
+
+`ClabDoc` uses it in incremental mode to skip the unchanged pages and to update
+only the chunks of the pages that changed or disappeared.
+
+No project imports here, the spider imports this module from `tools/` directly.
+"""
+
+
+logger = logging.getLogger(__name__)
+
+
+MANIFEST_PATH = os.environ.get("CLAB_CRAWL_MANIFEST_PATH", "./crawl_manifest.json")
+
+
+
+def page_hash(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+
+def load(path: str = MANIFEST_PATH) -> Dict[str, dict]:
+    """
+    The manifest of the last crawl, empty when there is none (or it is unreadable)
+    """
+
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning(f"Unreadable crawl manifest {path}, starting from scratch: {e}")
+        return {}
+
+
+
+def save(manifest: Dict[str, dict], path: str = MANIFEST_PATH) -> None:
+    # Written aside and renamed, an interrupted crawl never leaves a truncated manifest
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+
+def conditional_headers(entry: dict) -> Dict[str, str]:
+    """
+    Request headers asking the server to answer 304 if the page didn't change
+    """
+
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+
+def chunk_ids(manifest: Dict[str, dict], urls) -> List[str]:
+    return [chunk_id for url in urls for chunk_id in manifest.get(url, {}).get("chunk_ids", [])]
+
+
+
+def removed_urls(manifest: Dict[str, dict], discovered_urls: Iterable[str]) -> Set[str]:
+    """
+    Pages of the last crawl that no page links to anymore (only meaningful after a complete crawl)
+    """
+
+    return set(manifest) - set(discovered_urls)
+
+
+
+def merge(manifest: Dict[str, dict], pages: Dict[str, dict], removed: Iterable[str]) -> Dict[str, dict]:
+    """
+    Manifest after an incremental crawl: the entries of this crawl's pages replace the
+    previous ones, the removed pages are dropped and the pages not crawled are kept
+    """
+
+    removed = set(removed)
+    merged = {url: entry for url, entry in manifest.items() if url not in removed}
+    merged.update(pages)
+    return merged
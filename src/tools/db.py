@@ -1,19 +1,79 @@
-import chromadb, logging
+import logging, os, threading
 from typing import List
-from chromadb.api import ClientAPI
 from typing import Literal, overload, Optional
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
 from langchain_core.documents import Document
-from langchain_chroma import Chroma
+
+# The spider imports this module from `tools/` directly
+try:
+    import tools.keyword_index as keyword_index
+    import tools.vector_store as vector_store
+except ImportError:
+    import keyword_index
+    import vector_store
 
 # =============================================================================
-# CHROMADB CONFIGURATION
+# VECTOR STORE CONFIGURATION
 # =============================================================================
 
 
-# Embbeded client initialisation
-client = chromadb.PersistentClient(path="./chroma_embedded")
-print("✅ ChromaDB started.")
+# Vector store of the process (embedded Chroma by default, see tools/vector_store.py)
+store: vector_store.VectorStore = vector_store.open_store()
+
+# Records written per upsert call (Chroma caps the size of a batch)
+UPSERT_BATCH_SIZE = 1000
+
+# Reciprocal-rank fusion constant (the usual value from the RRF paper)
+RRF_K = 60
+
+# Weight of the vector score in the hybrid retrieval (the rest goes to BM25)
+HYBRID_ALPHA = float(os.environ.get("CLAB_HYBRID_ALPHA", 0.5))
+
+# Adaptive retrieval depth: lists fetched RETRIEVAL_MAX deep are cut at the first
+# score gap larger than RETRIEVAL_GAP (share of the list's score spread)
+RETRIEVAL_MIN = int(os.environ.get("CLAB_RETRIEVAL_MIN", 3))
+RETRIEVAL_MAX = int(os.environ.get("CLAB_RETRIEVAL_MAX", 20))
+RETRIEVAL_GAP = float(os.environ.get("CLAB_RETRIEVAL_GAP", 0.3))
+
+# Embedding model of every collection (documentation, session context, response cache)
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BATCH_SIZE = int(os.environ.get("CLAB_EMBEDDING_BATCH_SIZE", 64))
+
+
+class SentenceEmbeddings(Embeddings):
+    """
+    The embedding function of every collection, for the indexing and the querying paths.
+    
+    The collections are always given explicit embeddings computed here, never
+    `query_texts`: Chroma's own default embedder is never loaded and every score
+    comes from the same model. The model is loaded once per process, on first use,
+    and encodes all the texts of a call in batches of `batch_size`.
+    """
+    
+    def __init__(self, model_name: str = EMBEDDING_MODEL, batch_size: int = EMBEDDING_BATCH_SIZE) -> None:
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model = None
+        self._lock = threading.Lock()
+    
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.model_name)
+            return self._model
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.model().encode(list(texts), batch_size=self.batch_size, convert_to_numpy=True).tolist()
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+# Process-wide embedder
+embedder = SentenceEmbeddings()
         
 def query_context(input_txt: List[str], session_id: str):
     """
@@ -23,11 +83,11 @@ def query_context(input_txt: List[str], session_id: str):
     try:
         
         # Capturing collection (it must be created)
-        collection = client.get_or_create_collection(name="clab" + session_id)
+        collection = store.get_or_create_collection(name="clab" + session_id)
         
         # Embbeding Consulting from input_text 
         result = collection.query(
-            query_texts=input_txt,
+            query_embeddings=embedder.embed_documents(input_txt),
             include=["documents"],
             n_results=10 # it will take 10 documents (ContainerLab pages)
         )
@@ -37,61 +97,226 @@ def query_context(input_txt: List[str], session_id: str):
     except Exception as e:
         print(f"Impossible to query the scrapy. Error: {e}")
         
-def query_scrapy(input_txt: List[str]):
+def query_scrapy(input_txt: List[str], n_results: int = 10):
     """
-    Used to realise consulting by semantic comparation
+    Used to realise consulting by semantic comparation, blended with the BM25 keyword search
     """
     
     try:
         
         # Capturing collection (it must be created)
-        collection = client.get_collection(name="clab_web")
+        collection = store.get_collection(name="clab_web")
         
-        # Embbeding Consulting from input_text 
+        # The query embeddings are kept for the bi-encoder prefilter of the Researcher
+        query_embeddings = embedder.embed_documents(input_txt)
+        
+        # Embbeding Consulting from input_text (metadatas carry the pre-built summaries)
         result = collection.query(
-            query_texts=input_txt,
-            include=["documents"],
-            n_results=10 # it will take 10 documents (ContainerLab pages)
+            query_embeddings=query_embeddings,
+            include=["documents", "metadatas", "distances", "embeddings"],
+            n_results=n_results # it will take 10 documents (ContainerLab pages) by default
         )
         
+        # Exact tokens (kinds, keys) missed by the embeddings are caught by the keyword index
+        keyword_hits = keyword_index.search(input_txt, n_results)
+        if any(keyword_hits):
+            result = blend_keyword(collection, result, keyword_hits, n_results)
+        
+        result["query_embeddings"] = query_embeddings
         return result
         
     except Exception as e:
         print(f"Impossible to query the scrapy. Error: {e}")
+
+def _min_max(scores: dict) -> dict:
+    if not scores:
+        return {}
+    low, high = min(scores.values()), max(scores.values())
+    return {key: (score - low) / (high - low) if high > low else 1.0 for key, score in scores.items()}
+
+def blend_keyword(collection, result: dict, keyword_hits: List[List[tuple]], n_results: int) -> dict:
+    """
+    Hybrid ranking of each query: min-max normalised vector similarity and BM25 score,
+    weighted by HYBRID_ALPHA, over the union of both candidate lists
+    """
     
-def add_scrapy(document: List[Document], embeddings: HuggingFaceEmbeddings, ids: List[str]):
-   
+    # Candidate pool shared by the queries: the vector hits of every query, plus the
+    # chunks found only by the keyword search (fetched in one call)
+    pool = {}
+    for q, ids in enumerate(result["ids"]):
+        for chunk_id, document, metadata, embedding in zip(ids, result["documents"][q], result["metadatas"][q],
+                                                           result["embeddings"][q]):
+            pool.setdefault(chunk_id, (document, metadata, embedding))
+    
+    extra_ids = list(dict.fromkeys(chunk_id for hits in keyword_hits for chunk_id, _ in hits if chunk_id not in pool))
+    extra = collection.get(ids=extra_ids, include=["documents", "metadatas", "embeddings"]) if extra_ids else {"ids": []}
+    extra_embeddings = extra.get("embeddings")
+    extra_embeddings = list(extra_embeddings) if extra_embeddings is not None else [None] * len(extra["ids"])
+    for chunk_id, document, metadata, embedding in zip(extra["ids"], extra.get("documents") or [],
+                                                       extra.get("metadatas") or [], extra_embeddings):
+        pool.setdefault(chunk_id, (document, metadata, embedding))
+    
+    blended = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": [], "scores": []}
+    for q, hits in enumerate(keyword_hits):
+        
+        # A chunk has a distance only for the queries that retrieved it by vector
+        distances = dict(zip(result["ids"][q], result["distances"][q]))
+        
+        vector = _min_max({chunk_id: -distance for chunk_id, distance in distances.items()})
+        keyword = _min_max({chunk_id: score for chunk_id, score in hits if chunk_id in pool})
+        
+        scores = {chunk_id: HYBRID_ALPHA * vector.get(chunk_id, 0.0) + (1 - HYBRID_ALPHA) * keyword.get(chunk_id, 0.0)
+                  for chunk_id in set(vector) | set(keyword)}
+        ranked = sorted(scores, key=scores.get, reverse=True)[:n_results]
+        
+        blended["ids"].append(ranked)
+        blended["documents"].append([pool[chunk_id][0] for chunk_id in ranked])
+        blended["metadatas"].append([pool[chunk_id][1] for chunk_id in ranked])
+        blended["distances"].append([distances.get(chunk_id) for chunk_id in ranked])
+        blended["embeddings"].append([pool[chunk_id][2] for chunk_id in ranked])
+        blended["scores"].append([scores[chunk_id] for chunk_id in ranked])
+    
+    return blended
+
+def adaptive_depth(scores: List[float], min_results: int = RETRIEVAL_MIN, gap: float = RETRIEVAL_GAP) -> int:
     """
-    Used to add a scrapy of Containerlab Documentation
+    Number of results worth keeping from a ranked list (higher is better): the list is cut
+    at the first large score gap, once `min_results` results are kept
     """
+    
+    if len(scores) <= min_results:
+        return len(scores)
+    
+    spread = scores[0] - scores[-1]
+    if spread <= 0:
+        return len(scores)
+    
+    for i in range(min_results, len(scores)):
+        if (scores[i - 1] - scores[i]) / spread >= gap:
+            return i
+    return len(scores)
+
+def fuse_ranked(result: dict, k: int = RRF_K, n_results: Optional[int] = None) -> dict:
+    """
+    Reciprocal-rank fusion of a batched query: the ranked lists of every query text
+    become a single list of unique chunks (by ID), shaped like a one-query result
+    """
+    
+    fused = {}
+    for q, ids in enumerate(result.get("ids") or []):
+        for rank, chunk_id in enumerate(ids):
+            if chunk_id not in fused:
+                fused[chunk_id] = [0.0, q, rank]
+            fused[chunk_id][0] += 1.0 / (k + rank + 1)
+    
+    ranked = sorted(fused.items(), key=lambda item: item[1][0], reverse=True)[:n_results]
+    
+    merged = {"ids": [[chunk_id for chunk_id, _ in ranked]], "scores": [[score for _, (score, _, _) in ranked]]}
+    for field in ("documents", "metadatas", "distances", "embeddings"):
+        if result.get(field) is not None:
+            merged[field] = [[result[field][q][rank] for _, (_, q, rank) in ranked]]
+    
+    return merged
+
+def query_scrapy_multi(input_txt: List[str], n_results: int = 10, max_results: int = RETRIEVAL_MAX):
+    """
+    Used to consult the scrapy with several formulations (question and plan tasks) in a single
+    batched query, the ranked lists being fused (RRF) and deduplicated by chunk ID.
+    
+    Each list is fetched `max_results` deep and cut at its first large score gap
+    (adaptive depth), so a clear-cut query brings fewer candidates to the reranking.
+    """
+    
+    # Same formulation twice would only weigh more in the fusion
+    input_txt = list(dict.fromkeys(txt for txt in input_txt if txt and txt.strip()))
+    if not input_txt:
+        return None
+    
+    result = query_scrapy(input_txt, max_results)
+    if not result:
+        return None
+    
+    # Hybrid scores when the keyword index exists, vector distances otherwise
+    fields = [field for field in ("ids", "documents", "metadatas", "distances", "embeddings", "scores") if result.get(field) is not None]
+    cut = {field: [] for field in fields}
+    for q in range(len(result["ids"])):
+        scores = result["scores"][q] if "scores" in cut else [-d for d in result["distances"][q]]
+        depth = adaptive_depth(scores)
+        for field in fields:
+            cut[field].append(list(result[field][q][:depth]))
+    
+    merged = fuse_ranked(cut, n_results=n_results)
+    merged["query_texts"] = input_txt
+    merged["query_embeddings"] = result["query_embeddings"]
+    return merged
+    
+def add_scrapy(document: List[Document], embeddings: Optional[Embeddings], ids: List[str]):
    
-    try:
-        client.delete_collection(name="clab_web")
-        print("Existing clab_web collection deleted")
-    except Exception as e:
-        print(f"Collection clab_web didn't exist or couldn't be deleted: {e}")
+    """
+    Used to add a full scrapy of Containerlab Documentation. The chunks are upserted and
+    only then the chunks of the previous scrapy that aren't part of it are deleted:
+    the live collection is never empty during a refresh
+    """
+    
+    collection = store.get_or_create_collection(name="clab_web", metadata={"lang": "en-US", "type": "scrapy"})
+    stale = set(collection.get(include=[])["ids"]) - set(ids)
+    
+    update_scrapy(document=document, embeddings=embeddings, ids=ids, delete_ids=list(stale))
+
+def update_scrapy(document: List[Document], embeddings: Optional[Embeddings], ids: List[str], delete_ids: List[str]):
+    
+    """
+    Used to refresh part of the scrapy: upserting the given chunks (only them are embedded)
+    and deleting the chunks of the pages that changed or disappeared.
+    `embeddings` must wrap the `embedder` model (e.g. a cache of it), `embedder` by default
+    """
     
     try:
-        collection = client.create_collection(name="clab_web")
-        
-        # Storing the 
-        vectorstore = Chroma(
-            client=client,
-            collection_name="clab_web",
-            embedding_function=embeddings,
-            collection_metadata={"lang": "en-US", "type": "scrapy"}
-        )
+        collection = store.get_or_create_collection(name="clab_web", metadata={"lang": "en-US", "type": "scrapy"})
         
-        vectorstore.add_documents(documents=document, ids=ids)
-        print(f"Successfully added {len(document)} documents to clab_web collection")
+        # Storing the chunks (upsert, the existing IDs are overwritten)
+        if document:
+            vectors = (embeddings or embedder).embed_documents([doc.page_content for doc in document])
+            for start in range(0, len(document), UPSERT_BATCH_SIZE):
+                end = start + UPSERT_BATCH_SIZE
+                collection.upsert(
+                    ids=ids[start:end],
+                    embeddings=vectors[start:end],
+                    documents=[doc.page_content for doc in document[start:end]],
+                    metadatas=[doc.metadata or None for doc in document[start:end]]
+                )
+            print(f"Successfully upserted {len(document)} documents in clab_web collection")
+        
+        # Deleted last, once their replacements are searchable
+        upserted = set(ids)
+        delete_ids = [chunk_id for chunk_id in delete_ids if chunk_id not in upserted]
+        if delete_ids:
+            collection.delete(ids=delete_ids)
+            print(f"Deleted {len(delete_ids)} stale documents from clab_web collection")
        
         final_count = collection.count()
         print(f"Final collection count: {final_count}")
         
     except Exception as e:
-        print(f"Problem to create and add scrapy in web collection\nError: {e}")
+        print(f"Problem to update the scrapy in web collection\nError: {e}")
         raise 
 
+def get_scrapy() -> dict:
+    """
+    Every chunk of the Containerlab Documentation (ids, documents and metadatas)
+    """
+    
+    collection = store.get_collection(name="clab_web")
+    return collection.get(include=["documents", "metadatas"])
+
+def update_scrapy_metadata(ids: List[str], metadatas: List[dict]):
+    """
+    Used to update the metadata stored next to the embeddings (e.g. pre-built summaries)
+    """
+    
+    collection = store.get_collection(name="clab_web")
+    collection.update(ids=ids, metadatas=metadatas)
+
 def add_context(session_id: Optional[str],
                 user_input: Optional[str], 
                 url: Optional[str], 
@@ -99,12 +324,13 @@ def add_context(session_id: Optional[str],
                 collection_type: Literal["context", "scrapy"]
                 ):
     
-    collection = client.get_or_create_collection(name=f"clab{session_id}") if collection_type == "context" else client.get_or_create_collection(name="clab_web")
+    collection = store.get_or_create_collection(name=f"clab{session_id}") if collection_type == "context" else store.get_or_create_collection(name="clab_web")
     
     try:    
         if (collection_type == "context"):
             collection.add(
                 documents=[response],
+                embeddings=embedder.embed_documents([response]),
                 metadatas=[{"user_input": user_input}],
                 ids=[f"{session_id}-{user_input}"]
             )
@@ -112,13 +338,13 @@ def add_context(session_id: Optional[str],
         print(f"Impossible to add the context in the collection.\nError: {e}\n")
 
 def delete_collection(session_id: Optional[str], collection_type: Literal["scrapy", "context"]):
-    collection = client.get_or_create_collection(name=f"clab{session_id}") if collection_type == "context" else client.get_or_create_collection(name="clab_web")
+    collection = store.get_or_create_collection(name=f"clab{session_id}") if collection_type == "context" else store.get_or_create_collection(name="clab_web")
     
     try:    
         if collection_type == "context": 
-            client.delete_collection(name=f"clab{session_id}")
+            store.delete_collection(name=f"clab{session_id}")
         else: 
-            client.delete_collection(name="clab_web")
+            store.delete_collection(name="clab_web")
         print(f"Collection {collection.name} deleted sucessfully.\n")
     except Exception as e:
         print(f"Impossible to delete the collection.\nError: {e}\n")
\ No newline at end of file
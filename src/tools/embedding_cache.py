@@ -0,0 +1,127 @@
+import hashlib, json, os, re, threading, logging
+import numpy as np
+from typing import Dict, List
+from langchain_core.embeddings import Embeddings
+
+# =============================================================================
+# PERSISTENT CONTENT-HASH -> VECTOR EMBEDDING CACHE
+# =============================================================================
+
+"""
+Embeddings wrapper used by the documentation indexing: the sentences embedded by
+`SemanticChunker` and the chunks that `db.add_scrapy`/`db.update_scrapy` embed before
+upserting them into the vector store go through the same cache, so a text is embedded
+once, across the stages and across the crawls.
+
+On disk, one directory per model: `vectors.f32`, the float32 vectors one after the
+other (read as a memory-mapped array), and `keys.txt`, the SHA1 of the text of each
+row. Both files are append-only.
+
+No project imports here, the spider imports this module from `tools/` directly.
+"""
+
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_PATH = os.environ.get("CLAB_EMBEDDING_CACHE_PATH", "./embedding_cache")
+BATCH_SIZE = int(os.environ.get("CLAB_EMBEDDING_BATCH_SIZE", 64))
+
+
+
+class EmbeddingCache(Embeddings):
+    """
+    Embeddings of `base`, computed `batch_size` texts at a time and only for the
+    texts never embedded by this model. Known texts are read from the memory-mapped
+    vectors; new vectors are appended to disk and the map is reopened.
+    """
+
+    def __init__(self, base: Embeddings, model_name: str, path: str = CACHE_PATH, batch_size: int = BATCH_SIZE) -> None:
+        self.base = base
+        self.batch_size = batch_size
+        self.path = os.path.join(path, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._vectors_path = os.path.join(self.path, "vectors.f32")
+        self._keys_path = os.path.join(self.path, "keys.txt")
+        self._meta_path = os.path.join(self.path, "meta.json")
+        self._dim = 0
+        self._rows: Dict[str, int] = {}
+        self._vectors = None
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self._meta_path, encoding="utf-8") as file:
+                self._dim = json.load(file)["dim"]
+            with open(self._keys_path, encoding="utf-8") as file:
+                keys = file.read().split()
+        except FileNotFoundError:
+            return
+
+        # An interrupted append leaves more keys than complete vectors (or the opposite)
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        count = min(len(keys), size // (4 * self._dim))
+        if count != len(keys) or size != count * 4 * self._dim:
+            logger.warning(f"Embedding cache {self.path} truncated to its {count} complete rows")
+            with open(self._vectors_path, "ab") as file:
+                file.truncate(count * 4 * self._dim)
+            with open(self._keys_path, "w", encoding="utf-8") as file:
+                file.write("".join(key + "\n" for key in keys[:count]))
+
+        self._rows = {key: row for row, key in enumerate(keys[:count])}
+        self._map(count)
+
+    def _map(self, count: int) -> None:
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(count, self._dim)) if count else None
+
+    def _append(self, keys: List[str], vectors: np.ndarray) -> None:
+        os.makedirs(self.path, exist_ok=True)
+
+        if not self._dim:
+            self._dim = vectors.shape[1]
+            with open(self._meta_path, "w", encoding="utf-8") as file:
+                json.dump({"dim": self._dim}, file)
+
+        # Vectors first: a key is only trusted once its vector is on disk
+        with open(self._vectors_path, "ab") as file:
+            file.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        with open(self._keys_path, "a", encoding="utf-8") as file:
+            file.write("".join(key + "\n" for key in keys))
+
+        start = len(self._rows)
+        self._rows.update({key: start + i for i, key in enumerate(keys)})
+        self._map(len(self._rows))
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.key(text) for text in texts]
+
+        with self._lock:
+            missing = {key: text for key, text in zip(keys, texts) if key not in self._rows}
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+            # Only the texts never embedded reach the model, in batches
+            todo = list(missing.items())
+            for start in range(0, len(todo), self.batch_size):
+                batch = todo[start:start + self.batch_size]
+                vectors = np.asarray(self.base.embed_documents([text for _, text in batch]), dtype=np.float32)
+                self._append([key for key, _ in batch], vectors)
+
+            rows = [self._rows[key] for key in keys]
+            vectors = self._vectors[rows] if rows else np.empty((0, self._dim), dtype=np.float32)
+
+        logger.info(f"Embedded {len(texts)} texts ({len(missing)} computed, {len(texts) - len(missing)} cached)")
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._rows), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,333 @@
+import json, os, re, threading, time, logging
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import docker, yaml
+from rich.console import Console
+from langchain_core.callbacks import BaseCallbackHandler
+
+# =============================================================================
+# DOCKER IMAGE PROVISIONING
+# =============================================================================
+
+"""
+Images of a ContainerLab topology, made available before the deploy.
+
+The images come from the parsed topology (node, group, kind and defaults images).
+Each one is checked against a digest index first, then against the local Docker
+images, and only the missing ones are pulled, concurrently, on a bounded pool.
+The index remembers the images known to be present (ID and repo digests), so the
+correction-loop iterations don't query the Docker daemon again.
+
+`ImagePrefetchCallback` starts the pulls while the YAML is still being generated.
+"""
+
+
+logger = logging.getLogger(__name__)
+
+console = Console(force_terminal=True)
+
+
+INDEX_PATH = os.environ.get("CLAB_IMAGE_INDEX_PATH", "./image_index.json")
+
+# Concurrent pulls (and local checks)
+PULL_WORKERS = int(os.environ.get("CLAB_PULL_WORKERS", 4))
+
+# An indexed image is trusted without asking the daemon for this long
+INDEX_TTL_SECONDS = int(os.environ.get("CLAB_IMAGE_INDEX_TTL", 24 * 3600))
+
+# Deploy errors caused by an image missing locally (and not pullable)
+IMAGE_MISSING_RE = re.compile(r'no such image|image not found|manifest unknown|pull access denied|failed to pull', re.IGNORECASE)
+
+IMAGE_LINE_RE = re.compile(r'^\s*-?\s*image:\s*(.+)$')
+
+# What a streamed `image:` value must look like before a pull is attempted
+IMAGE_REF_RE = re.compile(r'^[a-z0-9][a-z0-9._/-]*(:[A-Za-z0-9._-]+)?(@sha256:[a-f0-9]{64})?$')
+
+
+
+def _mapping(value: Any) -> Dict[str, Any]:
+    # A malformed block (scalar, list) counts as empty
+    return value if isinstance(value, dict) else {}
+
+
+
+def topology_images(topology: Dict[str, Any]) -> List[str]:
+    """
+    Image of every node of a parsed topology, like ContainerLab resolves it:
+    node, then its group, then its kind, then the defaults.
+    """
+
+    topo = _mapping(_mapping(topology).get("topology"))
+    kinds = _mapping(topo.get("kinds"))
+    groups = _mapping(topo.get("groups"))
+    defaults = _mapping(topo.get("defaults"))
+
+    images = []
+    for node in _mapping(topo.get("nodes")).values():
+        node = _mapping(node)
+        group = node.get("group")
+        group = _mapping(groups.get(group)) if isinstance(group, str) else {}
+        kind = node.get("kind") or group.get("kind") or defaults.get("kind")
+        kind = _mapping(kinds.get(kind)) if isinstance(kind, str) else {}
+        image = node.get("image") or group.get("image") or kind.get("image") or defaults.get("image")
+        if isinstance(image, str) and image.strip():
+            images.append(image.strip())
+
+    return list(dict.fromkeys(images))
+
+
+
+def images_from_yaml(yaml_string: str) -> List[str]:
+    """
+    Images of a YAML topology. A YAML that doesn't parse (yet) is scanned line by line.
+    """
+
+    try:
+        parsed = yaml.safe_load(yaml_string)
+        if isinstance(parsed, dict):
+            return topology_images(parsed)
+    except yaml.YAMLError:
+        pass
+
+    images = [image for image in map(image_of_line, yaml_string.split("\n")) if image]
+    return list(dict.fromkeys(images))
+
+
+
+def image_of_line(line: str) -> Optional[str]:
+    """
+    Image reference of an `image: ...` YAML line, if any
+    """
+
+    match = IMAGE_LINE_RE.match(line)
+    if not match:
+        return None
+    image = match.group(1).split("#")[0].strip().strip('"').strip("'")
+    return image or None
+
+
+
+class ImageProvisioner:
+    """
+    Bounded pool checking and pulling images, with a persistent digest index.
+    An image requested twice while in flight is only handled once, and the outcome of
+    a background request (`submit`) is reported by the next `ensure` of that image.
+    """
+
+    def __init__(self, index_path: str = INDEX_PATH, workers: int = PULL_WORKERS, ttl: int = INDEX_TTL_SECONDS) -> None:
+        self.index_path = index_path
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="image-pull")
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._futures: Dict[str, Future] = {}
+
+        try:
+            with open(index_path, encoding="utf-8") as file:
+                self._index: Dict[str, dict] = json.load(file)
+        except FileNotFoundError:
+            self._index = {}
+        except Exception as e:
+            logger.warning(f"Unreadable image index {index_path}: {e}")
+            self._index = {}
+
+    def _client(self) -> docker.DockerClient:
+        # One Docker client per worker thread
+        if getattr(self._local, "client", None) is None:
+            self._local.client = docker.from_env()
+        return self._local.client
+
+    def _save(self) -> None:
+        # Caller holds the lock
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self._index, file, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    def _remember(self, image: str, docker_image) -> None:
+        with self._lock:
+            self._index[image] = {
+                "id": docker_image.id,
+                "digests": docker_image.attrs.get("RepoDigests", []),
+                "verified": time.time(),
+            }
+            self._save()
+
+    def forget(self, image: str) -> None:
+        with self._lock:
+            if self._index.pop(image, None) is not None:
+                self._save()
+
+    def forget_missing(self, error: str, images: List[str]) -> List[str]:
+        """
+        Forget the images a failed deploy reports as missing (e.g. removed locally since
+        they were indexed), so that the next `ensure` checks and pulls them again.
+        When the error doesn't name the image, every image of the topology is checked again.
+        """
+
+        if not error or not IMAGE_MISSING_RE.search(error):
+            return []
+
+        missing = [image for image in images if image in error] or list(images)
+        for image in missing:
+            self.forget(image)
+        return missing
+
+    def indexed(self, image: str) -> bool:
+        with self._lock:
+            entry = self._index.get(image)
+        return entry is not None and time.time() - entry["verified"] < self.ttl
+
+    def _provision(self, image: str) -> str:
+        """
+        "indexed", "present" or "pulled" (raises when the image can't be pulled)
+        """
+
+        if self.indexed(image):
+            return "indexed"
+
+        client = self._client()
+        try:
+            self._remember(image, client.images.get(image))
+            return "present"
+        except docker.errors.ImageNotFound:
+            pass
+
+        console.print(f"[bold yellow] Pulling: {image}")
+        self._remember(image, client.images.pull(image))
+        console.print(f"[bold green] ✓ Successfully pulled: {image}")
+        return "pulled"
+
+    def submit(self, image: str) -> Future:
+        """
+        Start provisioning an image in the background (or join the ongoing one)
+        """
+
+        with self._lock:
+            future = self._futures.get(image)
+            if future is None or future.cancelled() or (future.done() and future.exception() is not None):
+                future = self._pool.submit(self._provision, image)
+                self._futures[image] = future
+            return future
+
+    def _release(self, image: str, future: Future) -> None:
+        with self._lock:
+            if self._futures.get(image) is future:
+                del self._futures[image]
+
+    def abandon(self, image: str, future: Future) -> None:
+        """
+        Drop a background request that nobody will wait for: cancelled if its pull
+        hasn't started, otherwise released (and its failure logged) once it ends.
+        """
+
+        if future.cancel() or future.done():
+            self._release(image, future)
+        else:
+            future.add_done_callback(lambda done: self._drained(image, done))
+
+    def _drained(self, image: str, future: Future) -> None:
+        self._release(image, future)
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning(f"Abandoned prefetch of {image} failed: {future.exception()}")
+
+    def ensure(self, images: List[str]) -> Dict[str, List]:
+        """
+        Make the images available locally. Returns the images per outcome:
+        {"indexed": [...], "present": [...], "pulled": [...], "failed": [(image, error), ...]}
+        """
+
+        result: Dict[str, List] = {"indexed": [], "present": [], "pulled": [], "failed": []}
+
+        # Indexed images never reach the pool (nor the daemon), unless already submitted
+        futures = {}
+        for image in images:
+            with self._lock:
+                submitted = image in self._futures
+            if not submitted and self.indexed(image):
+                result["indexed"].append(image)
+            else:
+                futures[image] = self.submit(image)
+
+        for image, future in futures.items():
+            try:
+                try:
+                    outcome = future.result()
+                except CancelledError:
+                    # Prefetch abandoned by another request before it started
+                    future = self.submit(image)
+                    outcome = future.result()
+                result[outcome].append(image)
+            except Exception as e:
+                console.print(f"[bold red] ✗ Image not found in registry: {image} - {e}")
+                result["failed"].append((image, str(e)))
+            finally:
+                self._release(image, future)
+
+        return result
+
+
+
+# Process-wide provisioner
+provisioner = ImageProvisioner()
+
+
+
+class ImagePrefetchCallback(BaseCallbackHandler):
+    """
+    Watches the YAML streamed by the LLM and submits every `image:` reference to the
+    provisioner as soon as its line is complete, so that the pulls of heavy images
+    overlap with the generation. `ensure` then only waits for what is left.
+    
+    Lines inside <think> blocks are ignored, and a value is only pulled when it looks
+    like an image reference. An image the final YAML doesn't use costs a useless pull.
+    `cancel` must be called once the deploy is over (or abandoned), see `abandon`.
+    """
+
+    run_inline = True
+
+    def __init__(self, image_provisioner: Optional[ImageProvisioner] = None) -> None:
+        self.provisioner = image_provisioner or provisioner
+        self.prefetched: List[str] = []
+        self.futures: Dict[str, Future] = {}
+        self._line = ""
+        self._in_think = False
+
+    def _observe(self, line: str) -> None:
+        if "<think>" in line:
+            self._in_think = True
+        if "</think>" in line:
+            self._in_think = False
+            return
+        if self._in_think:
+            return
+
+        image = image_of_line(line)
+        if image and IMAGE_REF_RE.match(image) and image not in self.prefetched:
+            self.prefetched.append(image)
+            if not self.provisioner.indexed(image):
+                console.print(f"[bold yellow] ⏩ Prefetching {image} while the YAML is generated")
+                self.futures[image] = self.provisioner.submit(image)
+
+    def on_llm_start(self, *args, **kwargs) -> None:
+        self._line = ""
+        self._in_think = False
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        *lines, self._line = (self._line + token).split("\n")
+        for line in lines:
+            self._observe(line)
+
+    def on_llm_end(self, *args, **kwargs) -> None:
+        if self._line:
+            self._observe(self._line)
+            self._line = ""
+
+    def cancel(self) -> None:
+        """
+        Cancel the prefetches not started yet, release the others when they end
+        """
+
+        for image, future in self.futures.items():
+            self.provisioner.abandon(image, future)
+        self.futures.clear()
@@ -0,0 +1,149 @@
+import gzip, json, math, os, re, threading, logging
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+# =============================================================================
+# BM25 KEYWORD INDEX OF THE DOCUMENTATION CHUNKS
+# =============================================================================
+
+"""
+Inverted index over the chunks stored in `clab_web`, built by `ClabDoc._finalize`
+next to the embeddings. The ContainerLab corpus is full of exact tokens (kinds such
+as `nokia_srlinux`, keys such as `mgmt-ipv4` or `startup-config`) that the MiniLM
+embeddings tend to miss: `db.query_scrapy` blends this BM25 score with the vector one.
+
+On disk, a gzipped JSON file: the chunk IDs, their lengths (in tokens) and, per
+term, a flat [doc, tf, doc, tf, ...] postings list.
+
+No project imports here, the spider imports this module from `tools/` directly.
+"""
+
+
+logger = logging.getLogger(__name__)
+
+
+INDEX_PATH = os.environ.get("CLAB_KEYWORD_INDEX_PATH", "./keyword_index.json.gz")
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Identifiers keep their inner separators (mgmt-ipv4, nokia_srlinux, 172.20.20.0/24)
+TOKEN_RE = re.compile(r"[a-z0-9](?:[a-z0-9_.:/-]*[a-z0-9])?")
+SEPARATORS_RE = re.compile(r"[_.:/-]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can for from has have how i if in into is it its of on or "
+    "that the their then there these this to was we what when which will with you your".split()
+)
+
+_lock = threading.Lock()
+_index: Optional[dict] = None
+_index_key: Optional[tuple] = None
+
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased terms of a text. A compound identifier yields itself and its parts,
+    so `srlinux` also matches `nokia_srlinux`.
+    """
+
+    terms = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        parts = [p for p in SEPARATORS_RE.split(token) if p and p not in STOPWORDS]
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+
+def build(ids: List[str], documents: List[str], path: str = INDEX_PATH) -> int:
+    """
+    Build the index of the given chunks and write it to `path`. Returns the number of terms.
+    """
+
+    global _index, _index_key
+
+    postings: Dict[str, List[int]] = {}
+    lengths: List[int] = []
+
+    for doc, content in enumerate(documents):
+        counts = Counter(tokenize(content))
+        lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            postings.setdefault(term, []).extend((doc, tf))
+
+    index = {"ids": list(ids), "lengths": lengths, "postings": postings}
+
+    # Written aside and renamed, a running query never reads a half-written index
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as file:
+        json.dump(index, file, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+    # A rebuild within the mtime resolution must not leave this process on the old index
+    with _lock:
+        _index, _index_key = None, None
+
+    logger.info(f"Keyword index built: {len(ids)} chunks, {len(postings)} terms")
+    return len(postings)
+
+
+
+def _load(path: str = INDEX_PATH) -> Optional[dict]:
+    """
+    The index on disk, reloaded when the spider rewrote it
+    """
+
+    global _index, _index_key
+
+    try:
+        key = (path, os.path.getmtime(path))
+    except OSError:
+        return None
+
+    with _lock:
+        if _index is None or key != _index_key:
+            with gzip.open(path, "rt", encoding="utf-8") as file:
+                index = json.load(file)
+            lengths = index["lengths"]
+            index["avg_length"] = sum(lengths) / len(lengths) if lengths else 0.0
+            _index, _index_key = index, key
+        return _index
+
+
+
+def search(queries: List[str], n_results: int = 10, path: str = INDEX_PATH) -> List[List[Tuple[str, float]]]:
+    """
+    BM25 top chunks (chunk ID, score) of each query, best first.
+    Empty lists when the index hasn't been built.
+    """
+
+    index = _load(path)
+    if not index or not index["ids"]:
+        return [[] for _ in queries]
+
+    ids, lengths, postings = index["ids"], index["lengths"], index["postings"]
+    total, avg_length = len(ids), index["avg_length"] or 1.0
+
+    results = []
+    for query in queries:
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            plist = postings.get(term)
+            if not plist:
+                continue
+            df = len(plist) // 2
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for doc, tf in zip(plist[::2], plist[1::2]):
+                norm = tf + K1 * (1 - B + B * lengths[doc] / avg_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (K1 + 1) / norm
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+        results.append([(ids[doc], score) for doc, score in best])
+
+    return results
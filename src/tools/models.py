@@ -1,36 +1,58 @@
-import time
+import time, os, threading, importlib.util
 import torch, subprocess, asyncio
+from contextlib import contextmanager, asynccontextmanager
 from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
 from google.cloud import dialogflow_v2 as dialogflow
 from google.api_core.exceptions import NotFound
 from rich.console import Console
 from langchain_ollama import ChatOllama
 from langchain_core.prompts import PromptTemplate
-from typing import Literal
+from typing import AsyncIterator, Iterator, Literal, Optional
 from langchain_core.output_parsers import StrOutputParser
+from sentence_transformers.cross_encoder import CrossEncoder
+from tools.registry import ModelRegistry
+from tools.completion_cache import completion_cache
 
 
 
 console = Console(force_terminal=True)
 
 
+# Models used by the graph nodes
+PLANNER_MODEL = "qwen3:latest"
+EXPLAIN_MODEL = "qwen2.5:3b"
+CORRECTION_MODEL = "qwen2.5-coder:3b"
+CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
 
-def intent_explain(client_question: str) -> str:
+# CrossEncoder backends: plain PyTorch, ONNX Runtime, or ONNX Runtime with the int8 quantised weights
+CROSS_ENCODER_BACKENDS = {
+    "torch": {},
+    "onnx": {"backend": "onnx"},
+    "onnx-int8": {"backend": "onnx", "model_kwargs": {"file_name": "onnx/model_quint8_avx2.onnx"}},
+}
+
+# Packages of the ONNX backends (sentence-transformers loads the model through optimum)
+ONNX_PACKAGES = ("optimum", "onnxruntime")
+
+
+# Process-wide registry of warm models (memory budget in MB for the in-process models)
+registry = ModelRegistry(memory_budget_mb=float(os.environ.get("CLAB_MODEL_MEMORY_MB", 2048)))
+
+# How long the Ollama server keeps a model loaded after the last call
+OLLAMA_KEEP_ALIVE = os.environ.get("CLAB_OLLAMA_KEEP_ALIVE", "30m")
+
+_ollama_checked = False
+_ollama_lock = threading.Lock()
+
+
+
+def intent_explain_prompt() -> PromptTemplate:
     """
-    Convert a client's natural language question into a technical Containerlab reformulation.
-    
-    This function uses a local LLM to analyze the user's question and reformulate it using
-    proper Containerlab terminology and keywords. It ensures the output is structured
-    consistently with technical reformulation and relevant keywords.
+    Prompt used by `intent_explain` with Containerlab-specific instructions.
     """
     
-    # Initialize local LLM with relatively low temperature for consistent technical output
-    llm = ChatOllama(model="qwen2.5:3b")
-    output_parser = StrOutputParser()
-
-    
     # Create comprehensive prompt template with Containerlab-specific instructions
-    prompt = PromptTemplate(
+    return PromptTemplate(
         input_variables=["client_question"],
         template="""Task: Convert the client's question into a technical reformulation for Containerlab. Use only valid Containerlab keywords. The output must be exactly two lines.
 
@@ -48,12 +70,41 @@ def intent_explain(client_question: str) -> str:
         {client_question}
         CORRECT OUTPUT:"""
     )
+
+
+
+def intent_explain(client_question: str) -> str:
+    """
+    Convert a client's natural language question into a technical Containerlab reformulation.
     
-    chain = prompt | llm | output_parser
+    This function uses a local LLM to analyze the user's question and reformulate it using
+    proper Containerlab terminology and keywords. It ensures the output is structured
+    consistently with technical reformulation and relevant keywords.
+    """
     
-    result = chain.invoke({
-            "client_question": client_question
-    })
+    # Warm local LLM shared with the other requests of the process
+    with ollama_model(EXPLAIN_MODEL) as llm:
+        chain = intent_explain_prompt() | llm | StrOutputParser()
+        
+        result = chain.invoke({
+                "client_question": client_question
+        })
+    
+    return result
+
+
+
+async def aintent_explain(client_question: str) -> str:
+    """
+    Async variant of `intent_explain`.
+    """
+    
+    async with aollama_model(EXPLAIN_MODEL) as llm:
+        chain = intent_explain_prompt() | llm | StrOutputParser()
+        
+        result = await chain.ainvoke({
+                "client_question": client_question
+        })
     
     return result
 
@@ -112,33 +163,177 @@ def detect_intent(user_input: str) -> str:
 
 
 
-def llm_management(response_format: Literal["json", ""]):
+async def adetect_intent(user_input: str) -> str:
+    """
+    Async variant of `detect_intent`. The Dialogflow gRPC calls run in a worker thread.
+    """
+    
+    return await asyncio.to_thread(detect_intent, user_input)
+
+
+
+def ensure_ollama_server():
     """
     Checks if Ollama server is running
     Starts the server if not running
-    Loads the specified model with configuration
+    The check is done only once per process
+    """
+    
+    global _ollama_checked
+    
+    with _ollama_lock:
+        if _ollama_checked:
+            return
+        
+        console.print("[yellow] Verifying Ollama server status ...[/yellow]")
+        try:
+            subprocess.run(["ollama", "ps"], capture_output=True, text=True, check=True)
+            console.print("[bold green]✓ Ollama server already in execution .[/bold green]")
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            console.print("[bold yellow]! Ollama server not found ...[/bold yellow]")
+            subprocess.Popen(["ollama", "serve"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            time.sleep(5) 
+            console.print("[bold green]✓ Ollama server started.[/bold green]")
+        
+        _ollama_checked = True
+
+
+
+def _register_ollama_model(model: str, temperature: Optional[float], response_format: Literal["json", ""],
+                           num_ctx: Optional[int]) -> tuple:
+    """
+    Register a ChatOllama client keyed by model name and options. Returns the registry key.
+    """
+    
+    key = ("ollama", model, temperature, response_format, num_ctx)
+    
+    def factory() -> ChatOllama:
+        ensure_ollama_server()
+        # Identical (model, options, prompt) calls are answered by the persistent completion cache
+        options = {"temperature": temperature, "num_ctx": num_ctx, "cache": completion_cache}
+        return ChatOllama(model=model,
+                          format=response_format,
+                          keep_alive=OLLAMA_KEEP_ALIVE,
+                          **{k: v for k, v in options.items() if v is not None})
+    
+    # The weights live in the Ollama server, the client itself is lightweight
+    registry.register(key, factory, size_mb=1)
+    return key
+
+
+
+def resolve_cross_encoder_backend(backend: str) -> str:
+    """
+    Check a CrossEncoder backend before the first rerank: an unknown name is an
+    error, an ONNX backend without optimum/onnxruntime installed falls back to torch.
+    """
+    
+    if backend not in CROSS_ENCODER_BACKENDS:
+        raise ValueError(f"Unknown CrossEncoder backend '{backend}', expected one of: {', '.join(CROSS_ENCODER_BACKENDS)}")
+    
+    missing = [package for package in ONNX_PACKAGES if importlib.util.find_spec(package) is None]
+    if backend != "torch" and missing:
+        console.print(f"[bold red] ✗ CrossEncoder backend '{backend}' needs optimum[onnxruntime] "
+                      f"(missing: {', '.join(missing)}), falling back to torch")
+        return "torch"
+    
+    return backend
+
+
+
+def _register_cross_encoder(backend: str = "torch") -> tuple:
+    """
+    Register the CrossEncoder used to rank the documentation. Returns the registry key.
+    """
+    
+    key = ("cross-encoder", CROSS_ENCODER_MODEL, backend)
+    
+    def factory() -> CrossEncoder:
+        console.print(f"[bold yellow] Downloading CrossEncoder model ({backend})...")
+        return CrossEncoder(CROSS_ENCODER_MODEL, device="cpu", **CROSS_ENCODER_BACKENDS[backend])
+    
+    def free(model) -> None:
+        torch.cuda.empty_cache() if torch.cuda.is_available() else None
+    
+    registry.register(key, factory, size_mb=90 if backend != "onnx-int8" else 25, on_evict=free)
+    return key
+
+
+
+@contextmanager
+def ollama_model(model: str, temperature: Optional[float] = None, response_format: Literal["json", ""] = "",
+                 num_ctx: Optional[int] = None) -> Iterator[ChatOllama]:
+    """
+    Borrow a warm ChatOllama client from the registry.
+    
+    Clients are keyed by model name and options, built on first use and
+    reused by every node of the process afterwards.
+    """
+    
+    with registry.use(_register_ollama_model(model, temperature, response_format, num_ctx)) as llm:
+        yield llm
+
+
+
+@asynccontextmanager
+async def aollama_model(model: str, temperature: Optional[float] = None, response_format: Literal["json", ""] = "",
+                        num_ctx: Optional[int] = None) -> AsyncIterator[ChatOllama]:
+    """
+    Async variant of `ollama_model`.
+    """
+    
+    async with registry.ause(_register_ollama_model(model, temperature, response_format, num_ctx)) as llm:
+        yield llm
+
+
+
+@contextmanager
+def cross_encoder(backend: str = "torch") -> Iterator[CrossEncoder]:
+    """
+    Borrow the warm CrossEncoder used to rank the documentation.
+    """
+    
+    with registry.use(_register_cross_encoder(backend)) as model:
+        yield model
+
+
+
+@asynccontextmanager
+async def across_encoder(backend: str = "torch") -> AsyncIterator[CrossEncoder]:
+    """
+    Async variant of `cross_encoder`.
+    """
+    
+    async with registry.ause(_register_cross_encoder(backend)) as model:
+        yield model
+
+
+
+@contextmanager
+def llm_management(response_format: Literal["json", ""]) -> Iterator[ChatOllama]:
+    """
+    Checks if Ollama server is running
+    Starts the server if not running
+    Borrows the warm planner model with configuration
     Provides visual feedback throughout the process
     """
     
-    console.print("[yellow] Verifying Ollama server status ...[/yellow]")
-    try:
-        subprocess.run(["ollama", "ps"], capture_output=True, text=True, check=True)
-        console.print("[bold green]✓ Ollama server already in execution .[/bold green]")
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        console.print("[bold yellow]! Ollama server not found ...[/bold yellow]")
-        subprocess.Popen(["ollama", "serve"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        time.sleep(5) 
-        console.print("[bold green]✓ Ollama server started.[/bold green]")
+    ensure_ollama_server()
+    
+    with ollama_model(PLANNER_MODEL, temperature=0.05, response_format=response_format, num_ctx=10000) as llm:
+        console.print("[bold green]✓ LLM loaded sucessfully.[/bold green]")
+        yield llm
 
 
-    with console.status("[bold yellow] Loading model LLM (qwen3:latest)...[/bold yellow]", spinner="dots"):
-        llm = ChatOllama(model="qwen3:latest",
-                         temperature=0.05,
-                         format=response_format,
-                         
-                         num_ctx=10000)
-        
-    console.print("[bold green]✓ LLM loaded sucessfully.[/bold green]")  
-    return llm
 
-    
\ No newline at end of file
+@asynccontextmanager
+async def allm_management(response_format: Literal["json", ""]) -> AsyncIterator[ChatOllama]:
+    """
+    Async variant of `llm_management`.
+    """
+    
+    await asyncio.to_thread(ensure_ollama_server)
+    
+    async with aollama_model(PLANNER_MODEL, temperature=0.05, response_format=response_format, num_ctx=10000) as llm:
+        console.print("[bold green]✓ LLM loaded sucessfully.[/bold green]")
+        yield llm
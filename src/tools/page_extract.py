@@ -0,0 +1,99 @@
+import io, re, logging
+from concurrent.futures import Executor
+from typing import List, Optional, Sequence, Tuple
+from parsel import Selector
+
+# =============================================================================
+# DOCUMENTATION PAGE EXTRACTION
+# =============================================================================
+
+"""
+Text extraction of a ContainerLab documentation page (the article: code blocks,
+headings and paragraphs), used by `ClabDoc.parse_doc`.
+
+The page is streamed into a single `io.StringIO` builder with precompiled patterns,
+so the cost is linear in the page size. `extract_page` only takes and returns plain
+strings: it can run in a process pool (`extract_pages`).
+
+No project imports here, the spider imports this module from `tools/` directly.
+"""
+
+
+logger = logging.getLogger(__name__)
+
+
+CODE_HEADER = "\nCode (YAML ou SQL ou CLI)\n"
+
+# Paragraph clean-up: the <p> wrapper, then the inline <code> and <a> tags
+P_WRAPPER_RE = re.compile(r'^<p[^>]*>|</p>$')
+INLINE_TAGS_RE = re.compile(r'<code[^>]*>|</code>|<a[^>]*>|</a>')
+
+HEADING_PREFIX = {"h1": "# ", "h2": "## ", "h3": "### ", "h4": "#### "}
+
+
+
+def extract_content(selector: Selector, url: str) -> str:
+    """
+    Page content of the article of a parsed page (a Scrapy response is a selector too)
+    """
+
+    out = io.StringIO()
+    out.write("url: " + url + "\n")
+
+    for element in selector.xpath('//article/*'):
+        tag = element.xpath('name()').get()
+
+        codes = element.xpath('.//code[@class="md-code__content"]')
+        if codes:
+            code = io.StringIO()
+            code.write(CODE_HEADER)
+            for span in codes.xpath('./span'):
+                code.write("\n")
+                code.write("".join(span.xpath("./span/text()").getall()))
+            text_code = code.getvalue()
+
+            if text_code.strip() != CODE_HEADER.strip():
+                out.write(text_code)
+                out.write("\n\n")
+
+        if tag in HEADING_PREFIX:
+            out.write(HEADING_PREFIX[tag] + str(element.xpath('text()').get()) + "\n\n")
+
+        if tag == "p":
+            p_content = element.get()
+
+            if p_content:
+                p_content = P_WRAPPER_RE.sub('', p_content.strip())
+                p_content = INLINE_TAGS_RE.sub('', p_content)
+                out.write(' '.join(p_content.split()))
+                out.write("\n\n")
+
+    return out.getvalue()
+
+
+
+def navigation_links(selector: Selector) -> List[str]:
+    return selector.xpath('//nav//a/@href').getall()
+
+
+
+def extract_page(url: str, html: str) -> Tuple[str, List[str]]:
+    """
+    Page content and navigation links (raw hrefs) of an HTML page
+    """
+
+    selector = Selector(text=html)
+    return extract_content(selector, url), navigation_links(selector)
+
+
+
+def extract_pages(pages: Sequence[Tuple[str, str]], pool: Optional[Executor] = None) -> List[Tuple[str, List[str]]]:
+    """
+    extract_page over (url, html) pages, spread over `pool` (e.g. a ProcessPoolExecutor) when given
+    """
+
+    if pool is None:
+        return [extract_page(url, html) for url, html in pages]
+
+    urls, htmls = zip(*pages) if pages else ((), ())
+    return list(pool.map(extract_page, urls, htmls, chunksize=max(1, len(pages) // 32)))
@@ -0,0 +1,101 @@
+import asyncio, json, logging, argparse
+from typing import Dict, List
+import tools.db as db
+import tools.summary_cache as summary_cache
+from tools.models import allm_management
+from nodes.researcher import asummarize_docs, clean_doc, load_summarizer_instruction
+from rich.console import Console
+import config.logger_config as logger_config
+
+"""
+Offline pre-summarised documentation index.
+
+Batch stage run after the scrapy (`ClabDoc._finalize` and `db.add_scrapy`): every
+chunk of `clab_web` gets a `Doc`-shaped summary (title, subtitles, explain,
+codeblocks) stored next to its embedding, in the `summary` metadata. The Researcher
+then builds its DocSum straight from retrieval and ranking, without any LLM call.
+
+Usage (from `src`):
+    python -m tools.presummarize
+"""
+
+
+logger_config.loggerConfiguration()
+logger = logging.getLogger(__name__)
+
+console = Console(force_terminal=True)
+
+
+# The summarizer instruction is written for 3 documents per call
+BATCH_SIZE = 3
+
+
+
+async def presummarize(force: bool = False) -> int:
+    """
+    Summarize every chunk without an up-to-date summary. Returns the number of chunks summarized.
+    """
+
+    chunks = db.get_scrapy()
+    sum_instruction = load_summarizer_instruction()
+
+    # Chunks whose summary is missing or was built from another content
+    todo: List[tuple] = []
+    for chunk_id, content, metadata in zip(chunks["ids"], chunks["documents"], chunks["metadatas"]):
+        metadata = metadata or {}
+        if force or not metadata.get("summary") or metadata.get("summary_hash") != summary_cache.content_hash(content):
+            todo.append((chunk_id, content, metadata))
+
+    console.print(f"[bold yellow] {len(todo)}/{len(chunks['ids'])} chunks to summarize...")
+
+    # Summaries already built at query time are reused
+    cached = summary_cache.get({chunk_id: content for chunk_id, content, _ in todo}) if not force else {}
+
+    done = 0
+
+    async with allm_management("json") as llm:
+        for start in range(0, len(todo), BATCH_SIZE):
+            batch = todo[start:start + BATCH_SIZE]
+            missing = [chunk for chunk in batch if chunk[0] not in cached]
+            summaries: Dict[str, dict] = {chunk_id: cached[chunk_id] for chunk_id, _, _ in batch if chunk_id in cached}
+
+            if missing:
+                new_docs = await asummarize_docs(llm, [clean_doc(content) for _, content, _ in missing], sum_instruction)
+
+                # One Doc per input is needed to attribute the summaries, otherwise one call per chunk
+                if len(new_docs) != len(missing):
+                    new_docs = []
+                    for _, content, _ in missing:
+                        single = await asummarize_docs(llm, [clean_doc(content)], sum_instruction)
+                        new_docs.append(single[0] if single else None)
+
+                summaries.update({chunk_id: doc for (chunk_id, _, _), doc in zip(missing, new_docs) if doc})
+                summary_cache.put({chunk_id: doc for chunk_id, doc in summaries.items() if chunk_id not in cached},
+                                  {chunk_id: content for chunk_id, content, _ in missing})
+
+            ids, metadatas = [], []
+            for chunk_id, content, metadata in batch:
+                if chunk_id in summaries:
+                    ids.append(chunk_id)
+                    metadatas.append({**metadata,
+                                      "summary": json.dumps(summaries[chunk_id]),
+                                      "summary_hash": summary_cache.content_hash(content)})
+
+            if ids:
+                db.update_scrapy_metadata(ids, metadatas)
+                done += len(ids)
+
+            logger.info(f"Pre-summarized {done}/{len(todo)} chunks")
+
+    console.print(f"[bold green]✓ {done} chunks pre-summarized.[/bold green]")
+    return done
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Build the pre-summarised documentation index")
+    parser.add_argument("--force", action="store_true", help="Summarize every chunk again")
+    args = parser.parse_args()
+
+    asyncio.run(presummarize(force=args.force))
@@ -0,0 +1,174 @@
+import threading, time, logging, asyncio
+from collections import OrderedDict
+from contextlib import contextmanager, asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, Iterator, Optional
+
+# =============================================================================
+# PROCESS-WIDE MODEL REGISTRY
+# =============================================================================
+
+
+logger = logging.getLogger(__name__)
+
+
+
+class ModelHandle:
+    """
+    Warm handle on a single model kept by the registry.
+
+    The model itself is only built the first time it is acquired (lazy
+    initialisation). The handle keeps the reference counter and the last
+    access time used by the LRU eviction policy.
+    """
+
+    def __init__(self, key: Hashable, factory: Callable[[], Any], size_mb: float,
+                 on_evict: Optional[Callable[[Any], None]] = None) -> None:
+        self.key = key
+        self.factory = factory
+        self.size_mb = size_mb
+        self.on_evict = on_evict
+
+        self.model: Any = None
+        self.refcount: int = 0
+        self.last_used: float = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.model is not None
+
+
+
+class ModelRegistry:
+    """
+    Registry of warm model handles shared by every graph node of the process.
+
+    Models are registered with a factory and an estimated memory footprint,
+    built lazily on first acquisition and kept warm afterwards. Each acquisition
+    increments a reference counter; only handles that are not in use can be
+    evicted. When the loaded models exceed the memory budget, the least recently
+    used idle models are unloaded first.
+    """
+
+    def __init__(self, memory_budget_mb: float = 2048) -> None:
+        self.memory_budget_mb = memory_budget_mb
+        self._handles: "OrderedDict[Hashable, ModelHandle]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def register(self, key: Hashable, factory: Callable[[], Any], size_mb: float = 0,
+                 on_evict: Optional[Callable[[Any], None]] = None) -> ModelHandle:
+        """
+        Register a model factory under `key`. Registering an existing key is a no-op.
+        """
+
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is None:
+                handle = ModelHandle(key, factory, size_mb, on_evict)
+                self._handles[key] = handle
+            return handle
+
+    def acquire(self, key: Hashable) -> Any:
+        """
+        Return the warm model registered under `key`, building it if needed.
+
+        The caller owns one reference on the model until `release` is called.
+        """
+
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is None:
+                raise KeyError(f"Model {key!r} is not registered.")
+            handle.refcount += 1
+            handle.last_used = time.monotonic()
+            self._handles.move_to_end(key)
+
+        # Building happens outside the registry lock so that slow models
+        # don't block the acquisition of the other ones
+        try:
+            with handle.lock:
+                if not handle.loaded:
+                    start = time.perf_counter()
+                    handle.model = handle.factory()
+                    logger.info(f"Model {key!r} loaded in {time.perf_counter() - start:.2f}s.")
+        except Exception:
+            self.release(key)
+            raise
+
+        self._evict()
+        return handle.model
+
+    def release(self, key: Hashable) -> None:
+        """
+        Drop one reference on the model registered under `key`.
+        """
+
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is None:
+                return
+            handle.refcount = max(0, handle.refcount - 1)
+
+        self._evict()
+
+    @contextmanager
+    def use(self, key: Hashable) -> Iterator[Any]:
+        """
+        Context manager acquiring the model for the duration of the block.
+        """
+
+        model = self.acquire(key)
+        try:
+            yield model
+        finally:
+            self.release(key)
+
+    @asynccontextmanager
+    async def ause(self, key: Hashable) -> AsyncIterator[Any]:
+        """
+        Async variant of `use`: a cold model is built in a worker thread so the
+        event loop keeps serving the other sessions meanwhile.
+        """
+
+        model = await asyncio.to_thread(self.acquire, key)
+        try:
+            yield model
+        finally:
+            self.release(key)
+
+    def loaded_mb(self) -> float:
+        with self._lock:
+            return sum(h.size_mb for h in self._handles.values() if h.loaded)
+
+    def _evict(self) -> None:
+        """
+        Unload idle models in LRU order until the memory budget is respected.
+        """
+
+        with self._lock:
+            # OrderedDict keeps the least recently used handles first
+            for handle in list(self._handles.values()):
+                if self.loaded_mb() <= self.memory_budget_mb:
+                    break
+                if not handle.loaded or handle.refcount > 0:
+                    continue
+                with handle.lock:
+                    model, handle.model = handle.model, None
+                if handle.on_evict:
+                    try:
+                        handle.on_evict(model)
+                    except Exception as e:
+                        logger.warning(f"Eviction hook of {handle.key!r} failed: {e}")
+                del model
+                logger.info(f"Model {handle.key!r} evicted ({handle.size_mb:.0f} MB).")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "budget_mb": self.memory_budget_mb,
+                "loaded_mb": self.loaded_mb(),
+                "models": {
+                    str(h.key): {"loaded": h.loaded, "refcount": h.refcount, "size_mb": h.size_mb}
+                    for h in self._handles.values()
+                },
+            }
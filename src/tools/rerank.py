@@ -0,0 +1,193 @@
+import re, hashlib, threading, logging, os
+import numpy as np
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+from tools.models import cross_encoder, resolve_cross_encoder_backend
+
+# =============================================================================
+# CROSSENCODER RERANKING SERVICE
+# =============================================================================
+
+
+logger = logging.getLogger(__name__)
+
+
+# Reranking configuration
+RERANK_BACKEND = os.environ.get("CLAB_RERANK_BACKEND", "torch") # torch, onnx or onnx-int8
+RERANK_BATCH_SIZE = int(os.environ.get("CLAB_RERANK_BATCH_SIZE", 32))
+RERANK_CACHE_SIZE = int(os.environ.get("CLAB_RERANK_CACHE_SIZE", 20000))
+RERANK_WORKERS = int(os.environ.get("CLAB_RERANK_WORKERS", 0)) # 0 disables the thread pool
+
+# Below this number of pairs to score, the thread pool isn't worth it
+PARALLEL_THRESHOLD = 256
+
+# Bi-encoder prefilter: candidates whose best cosine to a task is more than PREFILTER_MARGIN
+# below the best candidate are dropped, PREFILTER_MIN candidates are always kept
+PREFILTER_MARGIN = float(os.environ.get("CLAB_PREFILTER_MARGIN", 0.15))
+PREFILTER_MIN = int(os.environ.get("CLAB_PREFILTER_MIN", 5))
+
+# Early exit: candidates are reranked RERANK_STAGE at a time, best bi-encoder first,
+# until a stage leaves the top-k unchanged
+RERANK_STAGE = int(os.environ.get("CLAB_RERANK_STAGE", 4))
+
+
+
+def normalize_task(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+
+def chunk_hash(text: str) -> str:
+    norm = re.sub(r"\s+", " ", text).strip()
+    return hashlib.sha1(norm.encode("utf-8")).hexdigest()
+
+
+
+def prefilter(task_embeddings: Sequence, chunk_embeddings: Sequence,
+              margin: float = PREFILTER_MARGIN, min_keep: int = PREFILTER_MIN) -> List[int]:
+    """
+    Indexes of the candidates worth reranking, best bi-encoder cosine (to any task) first
+    """
+
+    if len(chunk_embeddings) == 0:
+        return []
+
+    # asarray may return the caller's (possibly cached) float32 array: no in-place division
+    tasks = np.asarray(task_embeddings, dtype=np.float32)
+    chunks = np.asarray(chunk_embeddings, dtype=np.float32)
+    tasks = tasks / (np.linalg.norm(tasks, axis=1, keepdims=True) + 1e-12)
+    chunks = chunks / (np.linalg.norm(chunks, axis=1, keepdims=True) + 1e-12)
+
+    best = (chunks @ tasks.T).max(axis=1)
+    order = np.argsort(-best)
+    keep = [int(i) for i in order if best[i] >= best[order[0]] - margin]
+
+    return keep if len(keep) >= min_keep else [int(i) for i in order[:min_keep]]
+
+
+
+class Reranker:
+    """
+    Scores (task, chunk) pairs with the warm CrossEncoder of the model registry.
+
+    Identical pairs are scored once: the pairs are deduplicated on
+    (normalised task text, chunk hash) and the scores are kept in an LRU cache
+    shared by the requests. Only the missing pairs reach the model, in batches
+    of `batch_size`, optionally split over a thread pool for large candidate sets.
+    """
+
+    def __init__(self, backend: str = RERANK_BACKEND, batch_size: int = RERANK_BATCH_SIZE,
+                 cache_size: int = RERANK_CACHE_SIZE, workers: int = RERANK_WORKERS) -> None:
+        self.backend = resolve_cross_encoder_backend(backend)
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.workers = workers
+
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rerank") if workers > 1 else None
+
+        self.hits = 0
+        self.misses = 0
+
+        # Candidate counts along the retrieval funnel
+        self.metrics: Counter = Counter()
+
+    def _predict(self, model, pairs: List[List[str]]) -> List[float]:
+        if self._pool is None or len(pairs) < PARALLEL_THRESHOLD:
+            return [float(s) for s in model.predict(pairs, batch_size=self.batch_size)]
+
+        # One slice per worker, each predicted in batches
+        size = -(-len(pairs) // self.workers)
+        slices = [pairs[i:i + size] for i in range(0, len(pairs), size)]
+        scores: List[float] = []
+        for part in self._pool.map(lambda p: model.predict(p, batch_size=self.batch_size), slices):
+            scores.extend(float(s) for s in part)
+        return scores
+
+    def score(self, pairs: Sequence[Sequence[str]]) -> List[float]:
+        """
+        Score of each [task, chunk] pair, in the given order.
+        """
+
+        keys = [(normalize_task(task), chunk_hash(chunk)) for task, chunk in pairs]
+
+        # Unique pairs, split between cached scores and pairs to score
+        found: Dict[Tuple[str, str], float] = {}
+        missing: Dict[Tuple[str, str], List[str]] = {}
+        with self._lock:
+            for key, (task, chunk) in zip(keys, pairs):
+                if key in found or key in missing:
+                    continue
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    found[key] = self._cache[key]
+                else:
+                    missing[key] = [task, chunk]
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            with cross_encoder(self.backend) as model:
+                found.update(zip(missing, self._predict(model, list(missing.values()))))
+
+            with self._lock:
+                for key in missing:
+                    self._cache[key] = found[key]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        logger.info(f"Reranked {len(keys)} pairs ({len(missing)} scored by the model)")
+
+        return [found[key] for key in keys]
+
+    def top_k(self, tasks: Sequence[str], docs: Sequence[str], k: int = 3, stage: int = RERANK_STAGE) -> Tuple[List[str], int]:
+        """
+        The k best docs for the tasks (best CrossEncoder score over the tasks) and the number
+        of docs reranked. `docs` come best candidate first: they are scored `stage` at a time
+        and the reranking stops as soon as a stage doesn't change the top-k.
+        """
+
+        best: Dict[str, Tuple[float, str]] = {}
+        top: List[str] = []
+        scored = 0
+
+        if not tasks:
+            return top, scored
+
+        for start in range(0, len(docs), stage):
+            batch = docs[start:start + stage]
+            pairs = [[task, doc] for task in tasks for doc in batch]
+            for score, (_, doc) in zip(self.score(pairs), pairs):
+                key = chunk_hash(doc)
+                if key not in best or score > best[key][0]:
+                    best[key] = (score, doc)
+            scored += len(batch)
+
+            previous = top
+            top = [doc for _, doc in sorted(best.values(), key=lambda x: x[0], reverse=True)[:k]]
+            if len(previous) >= k and top == previous:
+                with self._lock:
+                    self.metrics["early_exits"] += 1
+                break
+
+        return top, scored
+
+    def record(self, **counts: int) -> None:
+        """
+        Add candidate counts (retrieved, prefiltered, reranked...) to the metrics
+        """
+
+        with self._lock:
+            self.metrics["requests"] += 1
+            self.metrics.update(counts)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses, **self.metrics}
+
+
+
+# Process-wide reranker
+reranker = Reranker()
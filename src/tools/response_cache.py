@@ -0,0 +1,131 @@
+import time, hashlib, logging, os, re
+from typing import Optional
+import tools.db as db
+from tools.models import PLANNER_MODEL, EXPLAIN_MODEL, CORRECTION_MODEL, CROSS_ENCODER_MODEL
+
+# =============================================================================
+# SEMANTIC RESPONSE CACHE (question -> deployed topology)
+# =============================================================================
+
+
+logger = logging.getLogger(__name__)
+
+
+COLLECTION_NAME = "clab_cache"
+
+# Minimum cosine similarity between two questions to reuse a topology
+SIMILARITY_THRESHOLD = float(os.environ.get("CLAB_CACHE_THRESHOLD", 0.92))
+
+# Entries older than this are ignored and removed (seconds)
+TTL_SECONDS = int(os.environ.get("CLAB_CACHE_TTL", 7 * 24 * 3600))
+
+# Maximum number of entries, the least recently hit are evicted first
+MAX_ENTRIES = int(os.environ.get("CLAB_CACHE_MAX_ENTRIES", 500))
+
+
+
+def model_versions() -> str:
+    """
+    Models that produced a topology. Changing one of them invalidates the cache.
+    """
+
+    return "|".join([EXPLAIN_MODEL, PLANNER_MODEL, CORRECTION_MODEL, CROSS_ENCODER_MODEL])
+
+
+
+def _collection():
+    # Cosine space so that distances convert directly into similarities
+    return db.store.get_or_create_collection(name=COLLECTION_NAME, metadata={"hnsw:space": "cosine"})
+
+
+
+def _entry_id(question: str) -> str:
+    norm = re.sub(r"\s+", " ", question).strip().lower()
+    return hashlib.sha1(f"{model_versions()}|{norm}".encode("utf-8")).hexdigest()
+
+
+
+def lookup(question: str) -> Optional[str]:
+    """
+    Return the topology of a past, successfully deployed request similar to `question`.
+    """
+
+    try:
+        collection = _collection()
+        if collection.count() == 0:
+            return None
+
+        result = collection.query(
+            query_embeddings=db.embedder.embed_documents([question]),
+            where={"models": model_versions()},
+            include=["metadatas", "distances"],
+            n_results=3
+        )
+    except Exception as e:
+        logger.warning(f"Response cache lookup failed: {e}")
+        return None
+
+    now = time.time()
+    expired = []
+
+    for entry_id, metadata, distance in zip(result["ids"][0], result["metadatas"][0], result["distances"][0]):
+        if now - metadata.get("created", 0) > TTL_SECONDS:
+            expired.append(entry_id)
+            continue
+
+        similarity = 1 - distance
+        if similarity < SIMILARITY_THRESHOLD:
+            continue
+
+        # LRU bookkeeping
+        collection.update(ids=[entry_id], metadatas=[{**metadata, "last_hit": now, "hits": metadata.get("hits", 0) + 1}])
+
+        if expired:
+            collection.delete(ids=expired)
+
+        logger.info(f"Response cache hit ({similarity:.3f}) for: {question}")
+        return metadata["topology"]
+
+    if expired:
+        collection.delete(ids=expired)
+
+    return None
+
+
+
+def store(question: str, topology: str) -> None:
+    """
+    Record the topology of a successful deployment and evict the least recently used entries.
+    """
+
+    now = time.time()
+
+    try:
+        collection = _collection()
+        collection.upsert(
+            ids=[_entry_id(question)],
+            documents=[question],
+            embeddings=db.embedder.embed_documents([question]),
+            metadatas=[{"models": model_versions(), "topology": topology, "created": now, "last_hit": now, "hits": 0}]
+        )
+
+        count = collection.count()
+        if count > MAX_ENTRIES:
+            entries = collection.get(include=["metadatas"])
+            by_last_hit = sorted(zip(entries["ids"], entries["metadatas"]), key=lambda e: e[1].get("last_hit", 0))
+            collection.delete(ids=[entry_id for entry_id, _ in by_last_hit[:count - MAX_ENTRIES]])
+
+    except Exception as e:
+        logger.warning(f"Impossible to store the topology in the response cache: {e}")
+
+
+
+def invalidate(topology: str) -> None:
+    """
+    Forget a cached topology (e.g. it doesn't deploy anymore).
+    """
+
+    try:
+        _collection().delete(where={"topology": topology})
+    except Exception as e:
+        logger.warning(f"Impossible to invalidate the cached topology: {e}")
@@ -1,19 +1,62 @@
 from collections.abc import AsyncIterator
-from typing import Any, AsyncIterator, List
+from typing import Any, AsyncIterator, List, Optional
 import scrapy
-from scrapy.http import Response, Request
+from scrapy.http import Response, Request, HtmlResponse
+from scrapy.exceptions import IgnoreRequest
 import db as db
+import summary_cache
+import keyword_index
+import crawl_manifest
+from snapshot_store import SnapshotStore
+import page_extract
+from embedding_cache import EmbeddingCache
 import re
-import os, hashlib
+import os, sys, hashlib, subprocess, time, asyncio
+from concurrent.futures import ProcessPoolExecutor
 from langchain_experimental.text_splitter import SemanticChunker
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_core.documents import Document
 
+
+class SnapshotReplayMiddleware:
+    """Answers every request from the snapshot store: no network, no browser"""
+    
+    def process_request(self, request, spider):
+        snapshot = spider.snapshots.get(request.url)
+        if snapshot is None:
+            raise IgnoreRequest(f"{request.url} is not in the snapshot store")
+        
+        return HtmlResponse(url=request.url, status=snapshot["status"], headers=snapshot["headers"],
+                            body=snapshot["body"], encoding="utf-8", request=request)
+
+
 class ClabDoc(scrapy.Spider):
     name = "clabdoc"
     
     list_url: List[str] = []
     
+    # Build the pre-summarised index after indexing (-a presummarize=0 to skip)
+    presummarize: str = "1"
+    
+    # Only re-index the pages that changed since the last crawl (-a incremental=1)
+    incremental: str = "0"
+    
+    # Request every discovered page at once (-a parallel=0 for the former one-page-at-a-time chain)
+    parallel: str = "1"
+    
+    # Pages fetched at the same time and browser contexts sharing them (-a concurrency=16 -a contexts=4)
+    concurrency: str = os.environ.get("CLAB_CRAWL_CONCURRENCY", "8")
+    contexts: str = os.environ.get("CLAB_CRAWL_CONTEXTS", "2")
+    
+    # playwright, or http for a plain download: the documentation pages are static HTML (-a fetcher=http)
+    fetcher: str = os.environ.get("CLAB_CRAWL_FETCHER", "playwright")
+    
+    # record every fetched page in the snapshot store, or replay the crawl from it (-a snapshot=record|replay)
+    snapshot: str = ""
+    snapshot_dir: str = os.environ.get("CLAB_CRAWL_SNAPSHOTS", "./crawl_snapshots")
+    
+    # Processes extracting the pages, 0 extracts them in the crawl process (-a parse_workers=4)
+    parse_workers: str = os.environ.get("CLAB_CRAWL_PARSE_WORKERS", "0")
+    
     # Define the allowed URL patterns
     ALLOWED_PATTERNS = [
         r'^https://containerlab\.dev/manual/kinds/.*',
@@ -29,10 +72,31 @@ class ClabDoc(scrapy.Spider):
         },
         "TWISTED_REACTOR": "twisted.internet.asyncioreactor.AsyncioSelectorReactor",
         "PLAYWRIGHT_LAUNCH_OPTIONS": {
-            "headless": False 
+            # Set CLAB_CRAWL_HEADLESS=0 to watch the browser
+            "headless": os.environ.get("CLAB_CRAWL_HEADLESS", "1") not in ("0", "false")
         }
     }
     
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        
+        # Every page is on containerlab.dev: the per-domain limit is the real one
+        concurrency = int(spider.concurrency)
+        contexts = max(1, int(spider.contexts))
+        crawler.settings.set("CONCURRENT_REQUESTS", concurrency, priority="spider")
+        crawler.settings.set("CONCURRENT_REQUESTS_PER_DOMAIN", concurrency, priority="spider")
+        crawler.settings.set("PLAYWRIGHT_MAX_CONTEXTS", contexts, priority="spider")
+        crawler.settings.set("PLAYWRIGHT_MAX_PAGES_PER_CONTEXT", -(-concurrency // contexts), priority="spider")
+        
+        # Replay: the store answers the requests, Scrapy's own handlers are kept (no browser launched)
+        if spider.snapshot == "replay":
+            crawler.settings.set("DOWNLOAD_HANDLERS", {}, priority="spider")
+            crawler.settings.set("DOWNLOADER_MIDDLEWARES",
+                                 {f"{cls.__module__}.SnapshotReplayMiddleware": 50}, priority="spider")
+        
+        return spider
+    
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         
@@ -40,7 +104,40 @@ class ClabDoc(scrapy.Spider):
         self.list_url: list[str] = []
         self._finalized: bool = False
         self.processed_urls: set = set()  # Track processed URLs to avoid duplicates
-        self.embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        self.discovered_urls: set = set()  # Every allowed URL seen in this crawl
+        self.unchanged_urls: set = set()  # Pages identical to the last crawl (incremental mode)
+        self.manifest: dict = crawl_manifest.load()  # Pages of the last crawl
+        self.pages: dict = {}  # Manifest entries of this crawl
+        self.requests_count: int = 0  # Spreads the pages over the browser contexts
+        self.snapshots = SnapshotStore(self.snapshot_dir) if self.snapshot in ("record", "replay") else None
+        self.parse_seconds: float = 0.0  # Time spent extracting the pages
+        self.parse_pool = ProcessPoolExecutor(max_workers=int(self.parse_workers)) if int(self.parse_workers) > 0 else None
+        
+        # One cached, batched embedder for the chunking and the indexing: a text is embedded once across crawls
+        self.embeddings = EmbeddingCache(db.embedder, db.EMBEDDING_MODEL)
+    
+    def is_incremental(self) -> bool:
+        return str(self.incremental).lower() in ("1", "true", "yes")
+    
+    def is_parallel(self) -> bool:
+        return str(self.parallel).lower() in ("1", "true", "yes")
+    
+    def make_request(self, url: str) -> Request:
+        """Request of a page, conditional (ETag/Last-Modified) in incremental mode"""
+        headers = crawl_manifest.conditional_headers(self.manifest.get(url, {})) if self.is_incremental() else {}
+        meta = {"handle_httpstatus_list": [304]}
+        
+        # Without the playwright meta, scrapy-playwright hands the request to the plain HTTP handler
+        if self.fetcher == "playwright" and self.snapshot != "replay":
+            meta["playwright"] = True
+            meta["playwright_context"] = f"crawl-{self.requests_count % max(1, int(self.contexts))}"
+        self.requests_count += 1
+        
+        # Taken as soon as requested in parallel mode, so that no other page requests it again
+        if self.is_parallel():
+            self.processed_urls.add(url)
+        
+        return Request(url=url, callback=self.parse_doc, headers=headers, meta=meta)
     
     def is_allowed_url(self, url: str) -> bool:
         """Check if URL matches any of the allowed patterns"""
@@ -58,15 +155,18 @@ class ClabDoc(scrapy.Spider):
             'https://containerlab.dev/manual/network/'
         ]
         
+        self.discovered_urls.update(start_urls)
+        
         for url in start_urls:
-            yield Request(url=url, callback=self.parse_doc, meta={"playwright": True})
+            yield self.make_request(url)
     
-    def extract_urls_from_navigation(self, response: Response) -> List[str]:
+    def extract_urls_from_navigation(self, response: Response, nav_links: Optional[List[str]] = None) -> List[str]:
         """Extract URLs from navigation that match our allowed patterns"""
         urls = []
         
-        # Get all navigation links
-        nav_links = response.xpath('//nav//a/@href').getall()
+        # Get all navigation links (unless already extracted with the page)
+        if nav_links is None:
+            nav_links = page_extract.navigation_links(response)
         
         for href in nav_links:
             # Convert relative URLs to absolute
@@ -90,96 +190,117 @@ class ClabDoc(scrapy.Spider):
             if not absolute_url.endswith('/') and not absolute_url.split('/')[-1].count('.'):
                 absolute_url += '/'
             
-            # Check if URL matches our patterns
-            if self.is_allowed_url(absolute_url) and absolute_url not in self.processed_urls:
+            # Check if URL matches our patterns (the processed ones are kept for the manifest)
+            if self.is_allowed_url(absolute_url) and absolute_url not in urls:
                 urls.append(absolute_url)
                 self.logger.info(f"Found matching URL: {absolute_url}")
         
         return urls
         
-    def parse_doc(self, response: Response, **kwargs: Any):
+    def follow(self, urls: List[str]):
+        """Request the new URLs (all of them in parallel mode, otherwise the next one of the list)"""
+        self.discovered_urls.update(urls)
+        
+        if self.is_parallel():
+            for url in urls:
+                if url not in self.processed_urls:
+                    yield self.make_request(url)
+            return
+        
+        # Add new URLs to our list (avoiding duplicates)
+        for url in urls:
+            if url not in self.list_url and url not in self.processed_urls:
+                self.list_url.append(url)
+        
+        # Process next URL from our filtered list
+        if self.list_url:
+            next_url = self.list_url.pop(0)
+            self.logger.info(f"Next URL to process: {next_url}")
+            yield self.make_request(next_url)
+        
+    async def parse_doc(self, response: Response, **kwargs: Any):
         # Mark this URL as processed
         self.processed_urls.add(response.url)
         
-        article = response.xpath('//article/*')
+        # Not modified since the last crawl: its chunks stay as they are, its links are the recorded ones
+        if response.status == 304:
+            self.unchanged_urls.add(response.url)
+            self.pages[response.url] = dict(self.manifest.get(response.url, {}))
+            self.logger.info(f"⏭️ {response.url} not modified")
+            for request in self.follow(self.pages[response.url].get("links", [])):
+                yield request
+            return
         
-        page_content: str
+        # Stored as received, for the offline replays
+        if self.snapshot == "record":
+            self.snapshots.put(response.url, response.status, dict(response.headers.to_unicode_dict()), response.body)
         
-        page_content = "url: " + response.url + "\n"
+        started = time.perf_counter()
         
-        for index, element in enumerate(article):
-            tag = element.xpath('name()').get()
-            codes = element.xpath('.//code[@class="md-code__content"]')
-
-            text_code = ["\nCode (YAML ou SQL ou CLI)\n"]
-            
-            if (codes):
-                spans = codes.xpath('./span')
-                
-                for span in spans:
-                    text_code = text_code + ["\n"] + span.xpath("./span/text()").getall() if len(text_code) != 0 else span.xpath("./span/text()").getall()
-                
-                if not "".join(text_code).strip() == "Code (YAML ou SQL ou CLI)":
-                    page_content = page_content + "".join(text_code) + "\n\n"
-            
-            if (tag == "h1"):
-                title = element.xpath('text()').get()
-                page_content = page_content + "# " + str(title) + "\n\n"
-            
-            if (tag == "h2"):
-                subtitle = element.xpath('text()').get()
-                page_content = page_content + "## " + str(subtitle) + "\n\n"
-            
-            if (tag == "h3"): 
-                subtitle = element.xpath('text()').get()
-                page_content = page_content + "### " + str(subtitle) + "\n\n"
-                
-            if (tag == "h4"): 
-                subtitle = element.xpath('text()').get()
-                page_content = page_content + "#### " + str(subtitle) + "\n\n"
-                
-            if (tag == "p"): 
-                p_content = element.get()
-                
-                if p_content:
-                    p_content = re.sub(r'^<p[^>]*>|</p>$', '', p_content.strip())
-                    p_content = re.sub(r'<code[^>]*>|</code>', '', p_content)
-                    p_content = re.sub(r'<a[^>]*>|</a>', '', p_content)
-                    
-                    p_content = ' '.join(p_content.split())
-                    
-                    page_content = page_content + str(p_content) + "\n\n"
+        # Extraction in the parse pool (separate processes) or here
+        if self.parse_pool is not None:
+            loop = asyncio.get_running_loop()
+            page_content, nav_links = await loop.run_in_executor(self.parse_pool, page_extract.extract_page,
+                                                                 response.url, response.text)
+        else:
+            page_content = page_extract.extract_content(response, response.url)
+            nav_links = page_extract.navigation_links(response)
 
         # Extract URLs from this page that match our patterns
-        new_urls = self.extract_urls_from_navigation(response)
-        
-        # Add new URLs to our list (avoiding duplicates)
-        for url in new_urls:
-            if url not in self.list_url and url not in self.processed_urls:
-                self.list_url.append(url)
+        new_urls = self.extract_urls_from_navigation(response, nav_links)
         
         page_content_filtred = page_content.replace('"', "'")
         
-        doc = Document(page_content=page_content_filtred, metadata={"url": response.url})
-        self.raw_docs.append(doc)
+        # Manifest entry: HTTP validators, content hash and links of the page
+        previous = self.manifest.get(response.url, {})
+        entry = {
+            "etag": (response.headers.get("ETag") or b"").decode("latin-1"),
+            "last_modified": (response.headers.get("Last-Modified") or b"").decode("latin-1"),
+            "hash": crawl_manifest.page_hash(page_content_filtred),
+            "links": new_urls,
+        }
+        self.pages[response.url] = entry
         
-        self.logger.info(f"☑️ {response.url} recorded! ({len(self.raw_docs)} docs so far)")
+        if self.is_incremental() and previous.get("hash") == entry["hash"]:
+            # Same content (the server didn't honour the validators): nothing to re-index
+            entry["chunk_ids"] = previous.get("chunk_ids", [])
+            self.unchanged_urls.add(response.url)
+            self.logger.info(f"⏭️ {response.url} unchanged")
+        else:
+            doc = Document(page_content=page_content_filtred, metadata={"url": response.url})
+            self.raw_docs.append(doc)
+            
+            self.logger.info(f"☑️ {response.url} recorded! ({len(self.raw_docs)} docs so far)")
         
-        # Process next URL from our filtered list
-        if self.list_url:
-            next_url = self.list_url.pop(0)
-            self.logger.info(f"Next URL to process: {next_url}")
-            yield Request(url=next_url, callback=self.parse_doc, meta={"playwright": True})
+        self.parse_seconds += time.perf_counter() - started
+        
+        for request in self.follow(new_urls):
+            yield request
             
-    def _finalize(self):
+    def _finalize(self, reason: str = "finished"):
         if self._finalized:
             return
         self._finalized = True
+        started = time.perf_counter()
 
-        self.logger.info(f"Finalizing with {len(self.raw_docs)} documents")
+        self.logger.info(f"Finalizing with {len(self.raw_docs)} documents ({self.parse_seconds:.2f}s spent in parse_doc)")
+        
+        # Pages arrive in any order when crawled in parallel
+        self.raw_docs.sort(key=lambda doc: doc.metadata.get("url", ""))
+        
+        # Pages of the last crawl no longer linked anywhere (only trusted after a complete crawl)
+        removed_urls = set()
+        if self.is_incremental():
+            self.logger.info(f"{len(self.unchanged_urls)} pages unchanged since the last crawl")
+            if reason == "finished":
+                removed_urls = crawl_manifest.removed_urls(self.manifest, self.discovered_urls)
 
-        if not self.raw_docs:
-            self.logger.warning("No documents were scraped!")
+        if not self.raw_docs and not removed_urls:
+            if self.is_incremental() and self.pages:
+                crawl_manifest.save(crawl_manifest.merge(self.manifest, self.pages, removed_urls))
+                self.logger.info("✅ Documentation unchanged, nothing to re-index")
+            else:
+                self.logger.warning("No documents were scraped!")
             return
 
         # Log dos documentos antes do chunking
@@ -214,22 +335,68 @@ class ClabDoc(scrapy.Spider):
             chunks = self.raw_docs
             self.logger.info(f"Using original documents as fallback: {len(chunks)} docs")
 
+        # Chunk IDs are numbered per page, so a page's IDs don't depend on the other pages
         ids = []
-        for i, d in enumerate(chunks):
+        position = {}
+        for d in chunks:
+            url = d.metadata.get("url", "")
+            i = position.get(url, 0)
+            position[url] = i + 1
             d.metadata["chunk"] = i
-            key = (d.metadata.get("url", "") + "|" + str(i) + "|" + d.page_content[:200]).encode("utf-8")
-            ids.append(hashlib.sha1(key).hexdigest())
+            key = (url + "|" + str(i) + "|" + d.page_content[:200]).encode("utf-8")
+            chunk_id = hashlib.sha1(key).hexdigest()
+            ids.append(chunk_id)
+            self.pages.setdefault(url, {}).setdefault("chunk_ids", []).append(chunk_id)
 
         self.logger.info(f"Split into {len(chunks)} chunks, adding to database...")
 
         try:
-            db.add_scrapy(document=chunks, embeddings=self.embeddings, ids=ids)
-            self.logger.info("✅ Database insertion completed!")
+            if self.is_incremental():
+                # Previous chunks of the changed pages and chunks of the removed ones
+                changed_urls = {doc.metadata.get("url", "") for doc in self.raw_docs}
+                stale_ids = crawl_manifest.chunk_ids(self.manifest, changed_urls | removed_urls)
+                db.update_scrapy(document=chunks, embeddings=self.embeddings, ids=ids, delete_ids=stale_ids)
+                manifest = crawl_manifest.merge(self.manifest, self.pages, removed_urls)
+                self.logger.info(f"✅ Database updated! {len(changed_urls)} pages changed, {len(removed_urls)} removed")
+            else:
+                db.add_scrapy(document=chunks, embeddings=self.embeddings, ids=ids)
+                manifest = self.pages
+                self.logger.info("✅ Database insertion completed!")
+            
+            # Summaries of re-scraped chunks with a new content are obsolete
+            invalidated = summary_cache.invalidate(ids, [chunk.page_content for chunk in chunks])
+            self.logger.info(f"Invalidated {invalidated} cached summaries")
+            
+            # Keyword (BM25) index of every stored chunk, for the hybrid retrieval
+            stored = db.get_scrapy()
+            terms = keyword_index.build(stored["ids"], stored["documents"])
+            self.logger.info(f"✅ Keyword index built ({terms} terms)")
+            
+            # Saved last: a failed update is retried by the next incremental crawl
+            crawl_manifest.save(manifest)
         except Exception as e:
             self.logger.error(f"❌ Error adding to database: {e}")
 
-        self.logger.info("✅ Scraped successfully!")
+        self.logger.info(f"✅ Scraped successfully! (finalized in {time.perf_counter() - started:.2f}s)")
+        self.logger.info(f"Embedding cache: {self.embeddings.stats()}")
         self.logger.info(f"Processed URLs: {list(self.processed_urls)}")
     
+    def _presummarize(self):
+        """Run the offline summarization stage (tools/presummarize.py) on the new index"""
+        if str(self.presummarize).lower() in ("0", "false", "no"):
+            return
+        
+        src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.logger.info("Starting the pre-summarization of the chunks...")
+        
+        try:
+            subprocess.run([sys.executable, "-m", "tools.presummarize"], cwd=src_dir, check=True)
+            self.logger.info("✅ Pre-summarization completed!")
+        except Exception as e:
+            self.logger.error(f"❌ Error during pre-summarization: {e}")
+    
     def closed(self, reason):
-        self._finalize()
\ No newline at end of file
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown()
+        self._finalize(reason)
+        self._presummarize()
\ No newline at end of file
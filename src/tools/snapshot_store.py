@@ -0,0 +1,86 @@
+import gzip, hashlib, json, os, threading, time, logging
+from typing import Dict, List, Optional
+
+# =============================================================================
+# COMPRESSED SNAPSHOTS OF THE DOCUMENTATION CRAWL
+# =============================================================================
+
+"""
+Every page fetched by `ClabDoc` (-a snapshot=record), stored as it was received:
+one gzipped body per URL and an `index.json` with its status and headers.
+`-a snapshot=replay` serves the crawl from this store, with no network and no
+browser, so re-chunking or re-embedding experiments and benchmarks of `parse_doc`
+and `_finalize` run offline and deterministically.
+
+No project imports here, the spider imports this module from `tools/` directly.
+"""
+
+
+logger = logging.getLogger(__name__)
+
+
+SNAPSHOT_PATH = os.environ.get("CLAB_CRAWL_SNAPSHOTS", "./crawl_snapshots")
+
+# Headers replayed with the body (the validators are needed by the incremental crawl)
+KEPT_HEADERS = ("content-type", "etag", "last-modified")
+
+
+
+class SnapshotStore:
+    """
+    URL -> (status, headers, body) store in a directory.
+    """
+
+    def __init__(self, path: str = SNAPSHOT_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(path, "index.json")
+
+        try:
+            with open(self._index_path, encoding="utf-8") as file:
+                self._index: Dict[str, dict] = json.load(file)
+        except FileNotFoundError:
+            self._index = {}
+
+    @staticmethod
+    def _file_name(url: str) -> str:
+        return hashlib.sha1(url.encode("utf-8")).hexdigest() + ".html.gz"
+
+    def put(self, url: str, status: int, headers: Dict[str, str], body: bytes) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        file_name = self._file_name(url)
+
+        # mtime=0: the same body always gives the same file
+        with open(os.path.join(self.path, file_name), "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as file:
+                file.write(body)
+
+        with self._lock:
+            self._index[url] = {
+                "file": file_name,
+                "status": status,
+                "headers": {k: v for k, v in headers.items() if k.lower() in KEPT_HEADERS},
+                "fetched": time.time(),
+            }
+
+            tmp_path = self._index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump(self._index, file, indent=1, sort_keys=True)
+            os.replace(tmp_path, self._index_path)
+
+    def get(self, url: str) -> Optional[dict]:
+        """
+        {"status", "headers", "body"} of the stored page, None when it wasn't recorded
+        """
+
+        entry = self._index.get(url)
+        if entry is None:
+            return None
+
+        with gzip.open(os.path.join(self.path, entry["file"]), "rb") as file:
+            body = file.read()
+
+        return {"status": entry["status"], "headers": entry["headers"], "body": body}
+
+    def urls(self) -> List[str]:
+        return sorted(self._index)
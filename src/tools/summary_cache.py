@@ -0,0 +1,115 @@
+import sqlite3, hashlib, threading, time, json, os, logging
+from typing import Dict, Iterable, List, Optional
+
+# =============================================================================
+# PER-CHUNK DOCUMENTATION SUMMARY CACHE
+# =============================================================================
+
+"""
+Summaries (`Doc`-shaped dicts) of the documentation chunks, keyed by the SHA1
+chunk IDs computed by `ClabDoc._finalize`. Each entry keeps the hash of the
+chunk content it was built from: a re-scraped chunk with new content is a miss.
+
+No project imports here, the spider imports this module from `tools/` directly.
+"""
+
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_PATH = os.environ.get("CLAB_SUMMARY_CACHE_PATH", "./summary_cache.sqlite3")
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+
+
+
+def _connection() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(CACHE_PATH, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "chunk_id TEXT PRIMARY KEY, "
+            "content_hash TEXT NOT NULL, "
+            "doc TEXT NOT NULL, "
+            "updated REAL NOT NULL)"
+        )
+        _conn.commit()
+    return _conn
+
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+
+def get(chunks: Dict[str, str]) -> Dict[str, dict]:
+    """
+    Cached summaries for the given {chunk_id: chunk content}.
+    Entries built from another content are invalidated.
+    """
+
+    if not chunks:
+        return {}
+
+    with _lock:
+        conn = _connection()
+        placeholders = ",".join("?" * len(chunks))
+        rows = conn.execute(
+            f"SELECT chunk_id, content_hash, doc FROM summaries WHERE chunk_id IN ({placeholders})",
+            list(chunks)
+        ).fetchall()
+
+        found, stale = {}, []
+        for chunk_id, stored_hash, doc in rows:
+            if stored_hash == content_hash(chunks[chunk_id]):
+                found[chunk_id] = json.loads(doc)
+            else:
+                stale.append(chunk_id)
+
+        if stale:
+            conn.executemany("DELETE FROM summaries WHERE chunk_id = ?", [(c,) for c in stale])
+            conn.commit()
+
+    return found
+
+
+
+def put(summaries: Dict[str, dict], chunks: Dict[str, str]) -> None:
+    """
+    Store the summaries {chunk_id: Doc dict} built from the given {chunk_id: chunk content}.
+    """
+
+    now = time.time()
+
+    with _lock:
+        conn = _connection()
+        conn.executemany(
+            "INSERT OR REPLACE INTO summaries (chunk_id, content_hash, doc, updated) VALUES (?, ?, ?, ?)",
+            [(chunk_id, content_hash(chunks[chunk_id]), json.dumps(doc), now) for chunk_id, doc in summaries.items()]
+        )
+        conn.commit()
+
+
+
+def invalidate(chunk_ids: Iterable[str], contents: Iterable[str]) -> int:
+    """
+    Drop the summaries whose chunk was re-scraped with a new content.
+    Returns the number of invalidated entries.
+    """
+
+    hashes = {chunk_id: content_hash(content) for chunk_id, content in zip(chunk_ids, contents)}
+    if not hashes:
+        return 0
+
+    with _lock:
+        conn = _connection()
+        rows = conn.execute("SELECT chunk_id, content_hash FROM summaries").fetchall()
+        stale = [(chunk_id,) for chunk_id, stored in rows if chunk_id in hashes and hashes[chunk_id] != stored]
+        conn.executemany("DELETE FROM summaries WHERE chunk_id = ?", stale)
+        conn.commit()
+
+    return len(stale)
@@ -0,0 +1,110 @@
+import os, queue, threading
+from typing import Dict, List, Tuple
+from rich.console import Console
+from rich.rule import Rule
+from rich.tree import Tree
+
+# =============================================================================
+# NON-BLOCKING PROGRESS TIMELINE
+# =============================================================================
+
+
+# Stylization for rich console output
+console = Console(force_terminal=True)
+
+
+# Header and tree title of each module timeline
+MODULES: Dict[str, Tuple[str, str]] = {
+    "orchestrator": ("[bold blue]🧠​ Orchestrator Module[/]", "⏳​ Orchestrator Timeline"),
+    "researcher": ("[bold blue]🔍 Research Module[/]", "⏳​ Researcher Timeline"),
+}
+
+# Disables every rendering (headless hosts)
+HEADLESS = os.environ.get("CLAB_HEADLESS", "") not in ("", "0", "false")
+
+
+
+class TimelineRenderer:
+    """
+    Renders the timelines on a background daemon thread.
+
+    The pipeline only enqueues a snapshot of the steps, so it never waits on
+    the terminal. Snapshots are rebuilt into rich Trees by the renderer thread.
+    """
+
+    def __init__(self) -> None:
+        self._queue: "queue.Queue[Tuple[str, List[str]]]" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, module: str, steps: List[str]) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="timeline-renderer", daemon=True)
+                self._thread.start()
+        self._queue.put((module, list(steps)))
+
+    def _run(self) -> None:
+        while True:
+            module, steps = self._queue.get()
+
+            # Only the latest snapshot of a burst is worth printing
+            while not self._queue.empty():
+                next_module, next_steps = self._queue.get()
+                if next_module != module:
+                    self._render(module, steps)
+                module, steps = next_module, next_steps
+
+            self._render(module, steps)
+
+    def _render(self, module: str, steps: List[str]) -> None:
+        header, title = MODULES[module]
+        tree = Tree(title, guide_style="bold white")
+        for step in steps:
+            tree.add(step)
+
+        try:
+            console.print(Rule(header))
+            console.print(tree)
+        except Exception:
+            pass
+
+
+
+renderer = TimelineRenderer()
+
+# Steps of each (session, module) timeline
+_timelines: Dict[Tuple[str, str], List[str]] = {}
+_timelines_lock = threading.Lock()
+
+
+
+def add_step(session: str, module: str, step: str, render: bool = True) -> None:
+    """
+    Record a step in the timeline of a session and render it in the background.
+    """
+
+    with _timelines_lock:
+        steps = _timelines.setdefault((session, module), [])
+        steps.append(step)
+        snapshot = list(steps)
+
+    if render and not HEADLESS:
+        renderer.submit(module, snapshot)
+
+
+
+def steps(session: str, module: str) -> List[str]:
+    with _timelines_lock:
+        return list(_timelines.get((session, module), []))
+
+
+
+def discard(session: str) -> None:
+    """
+    Drop the timelines of a finished session.
+    """
+
+    with _timelines_lock:
+        for key in [k for k in _timelines if k[0] == session]:
+            del _timelines[key]
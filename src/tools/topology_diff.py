@@ -0,0 +1,171 @@
+import json, re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# =============================================================================
+# TOPOLOGY DIFF (INCREMENTAL REDEPLOY)
+# =============================================================================
+
+"""
+What changed between the deployed topology and its correction, so that only the
+changed nodes are torn down and recreated.
+
+The nodes are compared after ContainerLab's inheritance (defaults, then kind,
+then group, then node). Link endpoints are created with their nodes, so both
+nodes of an added or removed link are recreated too. A change of the lab itself
+(name, prefix, mgmt network) always needs a full redeploy.
+"""
+
+
+# Endpoints of a link that aren't nodes of the topology
+SPECIAL_ENDPOINTS = {"host", "mgmt-net", "macvlan"}
+
+# Top-level settings shared by every node
+LAB_KEYS = ("name", "prefix", "mgmt")
+
+LAB_NAME_RE = re.compile(r'^name:[ \t]*(.*?)[ \t]*(#.*)?$', re.MULTILINE)
+
+
+
+def _mapping(value: Any) -> Dict[str, Any]:
+    # A malformed block (scalar, list) counts as empty
+    return value if isinstance(value, dict) else {}
+
+
+
+def effective_nodes(parsed: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Settings of every node once the defaults, kind and group settings are applied
+    """
+
+    topo = _mapping(_mapping(parsed).get("topology"))
+    kinds = _mapping(topo.get("kinds"))
+    groups = _mapping(topo.get("groups"))
+    defaults = _mapping(topo.get("defaults"))
+
+    nodes = {}
+    for name, node in _mapping(topo.get("nodes")).items():
+        node = _mapping(node)
+        group = node.get("group")
+        group = _mapping(groups.get(group)) if isinstance(group, str) else {}
+        kind = node.get("kind") or group.get("kind") or defaults.get("kind")
+        kind_settings = _mapping(kinds.get(kind)) if isinstance(kind, str) else {}
+        nodes[str(name)] = {**defaults, **kind_settings, **group, **node, "kind": kind}
+    return nodes
+
+
+
+def link_endpoints(link: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """
+    (node, interface) of the endpoints of a link, brief ("r1:eth1") or extended format
+    """
+
+    endpoints = link.get("endpoints") or ([link["endpoint"]] if "endpoint" in link else [])
+    parsed = []
+    for endpoint in endpoints:
+        if isinstance(endpoint, dict):
+            parsed.append((str(endpoint.get("node")), str(endpoint.get("interface"))))
+        else:
+            node, _, interface = str(endpoint).partition(":")
+            parsed.append((node, interface))
+    return parsed
+
+
+
+def _link_key(link: Dict[str, Any]) -> str:
+    attributes = {k: v for k, v in link.items() if k not in ("endpoints", "endpoint")}
+    return json.dumps([sorted(link_endpoints(link)), attributes], sort_keys=True, default=str)
+
+
+
+def _links(parsed: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    links = (parsed.get("topology") or {}).get("links") or []
+    return {_link_key(link): link for link in links if isinstance(link, dict)}
+
+
+
+def diff_topologies(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Changes from the `old` parsed topology to the `new` one:
+    {"full": reason or None, "added", "removed", "changed", "links_added", "links_removed", "recreate"}
+    `recreate` lists the nodes of `new` to tear down and deploy again.
+    """
+
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return {"full": "the topology isn't a mapping"}
+
+    for key in LAB_KEYS:
+        if old.get(key) != new.get(key):
+            return {"full": f"'{key}' changed"}
+
+    old_nodes, new_nodes = effective_nodes(old), effective_nodes(new)
+    old_links, new_links = _links(old), _links(new)
+
+    added = [n for n in new_nodes if n not in old_nodes]
+    removed = [n for n in old_nodes if n not in new_nodes]
+    changed = [n for n in new_nodes if n in old_nodes and new_nodes[n] != old_nodes[n]]
+
+    links_added = [new_links[k] for k in new_links if k not in old_links]
+    links_removed = [old_links[k] for k in old_links if k not in new_links]
+
+    # The interfaces of a changed link only come back with their nodes
+    recreate: Set[str] = set(added) | set(changed)
+    for link in links_added + links_removed:
+        recreate |= {node for node, _ in link_endpoints(link) if node in new_nodes}
+
+    return {
+        "full": None,
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+        "links_added": links_added,
+        "links_removed": links_removed,
+        "recreate": sorted(recreate),
+    }
+
+
+
+def reconnect_links(parsed: Dict[str, Any], recreate: Set[str]) -> List[Tuple[Tuple[str, str], Tuple[str, str]]]:
+    """
+    Links between a recreated node and a kept one: the deploy of the recreated nodes
+    alone (node filter) doesn't create them, they are added afterwards.
+    """
+
+    nodes = effective_nodes(parsed)
+    pairs = []
+    for link in _links(parsed).values():
+        endpoints = link_endpoints(link)
+        if len(endpoints) != 2 or any(node in SPECIAL_ENDPOINTS or node not in nodes for node, _ in endpoints):
+            continue
+        if sum(node in recreate for node, _ in endpoints) == 1:
+            pairs.append((endpoints[0], endpoints[1]))
+    return pairs
+
+
+
+def container_name(parsed: Dict[str, Any], node: str) -> str:
+    """
+    Docker name of a node, following the lab `prefix` rules of ContainerLab
+    """
+
+    lab = parsed.get("name")
+    prefix = parsed.get("prefix", "clab")
+    if prefix == "":
+        return node
+    if prefix == "__lab-name":
+        return f"{lab}-{node}"
+    return f"{prefix}-{lab}-{node}"
+
+
+
+def namespace_lab(yaml_content: str, namespace: Optional[str]) -> str:
+    """
+    The YAML topology with its lab name suffixed by `namespace` (a session ID), so
+    that the labs of concurrent sessions never share a name, nor their containers.
+    The rest of the YAML is left as is, and a name already suffixed isn't changed.
+    """
+
+    match = LAB_NAME_RE.search(yaml_content) if namespace else None
+    name = match.group(1).strip("'\"") if match else ""
+    if not name or name.endswith(f"-{namespace}"):
+        return yaml_content
+    return yaml_content[:match.start(1)] + f"{name}-{namespace}" + yaml_content[match.end(1):]
@@ -0,0 +1,253 @@
+import ipaddress, os, re
+from typing import Any, Dict, List, Optional
+import yaml
+
+# =============================================================================
+# PRE-DEPLOY TOPOLOGY VALIDATION
+# =============================================================================
+
+"""
+Checks of a ContainerLab topology that don't need Docker, run before the deploy.
+
+A topology with errors is sent back to the correction LLM right away, with
+the errors in the prompt, so a mistake costs milliseconds instead of a
+deploy, a cleanup and a correction.
+
+Each error is a dict: {"path": "topology.links[2].endpoints[0]", "message": "..."}.
+"""
+
+
+# Kinds supported by ContainerLab (and their short aliases); CLAB_EXTRA_KINDS adds others, comma separated
+KNOWN_KINDS = {
+    "linux", "bridge", "ovs-bridge", "host", "ext-container", "generic_vm", "k8s-kind",
+    "nokia_srlinux", "srl", "nokia_sros", "vr-sros", "nokia_srsim",
+    "arista_ceos", "ceos", "arista_veos", "vr-veos",
+    "juniper_crpd", "crpd", "juniper_vmx", "vr-vmx", "juniper_vsrx", "juniper_vqfx", "vr-vqfx",
+    "juniper_vjunosrouter", "juniper_vjunosswitch", "juniper_vjunosevolved", "juniper_cjunosevolved",
+    "cisco_xrd", "xrd", "cisco_xrv", "vr-xrv", "cisco_xrv9k", "vr-xrv9k", "cisco_csr1000v", "vr-csr",
+    "cisco_n9kv", "vr-n9kv", "cisco_nxos", "cisco_c8000", "cisco_c8000v", "cisco_cat9kv",
+    "cisco_iol", "cisco_ftdv", "cisco_vios",
+    "sonic-vs", "sonic-vm", "dell_sonic", "dell_ftosv", "vr-ftosv", "cumulus_cvx", "cvx",
+    "mikrotik_ros", "vr-ros", "aruba_aoscx", "huawei_vrp", "ipinfusion_ocnos", "6wind_vsr",
+    "fortinet_fortigate", "paloalto_panos", "vr-pan", "checkpoint_cloudguard",
+    "keysight_ixia-c-one", "ostinato", "fdio_vpp", "openbsd", "freebsd", "rare", "border0",
+} | {kind.strip() for kind in os.environ.get("CLAB_EXTRA_KINDS", "").split(",") if kind.strip()}
+
+# Endpoints of a link that aren't nodes of the topology
+SPECIAL_ENDPOINTS = {"host", "mgmt-net", "macvlan"}
+
+# Management subnet of ContainerLab when mgmt.ipv4-subnet isn't set
+DEFAULT_MGMT_SUBNET = "172.20.20.0/24"
+
+ENDPOINT_RE = re.compile(r'^([A-Za-z0-9][\w.-]*):([A-Za-z0-9][\w./:-]*)$')
+ETH_RE = re.compile(r'^eth(\d+)$')
+
+
+
+def _error(path: str, message: str) -> Dict[str, str]:
+    return {"path": path, "message": message}
+
+
+
+def _mapping(value: Any) -> Dict[str, Any]:
+    # A malformed block (scalar, list) counts as empty, it is reported where it's defined
+    return value if isinstance(value, dict) else {}
+
+
+
+def _node_kind(node: Dict[str, Any], groups: Dict[str, Any], defaults: Dict[str, Any]) -> Optional[str]:
+    group = node.get("group")
+    group = _mapping(_mapping(groups).get(group)) if isinstance(group, str) else {}
+    return node.get("kind") or group.get("kind") or _mapping(defaults).get("kind")
+
+
+
+def _validate_nodes(topo: Dict[str, Any], mgmt: Dict[str, Any]) -> List[Dict[str, str]]:
+    errors = []
+    nodes = topo.get("nodes")
+    groups = topo.get("groups") or {}
+    defaults = topo.get("defaults") or {}
+    kinds = topo.get("kinds") or {}
+
+    if not isinstance(nodes, dict) or not nodes:
+        return [_error("topology.nodes", "the topology has no nodes (expected a mapping of node name -> attributes)")]
+
+    for key, block in (("groups", groups), ("defaults", defaults), ("kinds", kinds)):
+        if not isinstance(block, dict):
+            errors.append(_error(f"topology.{key}", f"{key} must be a mapping, not '{block}'"))
+
+    for name, group in _mapping(groups).items():
+        if group is not None and not isinstance(group, dict):
+            errors.append(_error(f"topology.groups.{name}", "a group must be a mapping of attributes"))
+
+    for kind in _mapping(kinds):
+        if kind not in KNOWN_KINDS:
+            errors.append(_error(f"topology.kinds.{kind}", f"unknown kind '{kind}'"))
+
+    subnet = None
+    try:
+        subnet = ipaddress.IPv4Network(str(mgmt.get("ipv4-subnet") or DEFAULT_MGMT_SUBNET), strict=False)
+    except ValueError:
+        errors.append(_error("mgmt.ipv4-subnet", f"'{mgmt['ipv4-subnet']}' is not an IPv4 subnet"))
+
+    addresses: Dict[str, str] = {}
+    for name, node in nodes.items():
+        path = f"topology.nodes.{name}"
+        if node is None:
+            node = {}
+        if not isinstance(node, dict):
+            errors.append(_error(path, "a node must be a mapping of attributes"))
+            continue
+
+        group = node.get("group")
+        if group is not None and not isinstance(group, str):
+            errors.append(_error(f"{path}.group", "the group must be the name of one of topology.groups"))
+        elif group is not None and group not in _mapping(groups):
+            errors.append(_error(f"{path}.group", f"group '{group}' is not defined in topology.groups"))
+
+        kind = _node_kind(node, groups, defaults)
+        if not kind:
+            errors.append(_error(f"{path}.kind", "the node has no kind (nor a group or defaults kind)"))
+        elif not isinstance(kind, str) or kind not in KNOWN_KINDS:
+            errors.append(_error(f"{path}.kind", f"unknown kind '{kind}'"))
+
+        if "mgmt" in node:
+            errors.append(_error(f"{path}.mgmt", "'mgmt' is not a node attribute, use mgmt-ipv4/mgmt-ipv6"))
+
+        if node.get("mgmt-ipv4"):
+            value = str(node["mgmt-ipv4"])
+            try:
+                address = ipaddress.IPv4Address(value)
+            except ValueError:
+                errors.append(_error(f"{path}.mgmt-ipv4", f"'{value}' is not an IPv4 address"))
+                continue
+            if subnet is not None and address not in subnet:
+                errors.append(_error(f"{path}.mgmt-ipv4", f"{address} is outside mgmt.ipv4-subnet {subnet}"))
+            elif subnet is not None and address in (subnet.network_address, subnet.broadcast_address):
+                errors.append(_error(f"{path}.mgmt-ipv4", f"{address} is not a host address of {subnet}"))
+            if value in addresses:
+                errors.append(_error(f"{path}.mgmt-ipv4", f"{value} is already the address of node '{addresses[value]}'"))
+            addresses.setdefault(value, name)
+
+    return errors
+
+
+
+def _link_endpoints(link: Dict[str, Any], path: str, errors: List[Dict[str, str]]) -> List[tuple]:
+    """
+    (path, node, interface) of the endpoints of a link, brief ("r1:eth1") or extended format
+    """
+
+    endpoints = link.get("endpoints")
+    if endpoints is None and "endpoint" in link:
+        endpoints = [link["endpoint"]]
+
+    if not isinstance(endpoints, list) or not endpoints:
+        errors.append(_error(f"{path}.endpoints", "the link has no endpoints"))
+        return []
+
+    parsed = []
+    for i, endpoint in enumerate(endpoints):
+        endpoint_path = f"{path}.endpoints[{i}]"
+        if isinstance(endpoint, dict):
+            node, interface = endpoint.get("node"), endpoint.get("interface")
+            if not node or not interface:
+                errors.append(_error(endpoint_path, "an endpoint needs 'node' and 'interface'"))
+                continue
+            parsed.append((endpoint_path, str(node), str(interface)))
+            continue
+
+        match = ENDPOINT_RE.match(str(endpoint))
+        if not match:
+            errors.append(_error(endpoint_path, f"'{endpoint}' is not of the form \"node:ethN\""))
+            continue
+        parsed.append((endpoint_path, match.group(1), match.group(2)))
+
+    if "type" not in link and len(endpoints) != 2:
+        errors.append(_error(f"{path}.endpoints", f"a link connects exactly 2 endpoints, not {len(endpoints)}"))
+
+    return parsed
+
+
+
+def _validate_links(topo: Dict[str, Any]) -> List[Dict[str, str]]:
+    errors: List[Dict[str, str]] = []
+    links = topo.get("links") or []
+    nodes = topo.get("nodes") if isinstance(topo.get("nodes"), dict) else {}
+    groups = topo.get("groups") or {}
+    defaults = topo.get("defaults") or {}
+
+    if not isinstance(links, list):
+        return [_error("topology.links", "links must be a list")]
+
+    used: Dict[tuple, str] = {}
+    for i, link in enumerate(links):
+        path = f"topology.links[{i}]"
+        if not isinstance(link, dict):
+            errors.append(_error(path, "a link must be a mapping with 'endpoints'"))
+            continue
+
+        for endpoint_path, node, interface in _link_endpoints(link, path, errors):
+            if node in SPECIAL_ENDPOINTS:
+                continue
+            if node not in nodes:
+                errors.append(_error(endpoint_path, f"node '{node}' is not defined in topology.nodes"))
+                continue
+            if nodes[node] is not None and not isinstance(nodes[node], dict):
+                errors.append(_error(endpoint_path, f"node '{node}' is not a mapping of attributes"))
+                continue
+
+            kind = _node_kind(nodes[node] or {}, groups, defaults)
+            eth = ETH_RE.match(interface)
+            if eth and int(eth.group(1)) == 0 and kind not in ("bridge", "ovs-bridge"):
+                errors.append(_error(endpoint_path, f"'{node}:eth0' is the management interface, data links start at eth1"))
+
+            key = (node, interface)
+            if key in used:
+                errors.append(_error(endpoint_path, f"interface '{node}:{interface}' is already used by {used[key]}"))
+            used.setdefault(key, endpoint_path)
+
+    return errors
+
+
+
+def validate_topology(yaml_string: str) -> List[Dict[str, str]]:
+    """
+    Errors of a ContainerLab YAML topology (an empty list when it looks deployable).
+    Never raises: a topology the checks can't handle is reported as an error.
+    """
+
+    try:
+        parsed = yaml.safe_load(yaml_string)
+    except yaml.YAMLError as e:
+        return [_error("", f"invalid YAML: {e}")]
+
+    if not isinstance(parsed, dict):
+        return [_error("", "the topology must be a YAML mapping starting with 'name:'")]
+
+    errors = []
+    if not parsed.get("name"):
+        errors.append(_error("name", "the lab has no name"))
+
+    topo = parsed.get("topology")
+    if not isinstance(topo, dict):
+        return errors + [_error("topology", "missing 'topology' block with 'nodes' and 'links'")]
+
+    mgmt = parsed.get("mgmt") or {}
+    if not isinstance(mgmt, dict):
+        errors.append(_error("mgmt", "mgmt must be a mapping (network, ipv4-subnet, ...)"))
+        mgmt = {}
+
+    try:
+        return errors + _validate_nodes(topo, mgmt) + _validate_links(topo)
+    except Exception as e:
+        return errors + [_error("topology", f"malformed topology, cannot be checked: {e}")]
+
+
+
+def format_errors(errors: List[Dict[str, str]]) -> str:
+    """
+    The errors as a list for the correction prompt
+    """
+
+    return "\n".join(f"- {error['path'] or 'document'}: {error['message']}" for error in errors)
@@ -0,0 +1,470 @@
+import os, queue, threading, logging
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence
+
+# =============================================================================
+# VECTOR STORE BACKENDS
+# =============================================================================
+
+"""
+The vector store behind `tools.db`, selected by CLAB_VECTOR_BACKEND:
+
+    chroma        embedded Chroma (PersistentClient) at CLAB_CHROMA_PATH
+    chroma-http   Chroma server at CLAB_CHROMA_HOST:CLAB_CHROMA_PORT, shared by several workers
+    faiss         in-process store searched with FAISS flat indexes, nothing on disk (tests)
+    numpy         in-process brute-force store in plain NumPy, nothing on disk (tests)
+
+Every backend hands out collections with the subset of the Chroma collection API used
+by the project (query, get, count, add, upsert, update, delete), always with explicit
+embeddings. They are thread-safe, so the async code calls them through asyncio.to_thread.
+
+No project imports here, the spider imports this module from `tools/` directly.
+"""
+
+
+logger = logging.getLogger(__name__)
+
+
+# Default location: next to the sources, whatever the working directory
+DEFAULT_CHROMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chroma_embedded")
+
+BACKEND = os.environ.get("CLAB_VECTOR_BACKEND", "chroma")
+CHROMA_PATH = os.environ.get("CLAB_CHROMA_PATH", DEFAULT_CHROMA_PATH)
+CHROMA_HOST = os.environ.get("CLAB_CHROMA_HOST", "localhost")
+CHROMA_PORT = int(os.environ.get("CLAB_CHROMA_PORT", 8000))
+POOL_SIZE = int(os.environ.get("CLAB_CHROMA_POOL_SIZE", 4))
+
+
+
+class VectorStore(ABC):
+    """
+    Named collections of (id, embedding, document, metadata) records.
+    """
+
+    @abstractmethod
+    def get_collection(self, name: str):
+        """The existing collection `name` (raises when it doesn't exist)"""
+
+    @abstractmethod
+    def get_or_create_collection(self, name: str, metadata: Optional[dict] = None):
+        """The collection `name`, created with `metadata` if needed"""
+
+    @abstractmethod
+    def delete_collection(self, name: str) -> None:
+        """Delete the collection `name` (raises when it doesn't exist)"""
+
+
+
+# -----------------------------------------------------------------------------
+# Chroma (embedded or client/server)
+# -----------------------------------------------------------------------------
+
+class ChromaCollection:
+    """
+    Thread-safe handle of a Chroma collection: every call goes through a client of the
+    store, and the writes of an embedded store are serialized (one SQLite writer).
+    """
+
+    def __init__(self, store: "ChromaStore", name: str) -> None:
+        self.store = store
+        self.name = name
+
+    def _call(self, method: str, write: bool = False, **kwargs) -> Any:
+        with self.store.client() as client:
+            with self.store.write_lock if write else _NO_LOCK:
+                try:
+                    return getattr(self.store.collection(client, self.name), method)(**kwargs)
+                except Exception as e:
+                    if not _is_not_found(e):
+                        raise
+                    # The collection was deleted and recreated (by another worker): new handle
+                    self.store.forget(client, self.name)
+                    return getattr(self.store.collection(client, self.name), method)(**kwargs)
+
+    def query(self, **kwargs) -> dict:
+        return self._call("query", **kwargs)
+
+    def get(self, **kwargs) -> dict:
+        return self._call("get", **kwargs)
+
+    def count(self) -> int:
+        return self._call("count")
+
+    def add(self, **kwargs) -> None:
+        self._call("add", write=True, **kwargs)
+
+    def upsert(self, **kwargs) -> None:
+        self._call("upsert", write=True, **kwargs)
+
+    def update(self, **kwargs) -> None:
+        self._call("update", write=True, **kwargs)
+
+    def delete(self, **kwargs) -> None:
+        self._call("delete", write=True, **kwargs)
+
+
+
+def _is_not_found(error: Exception) -> bool:
+    return type(error).__name__ in ("NotFoundError", "InvalidCollectionException") or "does not exist" in str(error)
+
+
+
+class _NoLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_LOCK = _NoLock()
+
+
+
+class ChromaStore(VectorStore):
+    """
+    Chroma clients of the process. Embedded: one thread-safe PersistentClient shared
+    by every call, the reads run concurrently and only the writes are serialized.
+    Client/server: a pool of `pool_size` HTTP clients, so that concurrent requests
+    don't queue behind one connection.
+    """
+
+    def __init__(self, path: Optional[str] = CHROMA_PATH, host: Optional[str] = None,
+                 port: int = CHROMA_PORT, pool_size: int = POOL_SIZE) -> None:
+        import chromadb
+
+        self.remote = host is not None
+        self.write_lock = _NoLock() if self.remote else threading.Lock()
+        self._pool: "queue.Queue" = queue.Queue()
+        self._shared = None
+        self._collections: Dict[tuple, Any] = {}
+        self._collections_lock = threading.Lock()
+
+        if self.remote:
+            for _ in range(max(1, pool_size)):
+                self._pool.put(chromadb.HttpClient(host=host, port=port))
+            print(f"✅ ChromaDB connected ({host}:{port}).")
+        else:
+            self._shared = chromadb.PersistentClient(path=path)
+            print("✅ ChromaDB started.")
+
+    @contextmanager
+    def client(self):
+        # The embedded client isn't borrowed: every thread uses it at the same time
+        if self._shared is not None:
+            yield self._shared
+            return
+
+        client = self._pool.get()
+        try:
+            yield client
+        finally:
+            self._pool.put(client)
+
+    def collection(self, client, name: str):
+        key = (id(client), name)
+        with self._collections_lock:
+            if key not in self._collections:
+                self._collections[key] = client.get_collection(name=name)
+            return self._collections[key]
+
+    def forget(self, client, name: Optional[str] = None) -> None:
+        with self._collections_lock:
+            for key in [k for k in self._collections if k[1] == name and (client is None or k[0] == id(client))]:
+                del self._collections[key]
+
+    def get_collection(self, name: str) -> ChromaCollection:
+        with self.client() as client:
+            self.collection(client, name)
+        return ChromaCollection(self, name)
+
+    def get_or_create_collection(self, name: str, metadata: Optional[dict] = None) -> ChromaCollection:
+        with self.client() as client, self.write_lock:
+            client.get_or_create_collection(name=name, metadata=metadata)
+        return ChromaCollection(self, name)
+
+    def delete_collection(self, name: str) -> None:
+        with self.client() as client, self.write_lock:
+            client.delete_collection(name=name)
+        self.forget(None, name)
+
+
+
+# -----------------------------------------------------------------------------
+# NumPy and FAISS (in-process, for tests)
+# -----------------------------------------------------------------------------
+
+def _matches(metadata: Optional[dict], where: Optional[dict]) -> bool:
+    """Subset of the Chroma filters: equality, $eq, $ne, $in and $and"""
+    if not where:
+        return True
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(metadata, c) for c in condition):
+                return False
+            continue
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, value in condition.items():
+            if (op == "$eq" and metadata.get(key) != value) or (op == "$ne" and metadata.get(key) == value) \
+                    or (op == "$in" and metadata.get(key) not in value):
+                return False
+    return True
+
+
+
+class NumpyCollection:
+    """
+    Brute-force collection: exact distances (squared L2, or cosine when the collection
+    metadata asks for it, like Chroma's `hnsw:space`).
+    """
+
+    def __init__(self, name: str, metadata: Optional[dict] = None) -> None:
+        self.name = name
+        self.metadata = metadata or {}
+        self._records: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _write_records(self, ids: Sequence[str], embeddings, documents, metadatas, merge: bool, create: bool) -> List[str]:
+        # Caller holds the lock; returns the IDs actually written
+        written = []
+        for i, record_id in enumerate(ids):
+            if record_id not in self._records and not create:
+                continue
+            record = dict(self._records.get(record_id, {})) if merge else {}
+            if embeddings is not None:
+                record["embedding"] = list(map(float, embeddings[i]))
+            if documents is not None:
+                record["document"] = documents[i]
+            if metadatas is not None:
+                record["metadata"] = metadatas[i]
+            record.setdefault("document", None)
+            record.setdefault("metadata", None)
+            self._records[record_id] = record
+            written.append(record_id)
+        return written
+
+    def _delete_records(self, ids, where) -> List[str]:
+        # Caller holds the lock; returns the deleted IDs
+        deleted = [r for r in self._records if (ids is None or r in ids) and _matches(self._records[r]["metadata"], where)]
+        for record_id in deleted:
+            del self._records[record_id]
+        return deleted
+
+    def _write(self, ids: Sequence[str], embeddings, documents, metadatas, merge: bool, create: bool) -> None:
+        with self._lock:
+            self._write_records(ids, embeddings, documents, metadatas, merge, create)
+
+    def add(self, ids, embeddings=None, documents=None, metadatas=None) -> None:
+        self._write(ids, embeddings, documents, metadatas, merge=False, create=True)
+
+    def upsert(self, ids, embeddings=None, documents=None, metadatas=None) -> None:
+        self._write(ids, embeddings, documents, metadatas, merge=False, create=True)
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None) -> None:
+        self._write(ids, embeddings, documents, metadatas, merge=True, create=False)
+
+    def delete(self, ids=None, where=None) -> None:
+        with self._lock:
+            self._delete_records(ids, where)
+
+    def count(self) -> int:
+        return len(self._records)
+
+    def _fields(self, records: List[tuple], include: Sequence[str]) -> Dict[str, Any]:
+        return {
+            "documents": [r["document"] for _, r in records] if "documents" in include else None,
+            "metadatas": [r["metadata"] for _, r in records] if "metadatas" in include else None,
+            "embeddings": [r["embedding"] for _, r in records] if "embeddings" in include else None,
+        }
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas")) -> dict:
+        with self._lock:
+            records = [(r, self._records[r]) for r in (ids if ids is not None else list(self._records))
+                       if r in self._records and _matches(self._records[r]["metadata"], where)]
+        return {"ids": [r for r, _ in records], **self._fields(records, include)}
+
+    def query(self, query_embeddings, n_results: int = 10, where=None,
+              include=("documents", "metadatas", "distances")) -> dict:
+        import numpy as np
+
+        with self._lock:
+            records = [(r, rec) for r, rec in self._records.items() if _matches(rec["metadata"], where)]
+
+        result = {"ids": [], "documents": [], "metadatas": [], "embeddings": [], "distances": []}
+        vectors = np.asarray([rec["embedding"] for _, rec in records], dtype=np.float32) if records else None
+
+        for query in np.asarray(query_embeddings, dtype=np.float32):
+            if not records:
+                distances = np.empty(0, dtype=np.float32)
+            elif self.metadata.get("hnsw:space") == "cosine":
+                norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query) + 1e-12
+                distances = 1 - vectors @ query / norms
+            else:
+                distances = ((vectors - query) ** 2).sum(axis=1)
+
+            order = np.argsort(distances)[:n_results]
+            ranked = [records[i] for i in order]
+            result["ids"].append([r for r, _ in ranked])
+            for field, values in self._fields(ranked, include).items():
+                result[field].append(values)
+            result["distances"].append([float(distances[i]) for i in order])
+
+        return {field: (values if field == "ids" or field in include else None) for field, values in result.items()}
+
+
+
+class FaissCollection(NumpyCollection):
+    """
+    NumpyCollection whose queries go through a FAISS flat index (exact search, same
+    distances: squared L2, or 1 - cosine with inner products of normalised vectors).
+    The records keep the documents, metadata and filters; the index maps each record
+    to an int64 label.
+    """
+
+    def __init__(self, name: str, metadata: Optional[dict] = None) -> None:
+        super().__init__(name, metadata)
+        self._cosine = self.metadata.get("hnsw:space") == "cosine"
+        self._index = None # created with the dimension of the first vectors
+        self._labels: Dict[str, int] = {}
+        self._record_ids: Dict[int, str] = {}
+
+    def _unindex(self, record_ids: Sequence[str]) -> None:
+        import numpy as np
+
+        labels = [self._labels.pop(r) for r in record_ids if r in self._labels]
+        for label in labels:
+            del self._record_ids[label]
+        if labels:
+            self._index.remove_ids(np.asarray(labels, dtype=np.int64))
+
+    def _reindex(self, record_ids: Sequence[str]) -> None:
+        import faiss
+        import numpy as np
+
+        self._unindex(record_ids)
+        record_ids = [r for r in record_ids if self._records[r].get("embedding") is not None]
+        if not record_ids:
+            return
+
+        vectors = np.asarray([self._records[r]["embedding"] for r in record_ids], dtype=np.float32)
+        if self._cosine:
+            faiss.normalize_L2(vectors)
+        if self._index is None:
+            flat = faiss.IndexFlatIP(vectors.shape[1]) if self._cosine else faiss.IndexFlatL2(vectors.shape[1])
+            self._index = faiss.IndexIDMap2(flat)
+
+        start = max(self._record_ids, default=-1) + 1
+        labels = list(range(start, start + len(record_ids)))
+        self._index.add_with_ids(vectors, np.asarray(labels, dtype=np.int64))
+        for record_id, label in zip(record_ids, labels):
+            self._labels[record_id] = label
+            self._record_ids[label] = record_id
+
+    def _write(self, ids: Sequence[str], embeddings, documents, metadatas, merge: bool, create: bool) -> None:
+        with self._lock:
+            written = self._write_records(ids, embeddings, documents, metadatas, merge, create)
+            # A merge without embeddings (metadata update) keeps the indexed vectors
+            if embeddings is not None or not merge:
+                self._reindex(written)
+
+    def delete(self, ids=None, where=None) -> None:
+        with self._lock:
+            self._unindex(self._delete_records(ids, where))
+
+    def query(self, query_embeddings, n_results: int = 10, where=None,
+              include=("documents", "metadatas", "distances")) -> dict:
+        import faiss
+        import numpy as np
+
+        result = {"ids": [], "documents": [], "metadatas": [], "embeddings": [], "distances": []}
+        queries = np.array(query_embeddings, dtype=np.float32)
+
+        with self._lock:
+            total = self._index.ntotal if self._index is not None else 0
+            scores = labels = np.empty((len(queries), 0))
+            if total:
+                if self._cosine:
+                    faiss.normalize_L2(queries)
+                # The filters are applied on the ranked labels: a filtered query ranks everything
+                scores, labels = self._index.search(queries, total if where else min(n_results, total))
+
+            for q in range(len(queries)):
+                ranked, distances = [], []
+                for score, label in zip(scores[q], labels[q]):
+                    if label < 0:
+                        continue
+                    record_id = self._record_ids[int(label)]
+                    record = self._records[record_id]
+                    if not _matches(record["metadata"], where):
+                        continue
+                    ranked.append((record_id, record))
+                    distances.append(float(1 - score) if self._cosine else float(score))
+                    if len(ranked) == n_results:
+                        break
+
+                result["ids"].append([r for r, _ in ranked])
+                for field, values in self._fields(ranked, include).items():
+                    result[field].append(values)
+                result["distances"].append(distances)
+
+        return {field: (values if field == "ids" or field in include else None) for field, values in result.items()}
+
+
+
+class NumpyStore(VectorStore):
+
+    # Collections handed out by this store
+    collection_class = NumpyCollection
+
+    def __init__(self) -> None:
+        self._collections: Dict[str, NumpyCollection] = {}
+        self._lock = threading.Lock()
+
+    def get_collection(self, name: str) -> NumpyCollection:
+        with self._lock:
+            if name not in self._collections:
+                raise ValueError(f"Collection {name} does not exist.")
+            return self._collections[name]
+
+    def get_or_create_collection(self, name: str, metadata: Optional[dict] = None) -> NumpyCollection:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = self.collection_class(name, metadata)
+            return self._collections[name]
+
+    def delete_collection(self, name: str) -> None:
+        with self._lock:
+            if name not in self._collections:
+                raise ValueError(f"Collection {name} does not exist.")
+            del self._collections[name]
+
+
+
+class FaissStore(NumpyStore):
+
+    collection_class = FaissCollection
+
+    def __init__(self) -> None:
+        import faiss # fails at startup rather than on the first write
+
+        super().__init__()
+
+
+
+def open_store(backend: str = BACKEND) -> VectorStore:
+    """
+    The vector store selected by CLAB_VECTOR_BACKEND
+    """
+
+    if backend == "chroma":
+        return ChromaStore(path=CHROMA_PATH)
+    if backend == "chroma-http":
+        return ChromaStore(host=CHROMA_HOST, port=CHROMA_PORT, pool_size=POOL_SIZE)
+    if backend == "faiss":
+        return FaissStore()
+    if backend == "numpy":
+        return NumpyStore()
+    raise ValueError(f"Unknown vector store backend: {backend}")
@@ -0,0 +1,4 @@
+import os, sys
+
+# The project modules are imported from `src` (import tools.db as db, ...)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
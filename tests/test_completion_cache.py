@@ -0,0 +1,66 @@
+import os
+import pytest
+
+completion_cache = pytest.importorskip("tools.completion_cache")
+outputs = pytest.importorskip("langchain_core.outputs")
+
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return completion_cache.CompletionCache(path=str(tmp_path / "llm_cache.sqlite3"), max_entries=2)
+
+
+
+def test_no_database_before_first_use(tmp_path):
+    path = tmp_path / "llm_cache.sqlite3"
+    cache = completion_cache.CompletionCache(path=str(path))
+    assert not path.exists()
+
+    cache.lookup("prompt", "qwen3")
+    assert path.exists()
+
+
+
+def test_default_path_is_next_to_the_sources():
+    src = os.path.dirname(os.path.dirname(os.path.abspath(completion_cache.__file__)))
+    if "CLAB_LLM_CACHE_PATH" not in os.environ:
+        assert completion_cache.CACHE_PATH == os.path.join(src, "llm_cache.sqlite3")
+
+
+
+def test_lookup_and_update(cache):
+    assert cache.lookup("prompt", "qwen3") is None
+
+    cache.update("prompt", "qwen3", [outputs.Generation(text="topology")])
+    assert [g.text for g in cache.lookup("prompt", "qwen3")] == ["topology"]
+
+    # The model and options are part of the key
+    assert cache.lookup("prompt", "qwen2.5") is None
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 2, "hit_rate": 1 / 3}
+
+
+
+def test_least_recently_used_entries_are_evicted(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(completion_cache.time, "time", lambda: now[0])
+
+    for prompt in ("a", "b"):
+        now[0] += 1
+        cache.update(prompt, "qwen3", [outputs.Generation(text=prompt)])
+    now[0] += 1
+    cache.lookup("a", "qwen3")
+    now[0] += 1
+    cache.update("c", "qwen3", [outputs.Generation(text="c")])
+
+    assert cache.lookup("b", "qwen3") is None
+    assert cache.lookup("a", "qwen3") is not None
+    assert cache.lookup("c", "qwen3") is not None
+
+
+
+def test_clear(cache):
+    cache.update("prompt", "qwen3", [outputs.Generation(text="topology")])
+    cache.clear()
+    assert cache.lookup("prompt", "qwen3") is None
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,69 @@
+import pytest
+
+correction_memory = pytest.importorskip("tools.correction_memory")
+
+
+
+@pytest.fixture(autouse=True)
+def memory(tmp_path, monkeypatch):
+    monkeypatch.setattr(correction_memory, "CACHE_PATH", str(tmp_path / "correction_memory.sqlite3"))
+    monkeypatch.setattr(correction_memory, "_conn", None)
+    yield
+    if correction_memory._conn is not None:
+        correction_memory._conn.close()
+
+
+
+BROKEN = "name: lab\ntopology:\n  nodes:\n    r1: {kind: srl}\n"
+FIXED = "name: lab\ntopology:\n  nodes:\n    r1: {kind: nokia_srlinux}\n"
+ERROR = "12:01:44 ERRO failed to create node r1: unknown kind 'srl' (container 3f2a9c81b7d04e55)\n"
+
+
+
+def test_budget_exhaustion():
+    controller = correction_memory.RetryController(max_iterations=5, budget_seconds=0)
+
+    assert controller.remaining() == 0.0
+    assert controller.stop_reason(BROKEN, ERROR) == "time budget of 0s exhausted (0s)"
+    assert controller.iterations == 0
+
+
+
+def test_remaining_budget_decreases(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(correction_memory.time, "monotonic", lambda: now[0])
+    controller = correction_memory.RetryController(budget_seconds=60)
+
+    now[0] += 45
+    assert controller.remaining() == 15.0
+    assert controller.stop_reason(BROKEN, ERROR) is None
+    now[0] += 30
+    assert controller.remaining() == 0.0
+    assert controller.stop_reason(FIXED, ERROR) == "time budget of 60s exhausted (75s)"
+
+
+
+def test_iterations_and_cycles():
+    controller = correction_memory.RetryController(max_iterations=1, budget_seconds=600)
+
+    assert controller.stop_reason(BROKEN, ERROR) is None
+    assert controller.stop_reason(BROKEN, ERROR) == "the same topology failed with the same error again (cycle)"
+    assert controller.stop_reason(FIXED, ERROR) == "1 corrections without a successful deployment"
+
+
+
+def test_known_fix_is_reused():
+    assert correction_memory.known_fix(BROKEN, ERROR) is None
+    correction_memory.remember_fix([(BROKEN, ERROR)], FIXED)
+
+    # Another run: other timestamps and IDs, the same YAML written differently
+    other_error = "\x1b[31m09:15:02 ERRO failed to create node r1: unknown kind 'srl' (container 0badc0ffee123456)\x1b[0m\n"
+    reformatted = "# generated\nname: lab\ntopology:\n  nodes:\n    r1:\n      kind: srl\n"
+    assert correction_memory.known_fix(reformatted, other_error) == FIXED
+
+    # Neither another topology nor another error
+    assert correction_memory.known_fix(FIXED, ERROR) is None
+    assert correction_memory.known_fix(BROKEN, "ERRO image not found: alpine\n") is None
+
+    correction_memory.forget_fix(BROKEN, ERROR)
+    assert correction_memory.known_fix(BROKEN, ERROR) is None
@@ -0,0 +1,51 @@
+import pytest
+
+crawl_manifest = pytest.importorskip("tools.crawl_manifest")
+
+
+
+MANIFEST = {
+    "https://containerlab.dev/manual/nodes/": {"etag": "\"n1\"", "hash": "h1", "chunk_ids": ["n0", "n1"]},
+    "https://containerlab.dev/manual/links/": {"last_modified": "Mon, 06 Oct 2025 10:00:00 GMT", "hash": "h2", "chunk_ids": ["l0"]},
+    "https://containerlab.dev/manual/old/": {"hash": "h3", "chunk_ids": ["o0", "o1"]},
+}
+
+
+
+def test_changed_and_removed_pages():
+    nodes, links, old = list(MANIFEST)
+    new = "https://containerlab.dev/manual/kinds/"
+
+    # This crawl: nodes changed, links unchanged, old no longer linked, kinds is new
+    pages = {nodes: {"hash": "h1b", "chunk_ids": ["n0b"]}, links: dict(MANIFEST[links]), new: {"hash": "h4", "chunk_ids": ["k0"]}}
+    removed = crawl_manifest.removed_urls(MANIFEST, [nodes, links, new])
+    assert removed == {old}
+
+    assert crawl_manifest.chunk_ids(MANIFEST, [nodes] + sorted(removed)) == ["n0", "n1", "o0", "o1"]
+    assert crawl_manifest.chunk_ids(MANIFEST, [new]) == []
+
+    merged = crawl_manifest.merge(MANIFEST, pages, removed)
+    assert merged == {nodes: pages[nodes], links: MANIFEST[links], new: pages[new]}
+    # Pages not crawled this time (interrupted crawl) are kept
+    assert crawl_manifest.merge(MANIFEST, {}, set()) == MANIFEST
+
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "crawl_manifest.json")
+    assert crawl_manifest.load(path) == {}
+
+    crawl_manifest.save(MANIFEST, path)
+    assert crawl_manifest.load(path) == MANIFEST
+
+    (tmp_path / "crawl_manifest.json").write_text("{truncated", encoding="utf-8")
+    assert crawl_manifest.load(path) == {}
+
+
+
+def test_conditional_headers():
+    nodes, links, old = list(MANIFEST)
+    assert crawl_manifest.conditional_headers(MANIFEST[nodes]) == {"If-None-Match": "\"n1\""}
+    assert crawl_manifest.conditional_headers(MANIFEST[links]) == {"If-Modified-Since": "Mon, 06 Oct 2025 10:00:00 GMT"}
+    assert crawl_manifest.conditional_headers({}) == {}
+    assert crawl_manifest.page_hash("page") == crawl_manifest.page_hash("page") != crawl_manifest.page_hash("page 2")
@@ -0,0 +1,92 @@
+import os
+import pytest
+
+# In-memory vector store: no Chroma needed to import tools.db
+os.environ.setdefault("CLAB_VECTOR_BACKEND", "numpy")
+db = pytest.importorskip("tools.db")
+
+
+
+class FakeCollection:
+    """Collection holding the chunks that no query retrieved by vector"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.requested = []
+
+    def get(self, ids, include):
+        self.requested.extend(ids)
+        return {"ids": list(ids),
+                "documents": [self.chunks[i] for i in ids],
+                "metadatas": [{"id": i} for i in ids],
+                "embeddings": [[0.0] for _ in ids]}
+
+
+
+def two_query_result():
+    return {
+        "ids": [["A", "B"], ["C", "D"]],
+        "documents": [["doc A", "doc B"], ["doc C", "doc D"]],
+        "metadatas": [[{"id": "A"}, {"id": "B"}], [{"id": "C"}, {"id": "D"}]],
+        "distances": [[0.1, 0.2], [0.1, 0.3]],
+        "embeddings": [[[1.0], [2.0]], [[3.0], [4.0]]],
+    }
+
+
+
+def test_keyword_hit_retrieved_by_another_query_is_kept():
+    # Query 0's only keyword hit (C) is a vector hit of query 1, not of query 0
+    collection = FakeCollection({})
+    blended = db.blend_keyword(collection, two_query_result(), [[("C", 12.5)], []], n_results=3)
+
+    assert "C" in blended["ids"][0]
+    position = blended["ids"][0].index("C")
+    assert blended["documents"][0][position] == "doc C"
+    assert blended["embeddings"][0][position] == [3.0]
+    assert blended["distances"][0][position] is None  # not a vector hit of query 0
+    assert collection.requested == []  # already known, nothing fetched
+
+
+
+def test_keyword_only_hit_is_fetched_once():
+    collection = FakeCollection({"E": "doc E"})
+    blended = db.blend_keyword(collection, two_query_result(), [[("E", 3.0)], [("E", 1.0)]], n_results=3)
+
+    assert collection.requested == ["E"]
+    assert "E" in blended["ids"][0] and "E" in blended["ids"][1]
+    assert blended["documents"][1][blended["ids"][1].index("E")] == "doc E"
+
+
+
+def test_rrf_fusion_orders_by_summed_reciprocal_ranks():
+    result = {
+        "ids": [["A", "B", "C"], ["B", "D", "A"]],
+        "documents": [["doc A", "doc B", "doc C"], ["doc B", "doc D", "doc A"]],
+        "distances": [[0.1, 0.2, 0.3], [0.15, 0.25, 0.35]],
+    }
+    fused = db.fuse_ranked(result, k=60)
+
+    # B: 1/62 + 1/61, A: 1/61 + 1/63, C: 1/63, D: 1/62
+    assert fused["ids"] == [["B", "A", "D", "C"]]
+    assert fused["scores"][0] == pytest.approx([1/62 + 1/61, 1/61 + 1/63, 1/62, 1/63])
+    # Fields follow the first list where each chunk appeared
+    assert fused["documents"] == [["doc B", "doc A", "doc D", "doc C"]]
+    assert fused["distances"] == [[0.2, 0.1, 0.25, 0.3]]
+    assert "embeddings" not in fused
+
+    assert db.fuse_ranked(result, k=60, n_results=2)["ids"] == [["B", "A"]]
+    assert db.fuse_ranked({"ids": []})["ids"] == [[]]
+
+
+
+def test_adaptive_depth_cuts_at_the_first_large_gap():
+    # Spread 1.0: the 0.5 drop after the 4th result is the first gap >= 0.3
+    assert db.adaptive_depth([1.0, 0.95, 0.9, 0.85, 0.35, 0.3, 0.0], min_results=3, gap=0.3) == 4
+
+    # The gap before min_results doesn't count
+    assert db.adaptive_depth([1.0, 0.2, 0.15, 0.1, 0.05, 0.0], min_results=3, gap=0.3) == 6
+
+    # No large gap, flat scores, or fewer results than min_results: everything is kept
+    assert db.adaptive_depth([1.0, 0.9, 0.8, 0.7, 0.6], min_results=3, gap=0.3) == 5
+    assert db.adaptive_depth([0.5, 0.5, 0.5, 0.5], min_results=3, gap=0.3) == 4
+    assert db.adaptive_depth([1.0, 0.0], min_results=3, gap=0.3) == 2
@@ -0,0 +1,92 @@
+import os
+import numpy as np
+import pytest
+
+embedding_cache = pytest.importorskip("tools.embedding_cache")
+from langchain_core.embeddings import Embeddings
+
+
+
+class CountingEmbeddings(Embeddings):
+    """Deterministic 3-d vectors, counting the texts and calls that reach the model"""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), float(text.count("a")), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+
+@pytest.fixture
+def base():
+    return CountingEmbeddings()
+
+
+
+def cache(base, tmp_path, batch_size=2):
+    return embedding_cache.EmbeddingCache(base, "sentence-transformers/all-MiniLM-L6-v2", path=str(tmp_path), batch_size=batch_size)
+
+
+
+def test_texts_are_embedded_once_in_batches(base, tmp_path):
+    embeddings = cache(base, tmp_path)
+
+    vectors = embeddings.embed_documents(["a", "bb", "a", "ccc", "dddd"])
+    assert vectors == [[1.0, 1.0, 1.0], [2.0, 0.0, 1.0], [1.0, 1.0, 1.0], [3.0, 0.0, 1.0], [4.0, 0.0, 1.0]]
+    assert base.calls == [["a", "bb"], ["ccc", "dddd"]]
+
+    assert embeddings.embed_documents(["bb", "eeeee"]) == [[2.0, 0.0, 1.0], [5.0, 0.0, 1.0]]
+    assert base.calls[2:] == [["eeeee"]]
+    assert embeddings.embed_query("a") == [1.0, 1.0, 1.0]
+    assert embeddings.stats() == {"entries": 5, "hits": 3, "misses": 5}
+
+
+
+def test_vectors_persist_across_instances(base, tmp_path):
+    cache(base, tmp_path).embed_documents(["a", "bb"])
+
+    other = CountingEmbeddings()
+    assert cache(other, tmp_path).embed_documents(["bb", "a"]) == [[2.0, 0.0, 1.0], [1.0, 1.0, 1.0]]
+    assert other.calls == []
+    assert cache(other, tmp_path).embed_documents([]) == []
+
+
+
+def test_interrupted_append_is_truncated_on_load(base, tmp_path):
+    embeddings = cache(base, tmp_path)
+    embeddings.embed_documents(["a", "bb", "ccc"])
+
+    # A crash between the vectors and the keys: half a vector and a key without vector
+    with open(embeddings._vectors_path, "ab") as file:
+        file.write(np.zeros(2, dtype=np.float32).tobytes())
+    with open(embeddings._keys_path, "a", encoding="utf-8") as file:
+        file.write(embedding_cache.EmbeddingCache.key("dddd") + "\n")
+
+    recovered = cache(base, tmp_path)
+    assert recovered.stats()["entries"] == 3
+    assert os.path.getsize(recovered._vectors_path) == 3 * 3 * 4
+    with open(recovered._keys_path, encoding="utf-8") as file:
+        assert len(file.read().split()) == 3
+
+    # The lost text is embedded again, the others are still served from disk
+    base.calls.clear()
+    assert recovered.embed_documents(["dddd", "ccc"]) == [[4.0, 0.0, 1.0], [3.0, 0.0, 1.0]]
+    assert base.calls == [["dddd"]]
+    assert cache(CountingEmbeddings(), tmp_path).stats()["entries"] == 4
+
+
+
+def test_keys_missing_their_vectors_are_dropped(base, tmp_path):
+    embeddings = cache(base, tmp_path)
+    embeddings.embed_documents(["a", "bb"])
+    os.remove(embeddings._vectors_path)
+
+    recovered = cache(base, tmp_path)
+    assert recovered.stats()["entries"] == 0
+    assert recovered.embed_documents(["a"]) == [[1.0, 1.0, 1.0]]
+    assert base.calls[-1] == ["a"]
@@ -0,0 +1,99 @@
+import json
+import pytest
+
+images = pytest.importorskip("tools.images")
+
+
+
+class FakeImage:
+    id = "sha256:0123"
+    attrs = {"RepoDigests": ["alpine@sha256:abcd"]}
+
+
+
+@pytest.fixture
+def provisioner(tmp_path):
+    provisioner = images.ImageProvisioner(index_path=str(tmp_path / "image_index.json"), workers=1)
+    provisioner._remember("alpine:latest", FakeImage())
+    provisioner._remember("ghcr.io/nokia/srlinux:24.3", FakeImage())
+    return provisioner
+
+
+
+def test_missing_image_error_forgets_the_named_image(provisioner):
+    error = "Error: failed to create container: No such image: alpine:latest"
+
+    assert provisioner.forget_missing(error, ["alpine:latest", "ghcr.io/nokia/srlinux:24.3"]) == ["alpine:latest"]
+    assert not provisioner.indexed("alpine:latest")
+    assert provisioner.indexed("ghcr.io/nokia/srlinux:24.3")
+
+    # The index on disk is updated too
+    with open(provisioner.index_path, encoding="utf-8") as file:
+        assert list(json.load(file)) == ["ghcr.io/nokia/srlinux:24.3"]
+
+
+
+def test_unnamed_missing_image_forgets_every_image(provisioner):
+    topology = ["alpine:latest", "ghcr.io/nokia/srlinux:24.3"]
+
+    assert provisioner.forget_missing("Error: manifest unknown", topology) == topology
+    assert not any(provisioner.indexed(image) for image in topology)
+
+
+
+def test_other_deploy_errors_keep_the_index(provisioner):
+    assert provisioner.forget_missing("Error: node r1: link endpoint eth0 is reserved", ["alpine:latest"]) == []
+    assert provisioner.forget_missing(None, ["alpine:latest"]) == []
+    assert provisioner.indexed("alpine:latest")
+
+
+
+def test_abandoned_prefetches_are_cancelled_or_drained(tmp_path, monkeypatch):
+    import threading
+
+    provisioner = images.ImageProvisioner(index_path=str(tmp_path / "image_index.json"), workers=1)
+    started, release = threading.Event(), threading.Event()
+
+    def provision(image):
+        started.set()
+        release.wait(5)
+        return "pulled"
+
+    monkeypatch.setattr(provisioner, "_provision", provision)
+
+    prefetch = images.ImagePrefetchCallback(provisioner)
+    prefetch.on_llm_new_token("  nodes:\n    a:\n      image: alpine:latest\n    b:\n      image: busybox:1.36\n")
+    running, queued = prefetch.futures["alpine:latest"], prefetch.futures["busybox:1.36"]
+    assert started.wait(5)
+
+    # The stream is abandoned: the queued pull never starts, the running one is drained
+    prefetch.cancel()
+    assert queued.cancelled()
+    assert "busybox:1.36" not in provisioner._futures
+    assert "alpine:latest" in provisioner._futures
+
+    release.set()
+    running.result(5)
+    assert provisioner._futures == {}
+
+
+
+def test_images_of_malformed_topologies():
+    yaml_string = (
+        "name: lab\n"
+        "topology:\n"
+        "  kinds: {linux: {image: alpine:3.19}}\n"
+        "  groups: {spine: [linux]}\n"
+        "  defaults: {kind: linux}\n"
+        "  nodes:\n"
+        "    r1:\n"
+        "      group: [spine]\n"
+        "    r2:\n"
+        "      kind: [linux]\n"
+        "      image: busybox:1.36\n"
+        "    r3:\n"
+        "      group: spine\n"
+        "    r4: linux\n"
+    )
+    assert images.images_from_yaml(yaml_string) == ["alpine:3.19", "busybox:1.36"]
+    assert images.topology_images({"topology": {"nodes": ["r1"], "groups": "spine"}}) == []
@@ -0,0 +1,77 @@
+import os
+import pytest
+
+os.environ.setdefault("CLAB_VECTOR_BACKEND", "numpy")
+keyword_index = pytest.importorskip("tools.keyword_index")
+db = pytest.importorskip("tools.db")
+vector_store = pytest.importorskip("tools.vector_store")
+embeddings = pytest.importorskip("langchain_core.embeddings")
+from langchain_core.documents import Document
+
+
+
+class FakeEmbeddings(embeddings.Embeddings):
+    def embed_documents(self, texts):
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "keyword_index.json.gz")
+
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    assert keyword_index.tokenize("The kind is nokia_srlinux") == ["kind", "nokia_srlinux", "nokia", "srlinux"]
+    assert keyword_index.tokenize("Set mgmt-ipv4 to 172.20.20.2/24.") == [
+        "set", "mgmt-ipv4", "mgmt", "ipv4", "172.20.20.2/24", "172", "20", "20", "2", "24"]
+    assert keyword_index.tokenize("What is a link?") == ["link"]
+    assert keyword_index.tokenize("") == []
+
+
+
+def test_search_on_an_empty_index(path):
+    assert keyword_index.search(["srlinux"], path=path) == [[]]
+
+    keyword_index.build([], [], path=path)
+    assert keyword_index.search(["srlinux", "ceos"], path=path) == [[], []]
+
+
+
+def test_search_ranks_by_bm25(path):
+    keyword_index.build(["srl", "ceos", "both"], [
+        "nokia_srlinux node with startup-config",
+        "arista_ceos node",
+        "srlinux and ceos nodes in one lab, srlinux first",
+    ], path=path)
+
+    hits = keyword_index.search(["srlinux", "startup-config", "juniper"], n_results=5, path=path)
+    assert [chunk_id for chunk_id, _ in hits[0]] == ["both", "srl"]
+    assert [chunk_id for chunk_id, _ in hits[1]] == ["srl"]
+    assert hits[2] == []
+    assert all(score > 0 for _, score in hits[0])
+
+
+
+def test_index_is_rebuilt_after_update_scrapy(path, monkeypatch):
+    monkeypatch.setattr(db, "store", vector_store.NumpyStore())
+
+    db.add_scrapy([Document(page_content="nokia_srlinux kind", metadata={"url": "a"}),
+                   Document(page_content="arista_ceos kind", metadata={"url": "b"})],
+                  FakeEmbeddings(), ["a0", "b0"])
+    stored = db.get_scrapy()
+    keyword_index.build(stored["ids"], stored["documents"], path=path)
+    assert [chunk_id for chunk_id, _ in keyword_index.search(["ceos"], path=path)[0]] == ["b0"]
+
+    # Page b changed (new content), page a disappeared
+    db.update_scrapy([Document(page_content="cisco_xrd kind", metadata={"url": "b"})], FakeEmbeddings(), ["b1"], ["a0", "b0"])
+    stored = db.get_scrapy()
+    keyword_index.build(stored["ids"], stored["documents"], path=path)
+
+    assert sorted(stored["ids"]) == ["b1"]
+    assert keyword_index.search(["ceos", "srlinux"], path=path) == [[], []]
+    assert [chunk_id for chunk_id, _ in keyword_index.search(["xrd"], path=path)[0]] == ["b1"]
@@ -0,0 +1,28 @@
+import pytest
+
+models = pytest.importorskip("tools.models")
+
+
+
+def test_unknown_cross_encoder_backend_is_rejected():
+    with pytest.raises(ValueError, match="Unknown CrossEncoder backend 'onnx-fp8'"):
+        models.resolve_cross_encoder_backend("onnx-fp8")
+
+
+
+def test_torch_backend_is_kept():
+    assert models.resolve_cross_encoder_backend("torch") == "torch"
+
+
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx-int8"])
+def test_onnx_backend_without_optimum_falls_back_to_torch(monkeypatch, backend):
+    monkeypatch.setattr(models.importlib.util, "find_spec", lambda name: None)
+    assert models.resolve_cross_encoder_backend(backend) == "torch"
+
+
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx-int8"])
+def test_onnx_backend_with_optimum_is_kept(monkeypatch, backend):
+    monkeypatch.setattr(models.importlib.util, "find_spec", lambda name: object())
+    assert models.resolve_cross_encoder_backend(backend) == backend
@@ -0,0 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+pytest.importorskip("parsel")
+page_extract = pytest.importorskip("tools.page_extract")
+
+
+
+PAGE = """
+<html><body>
+<nav><a href="/manual/nodes/">Nodes</a><a href="https://containerlab.dev/manual/links/">Links</a></nav>
+<article>
+  <h1>Links</h1>
+  <p class="intro">Links connect <code>node:ethN</code>   endpoints, see <a href="/manual/nodes/">nodes</a>.</p>
+  <div class="highlight"><pre><code class="md-code__content"><span><span>name: </span><span>lab</span></span><span><span>topology:</span></span></code></pre></div>
+  <h2>Empty block</h2>
+  <div><code class="md-code__content"></code></div>
+</article>
+</body></html>
+"""
+
+EXPECTED = (
+    "url: https://containerlab.dev/manual/links/\n"
+    "# Links\n\n"
+    "Links connect node:ethN endpoints, see nodes.\n\n"
+    "\nCode (YAML ou SQL ou CLI)\n\nname: lab\ntopology:\n\n"
+    "## Empty block\n\n"
+)
+
+
+
+def test_extract_page():
+    content, links = page_extract.extract_page("https://containerlab.dev/manual/links/", PAGE)
+
+    assert content == EXPECTED
+    assert links == ["/manual/nodes/", "https://containerlab.dev/manual/links/"]
+
+
+
+def test_extract_pages_with_and_without_a_pool():
+    pages = [("https://containerlab.dev/manual/links/", PAGE), ("https://containerlab.dev/empty/", "<html></html>")]
+    expected = [(EXPECTED, ["/manual/nodes/", "https://containerlab.dev/manual/links/"]),
+                ("url: https://containerlab.dev/empty/\n", [])]
+
+    assert page_extract.extract_pages(pages) == expected
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        assert page_extract.extract_pages(pages, pool) == expected
+        assert page_extract.extract_pages([], pool) == []
@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+
+registry_module = pytest.importorskip("tools.registry")
+
+
+
+class Model:
+    def __init__(self, name):
+        self.name = name
+
+
+
+@pytest.fixture
+def registry():
+    registry = registry_module.ModelRegistry(memory_budget_mb=100)
+    registry.evicted = []
+    registry.built = []
+
+    def factory(name):
+        registry.built.append(name)
+        return Model(name)
+
+    for name in ("a", "b", "c"):
+        registry.register(name, lambda name=name: factory(name), size_mb=50,
+                          on_evict=lambda model: registry.evicted.append(model.name))
+    return registry
+
+
+
+def loaded(registry):
+    return {key for key, model in registry.stats()["models"].items() if model["loaded"]}
+
+
+
+def test_models_are_built_once_and_kept_warm(registry):
+    with registry.use("a") as first:
+        pass
+    with registry.use("a") as second:
+        assert second is first
+
+    assert registry.built == ["a"]
+    assert registry.stats()["models"]["a"] == {"loaded": True, "refcount": 0, "size_mb": 50}
+
+
+
+def test_least_recently_used_idle_model_is_evicted(registry):
+    with registry.use("a"), registry.use("b"):
+        pass
+    # "a" is used again: "b" becomes the least recently used
+    with registry.use("a"):
+        pass
+
+    with registry.use("c"):
+        assert registry.evicted == ["b"]
+        assert loaded(registry) == {"a", "c"}
+    assert registry.loaded_mb() == 100
+
+
+
+def test_model_in_use_is_not_evicted(registry):
+    a = registry.acquire("a")
+    with registry.use("b"):
+        pass
+
+    # "a" is the least recently used but still referenced: "b" goes instead
+    with registry.use("c"):
+        assert registry.evicted == ["b"]
+
+        # Over budget while everything is in use: nothing is evicted
+        with registry.use("b"):
+            assert loaded(registry) == {"a", "b", "c"}
+            assert registry.evicted == ["b"]
+
+    # Released over budget: the idle "b" goes, the referenced "a" stays warm
+    assert registry.evicted == ["b", "b"]
+    assert loaded(registry) == {"a", "c"}
+
+    registry.release("a")
+    assert registry.stats()["models"]["a"]["refcount"] == 0
+    assert a.name == "a"
+
+
+
+def test_failed_build_releases_the_reference(registry):
+    registry.register("broken", lambda: 1 / 0, size_mb=10)
+    with pytest.raises(ZeroDivisionError):
+        registry.acquire("broken")
+    assert registry.stats()["models"]["broken"] == {"loaded": False, "refcount": 0, "size_mb": 10}
+
+    with pytest.raises(KeyError):
+        registry.acquire("unknown")
+
+
+
+def test_async_use(registry):
+    async def borrow():
+        async with registry.ause("a") as model:
+            return model, registry.stats()["models"]["a"]["refcount"]
+
+    model, refcount = asyncio.run(borrow())
+    assert (model.name, refcount) == ("a", 1)
+    assert registry.stats()["models"]["a"]["refcount"] == 0
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+rerank = pytest.importorskip("tools.rerank")
+
+
+
+def test_prefilter_keeps_the_candidates_close_to_the_best():
+    tasks = [[1.0, 0.0]]
+    # Cosines to the task: 1.0, 0.0, 0.95, 0.8, 0.6
+    chunks = [[2.0, 0.0], [0.0, 1.0], [0.95, 0.312], [0.8, 0.6], [0.6, 0.8]]
+
+    assert rerank.prefilter(tasks, chunks, margin=0.1, min_keep=1) == [0, 2]
+    assert rerank.prefilter(tasks, chunks, margin=0.25, min_keep=1) == [0, 2, 3]
+
+
+
+def test_prefilter_keeps_at_least_min_keep_best_first():
+    tasks = [[1.0, 0.0], [0.0, 1.0]]
+    chunks = [[0.6, 0.8], [1.0, 0.0], [0.8, 0.6], [0.7, 0.7]]
+
+    # Best cosine to any task: 0.8, 1.0, 0.8, 0.707
+    assert rerank.prefilter(tasks, chunks, margin=0.0, min_keep=3)[:1] == [1]
+    assert sorted(rerank.prefilter(tasks, chunks, margin=0.0, min_keep=3)) == [0, 1, 2]
+    assert rerank.prefilter(tasks, [], margin=0.0, min_keep=3) == []
+
+
+
+def test_prefilter_leaves_the_embeddings_untouched():
+    tasks = np.array([[3.0, 4.0]], dtype=np.float32)
+    chunks = np.array([[6.0, 8.0], [1.0, 0.0]], dtype=np.float32)
+    rerank.prefilter(tasks, chunks, margin=0.0, min_keep=1)
+
+    assert tasks.tolist() == [[3.0, 4.0]]
+    assert chunks.tolist() == [[6.0, 8.0], [1.0, 0.0]]
+
+
+
+def test_top_k_stops_when_a_stage_keeps_the_top(monkeypatch):
+    reranker = rerank.Reranker(backend="torch", workers=0)
+    scores = {"d1": 5.0, "d2": 4.0, "d3": 1.0, "d4": 0.5, "d5": 9.0}
+    calls = []
+
+    def score(pairs):
+        calls.append(len(pairs))
+        return [scores[doc] for _, doc in pairs]
+
+    monkeypatch.setattr(reranker, "score", score)
+
+    top, scored = reranker.top_k(["task"], ["d1", "d2", "d3", "d4", "d5"], k=2, stage=2)
+
+    # Stage 1 (d1, d2) fills the top-2, stage 2 (d3, d4) doesn't change it: d5 is never scored
+    assert top == ["d1", "d2"]
+    assert scored == 4
+    assert calls == [2, 2]
+    assert reranker.stats()["early_exits"] == 1
+
+
+
+def test_top_k_keeps_the_best_score_over_the_tasks(monkeypatch):
+    reranker = rerank.Reranker(backend="torch", workers=0)
+    scores = {("t1", "d1"): 1.0, ("t2", "d1"): 3.0, ("t1", "d2"): 2.0, ("t2", "d2"): 0.0}
+    monkeypatch.setattr(reranker, "score", lambda pairs: [scores[tuple(pair)] for pair in pairs])
+
+    top, scored = reranker.top_k(["t1", "t2"], ["d1", "d2"], k=2, stage=4)
+    assert (top, scored) == (["d1", "d2"], 2)
+    assert reranker.top_k([], ["d1"], k=2) == ([], 0)
@@ -0,0 +1,44 @@
+import pytest
+
+summary_cache = pytest.importorskip("tools.summary_cache")
+
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(summary_cache, "CACHE_PATH", str(tmp_path / "summary_cache.sqlite3"))
+    monkeypatch.setattr(summary_cache, "_conn", None)
+    yield
+    if summary_cache._conn is not None:
+        summary_cache._conn.close()
+
+
+
+SUMMARY = {"title": "Links", "summary": "Links connect two endpoints", "codeblocks": []}
+
+
+
+def test_summary_is_served_for_the_same_content():
+    summary_cache.put({"c1": SUMMARY}, {"c1": "links: - endpoints"})
+
+    assert summary_cache.get({"c1": "links: - endpoints"}) == {"c1": SUMMARY}
+    assert summary_cache.get({"c2": "links: - endpoints"}) == {}
+    assert summary_cache.get({}) == {}
+
+
+
+def test_new_content_is_a_miss_and_drops_the_entry():
+    summary_cache.put({"c1": SUMMARY}, {"c1": "links: - endpoints"})
+
+    assert summary_cache.get({"c1": "links: - endpoints (updated)"}) == {}
+    # The stale entry is gone, even for the old content
+    assert summary_cache.get({"c1": "links: - endpoints"}) == {}
+
+
+
+def test_invalidate_only_the_rescraped_chunks_with_a_new_content():
+    summary_cache.put({"c1": SUMMARY, "c2": SUMMARY, "c3": SUMMARY}, {"c1": "one", "c2": "two", "c3": "three"})
+
+    assert summary_cache.invalidate(["c1", "c2", "c4"], ["one", "two (updated)", "four"]) == 1
+    assert summary_cache.get({"c1": "one", "c2": "two", "c3": "three"}) == {"c1": SUMMARY, "c3": SUMMARY}
+    assert summary_cache.invalidate([], []) == 0
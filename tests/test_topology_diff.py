@@ -0,0 +1,53 @@
+import pytest
+
+topology_diff = pytest.importorskip("tools.topology_diff")
+
+
+
+def lab(r2):
+    return {
+        "name": "lab",
+        "topology": {
+            "groups": {"spine": {"kind": "linux", "image": "alpine:3.19"}},
+            "nodes": {"r1": {"group": "spine"}, "r2": r2},
+            "links": [{"endpoints": ["r1:eth1", "r2:eth1"]}],
+        },
+    }
+
+
+
+def test_effective_nodes_apply_the_group():
+    nodes = topology_diff.effective_nodes(lab({"kind": "linux"}))
+    assert nodes["r1"] == {"group": "spine", "kind": "linux", "image": "alpine:3.19"}
+
+
+
+def test_non_string_group_is_ignored():
+    old = lab({"kind": "linux"})
+    new = lab({"kind": ["linux"], "group": ["spine"]})
+
+    nodes = topology_diff.effective_nodes(new)
+    assert nodes["r2"] == {"kind": ["linux"], "group": ["spine"]}
+
+    diff = topology_diff.diff_topologies(old, new)
+    assert diff["full"] is None
+    assert diff["changed"] == ["r2"]
+    assert diff["recreate"] == ["r2"]
+
+
+
+def test_malformed_blocks_are_empty():
+    parsed = {"name": "lab", "topology": {"groups": ["spine"], "kinds": "linux", "defaults": 1, "nodes": {"r1": "linux"}}}
+    assert topology_diff.effective_nodes(parsed) == {"r1": {"kind": None}}
+    assert topology_diff.diff_topologies(parsed, None) == {"full": "the topology isn't a mapping"}
+
+
+
+def test_namespace_lab():
+    yaml_string = "# lab\nname: \"lab\"  # generated\ntopology:\n  nodes:\n    name: {kind: linux}\n"
+
+    namespaced = topology_diff.namespace_lab(yaml_string, "s3ss-ID_1")
+    assert namespaced == "# lab\nname: lab-s3ss-ID_1  # generated\ntopology:\n  nodes:\n    name: {kind: linux}\n"
+    assert topology_diff.namespace_lab(namespaced, "s3ss-ID_1") == namespaced
+    assert topology_diff.namespace_lab(yaml_string, None) == yaml_string
+    assert topology_diff.namespace_lab("topology: {}\n", "s3ss") == "topology: {}\n"
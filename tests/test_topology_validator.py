@@ -0,0 +1,148 @@
+import pytest
+
+topology_validator = pytest.importorskip("tools.topology_validator")
+
+
+
+def paths(errors):
+    return {error["path"] for error in errors}
+
+
+
+def test_scalar_node_referenced_by_a_link():
+    errors = topology_validator.validate_topology(
+        "name: lab\n"
+        "topology:\n"
+        "  nodes:\n"
+        "    r1: linux\n"
+        "    r2:\n"
+        "      kind: linux\n"
+        "  links:\n"
+        "    - endpoints: [\"r1:eth1\", \"r2:eth1\"]\n"
+    )
+
+    assert "topology.nodes.r1" in paths(errors)
+    assert {"path": "topology.links[0].endpoints[0]", "message": "node 'r1' is not a mapping of attributes"} in errors
+
+
+
+@pytest.mark.parametrize("groups, defaults", [
+    ("[spine, leaf]", "linux"),
+    ("spine", "[linux]"),
+    ("{spine: linux}", "{kind: linux}"),
+])
+def test_malformed_groups_and_defaults(groups, defaults):
+    errors = topology_validator.validate_topology(
+        "name: lab\n"
+        "topology:\n"
+        f"  groups: {groups}\n"
+        f"  defaults: {defaults}\n"
+        "  kinds: [linux]\n"
+        "  nodes:\n"
+        "    r1:\n"
+        "      group: spine\n"
+        "    r2:\n"
+        "      kind: [linux]\n"
+        "      group: [spine]\n"
+        "  links:\n"
+        "    - endpoints: [\"r1:eth1\", \"r2:eth1\"]\n"
+    )
+
+    assert errors
+    assert "topology.kinds" in paths(errors)
+    assert "topology.nodes.r2.kind" in paths(errors)
+    assert ("topology.groups" in paths(errors)) == (not groups.startswith("{"))
+    assert ("topology.defaults" in paths(errors)) == (not defaults.startswith("{"))
+
+
+
+def test_node_group_must_name_a_defined_group():
+    errors = topology_validator.validate_topology(
+        "name: lab\n"
+        "topology:\n"
+        "  groups:\n"
+        "    spine: {kind: linux}\n"
+        "  nodes:\n"
+        "    r1: {group: spine}\n"
+        "    r2: {kind: linux, group: [spine]}\n"
+        "    r3: {kind: linux, group: leaf}\n"
+    )
+
+    assert errors == [
+        {"path": "topology.nodes.r2.group", "message": "the group must be the name of one of topology.groups"},
+        {"path": "topology.nodes.r3.group", "message": "group 'leaf' is not defined in topology.groups"},
+    ]
+
+
+
+def topology(nodes, links="", mgmt=""):
+    return f"name: lab\n{mgmt}topology:\n  nodes:\n{nodes}  links:\n{links or '    []'}\n"
+
+
+
+def test_valid_topology_has_no_errors():
+    errors = topology_validator.validate_topology(topology(
+        "    r1: {kind: nokia_srlinux, mgmt-ipv4: 172.20.20.11}\n"
+        "    r2: {kind: linux, mgmt-ipv4: 172.20.20.12}\n",
+        "    - endpoints: [\"r1:e1-1\", \"r2:eth1\"]\n",
+    ))
+    assert errors == []
+
+
+
+def test_unknown_kind():
+    errors = topology_validator.validate_topology(topology("    r1: {kind: cisco_ios}\n"))
+    assert errors == [{"path": "topology.nodes.r1.kind", "message": "unknown kind 'cisco_ios'"}]
+
+
+
+def test_endpoint_format():
+    errors = topology_validator.validate_topology(topology(
+        "    r1: {kind: linux}\n    r2: {kind: linux}\n",
+        "    - endpoints: [\"r1-eth1\", \"r2:eth1\"]\n",
+    ))
+    assert errors == [{"path": "topology.links[0].endpoints[0]", "message": "'r1-eth1' is not of the form \"node:ethN\""}]
+
+
+
+def test_eth0_data_link():
+    errors = topology_validator.validate_topology(topology(
+        "    r1: {kind: linux}\n    r2: {kind: linux}\n",
+        "    - endpoints: [\"r1:eth0\", \"r2:eth1\"]\n",
+    ))
+    assert errors == [{"path": "topology.links[0].endpoints[0]", "message": "'r1:eth0' is the management interface, data links start at eth1"}]
+
+
+
+def test_duplicate_interface():
+    errors = topology_validator.validate_topology(topology(
+        "    r1: {kind: linux}\n    r2: {kind: linux}\n    r3: {kind: linux}\n",
+        "    - endpoints: [\"r1:eth1\", \"r2:eth1\"]\n    - endpoints: [\"r1:eth1\", \"r3:eth1\"]\n",
+    ))
+    assert errors == [{"path": "topology.links[1].endpoints[0]", "message": "interface 'r1:eth1' is already used by topology.links[0].endpoints[0]"}]
+
+
+
+def test_mgmt_ipv4_outside_the_subnet():
+    errors = topology_validator.validate_topology(topology(
+        "    r1: {kind: linux, mgmt-ipv4: 10.0.0.5}\n",
+        mgmt="mgmt:\n  ipv4-subnet: 192.168.100.0/24\n",
+    ))
+    assert errors == [{"path": "topology.nodes.r1.mgmt-ipv4", "message": "10.0.0.5 is outside mgmt.ipv4-subnet 192.168.100.0/24"}]
+
+
+
+def test_mgmt_ipv4_duplicated():
+    errors = topology_validator.validate_topology(topology(
+        "    r1: {kind: linux, mgmt-ipv4: 172.20.20.11}\n    r2: {kind: linux, mgmt-ipv4: 172.20.20.11}\n",
+    ))
+    assert errors == [{"path": "topology.nodes.r2.mgmt-ipv4", "message": "172.20.20.11 is already the address of node 'r1'"}]
+
+
+
+def test_link_to_an_undefined_node():
+    errors = topology_validator.validate_topology(topology(
+        "    r1: {kind: linux}\n",
+        "    - endpoints: [\"r1:eth1\", \"r9:eth1\"]\n",
+    ))
+    assert errors == [{"path": "topology.links[0].endpoints[1]", "message": "node 'r9' is not defined in topology.nodes"}]
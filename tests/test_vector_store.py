@@ -0,0 +1,43 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+vector_store = pytest.importorskip("tools.vector_store")
+
+
+
+def fill(store, space):
+    collection = store.get_or_create_collection("docs", metadata={"hnsw:space": space} if space else None)
+    collection.add(ids=["a", "b", "c", "d"],
+                   embeddings=[[1.0, 0.0], [0.0, 1.0], [1.0, 1.0], [-1.0, 0.5]],
+                   documents=["A", "B", "C", "D"],
+                   metadatas=[{"k": 1}, {"k": 2}, {"k": 1}, {"k": 2}])
+    collection.upsert(ids=["b"], embeddings=[[0.5, 0.9]], documents=["B2"], metadatas=[{"k": 2}])
+    collection.delete(ids=["d"])
+    return collection
+
+
+
+@pytest.mark.parametrize("space", [None, "cosine"])
+def test_faiss_backend_ranks_like_numpy(space):
+    pytest.importorskip("faiss")
+
+    expected = fill(vector_store.NumpyStore(), space)
+    actual = fill(vector_store.FaissStore(), space)
+    queries = [[0.9, 0.2], [0.1, 1.0]]
+
+    for where in (None, {"k": 1}):
+        want = expected.query(query_embeddings=queries, n_results=2, where=where)
+        got = actual.query(query_embeddings=queries, n_results=2, where=where)
+        assert got["ids"] == want["ids"]
+        assert got["documents"] == want["documents"]
+        assert np.allclose(np.asarray(got["distances"]), np.asarray(want["distances"]), atol=1e-5)
+
+
+
+def test_deleted_records_leave_the_faiss_index():
+    pytest.importorskip("faiss")
+
+    collection = fill(vector_store.FaissStore(), None)
+    collection.delete(where={"k": 1})
+
+    assert collection.query(query_embeddings=[[1.0, 0.0]], n_results=5)["ids"] == [["b"]]